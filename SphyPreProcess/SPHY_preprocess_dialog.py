@@ -43,6 +43,7 @@ __date__ ='1 January 2017'
 """
 
 import os, subprocess, ConfigParser, sqlite3, datetime, math, glob, time, processing
+import numpy as np
 
 from PyQt4 import QtGui, QtCore #uic
 from qgis.core import *
@@ -57,10 +58,21 @@ from SPHY_preprocess_dialog_base import Ui_SphyPreProcessDialog
 
 #-Import spatial processing class with gdal commands
 from spatial_processing import SpatialProcessing
+#-Import the PCRaster map writer and the raster to PCRaster map conversion
+import csf
+from warp import translateToMap
+#-Import the cache with regridded rasters that is shared by projects
+from rastercache import RasterCache
+#-Import the memory budget
+from memory import MemoryBudget, currentRSS
 #-Import worker class for running subprocesses in a thread
-from worker import SubProcessWorker
+from worker import SubProcessWorker, ForcingWorker
 #-Import forcing processing 
-from forcing import processForcing
+from forcing import processForcing, rasterCacheSettings, memoryBudget, workerCount
+#-Import processing in tiles for large models
+import tiling
+#-Import the names of the maps that are created (shared with the command line pipeline)
+from pipeline import GENERALMAPS, GLACIERMAPS, ROUTINGMAPS
 #from win32con import WAIT_IO_COMPLETION
 #import shutil
 
@@ -235,6 +247,7 @@ class SphyPreProcessDialog(QtGui.QDialog, Ui_SphyPreProcessDialog):
         self.precDataToolButton.clicked.connect(self.updateForcing)
         self.tempDataToolButton.clicked.connect(self.updateForcing)
         self.forcingToolButton.clicked.connect(self.createForcing)
+        self.forcingCancelToolButton.clicked.connect(self.cancelForcing)
         
         #-clear the process log text widget
         self.processLog1TextEdit.clear()
@@ -262,14 +275,12 @@ class SphyPreProcessDialog(QtGui.QDialog, Ui_SphyPreProcessDialog):
         self.configModulesDict = {'glacierModCheckBox': ('MODULES', 'glacier'), 'snowModCheckBox': ('MODULES', 'snow'), 'groundwaterModCheckBox': ('MODULES', 'groundwater'),\
                                   'routingModCheckBox': ('MODULES', 'routing')}
         #-general maps are always created in the "Create initial maps" Tab 
-        self.generalMaps = {'DEM': 'dem.map', 'Slope': 'slope.map', 'Root_field': 'root_field.map', 'Root_sat': 'root_sat.map',\
-                            'Root_dry': 'root_dry.map', 'Root_wilt': 'root_wilt.map', 'Root_Ksat': 'root_ksat.map', 'Sub_field': 'sub_field.map', 'Sub_sat': 'sub_sat.map',\
-                            'Sub_Ksat': 'sub_ksat.map', 'LandUse': 'landuse.map', 'Latitudes': 'latitude.map'}
+        self.generalMaps = dict(GENERALMAPS)
         #-glacier and routing maps are only created if these modules are turned on. Snow and groundwater modules don't require the creation of maps, but are implemented for possible
         # future developments. The Gui doesn't do anything with these two modules yet.
-        self.glacierMaps = {'GlacFrac': 'glacfrac.map', 'GlacFracCI': 'glac_cleanice.map', 'GlacFracDB': 'glac_debris.map'}
+        self.glacierMaps = dict(GLACIERMAPS)
         #self.routingMaps = {'LDD': 'ldd.map', 'Outlets': 'outlet.map', 'Rivers': 'river.map', 'AccuFlux': 'accuflux.map', 'Sub-basins': 'subbasins.map'}
-        self.routingMaps = {'LDD': 'ldd.map', 'Outlets': 'outlets.map', 'Rivers': 'river.map', 'AccuFlux': 'accuflux.map', 'Sub-basins': 'subbasins.map'}
+        self.routingMaps = dict(ROUTINGMAPS)
         self.setModulesDict()
         #-Dictionary for the Meteorological forcing Tab
         self.forcingDict = {'FlagCheckBox': 'FLAG', 'DBRadioButton': 'DB', 'LocFileLineEdit': 'LocFile', 'DataFileLineEdit': 'DataFile'}        
@@ -605,7 +616,7 @@ class SphyPreProcessDialog(QtGui.QDialog, Ui_SphyPreProcessDialog):
         if self.cells > 1000000 and self.cells <=2000000:
             iface.messageBar().pushMessage('Warning:', 'Your model has > 1,000,000 cells. This means that model run-time will likely be > 2 hours for a 10-year simulation period. Choose a larger spatial resolution to reduce model run-time.', QgsMessageBar.WARNING, 10)
         elif self.cells > 2000000:
-            iface.messageBar().pushMessage('Warning:', 'Your model has > 2,000,000 cells. This means that model run-time will be very long!! Choose a larger spatial resolution to reduce model run-time.', QgsMessageBar.WARNING, 10)
+            iface.messageBar().pushMessage('Warning:', 'Your model has > 2,000,000 cells. This means that model run-time will be very long!! Choose a larger spatial resolution to reduce model run-time. Set Tile_size in the project config file to process the initial maps and forcing in tiles.', QgsMessageBar.WARNING, 10)
         self.area = (self.cells * self.spatialRes**2) / 1000000  # to km2
         rectangle.setXMinimum(self.xMin)
         rectangle.setXMaximum(self.xMax)
@@ -650,12 +661,10 @@ class SphyPreProcessDialog(QtGui.QDialog, Ui_SphyPreProcessDialog):
                     QgsMapLayerRegistry.instance().removeMapLayer(l.id()) 
                     #QgsVectorFileWriter.deleteShapeFile(l.source())
             os.remove(self.resultsPath + 'clone.map')
-        #-Command for creating new clone
-        command = ('mapattr -s -R ' + str(int(self.rows)) + ' -C ' + str(int(self.cols)) + ' -P yb2t -B -x '\
-                         + str(int(self.xMin)) + ' -y ' + str(int(self.yMax)) + ' -l ' + str(self.spatialRes)\
-                         + ' ' + self.resultsPath + 'clone.map')
-        #command = self.pcrasterBatchFile(command)
-        subprocess.Popen(command, env={"PATH": self.pcrBinPath}, shell=True).wait()
+        #-Create new boolean clone (same as mapattr -s -P yb2t -B would create)
+        clone = np.ones((int(self.rows), int(self.cols)), dtype=np.uint8)
+        csf.writeMap(self.resultsPath + 'clone.map', clone, (int(self.xMin), self.spatialRes, 0., int(self.yMax), 0.,\
+            -self.spatialRes), csf.VS_BOOLEAN)
         #-Check if clone was succesfully created
         if os.path.isfile(self.resultsPath + 'clone.map'):
             iface.messageBar().pushMessage('Info:', 'Clone map was successfully created.', QgsMessageBar.INFO, 10)
@@ -676,6 +685,36 @@ class SphyPreProcessDialog(QtGui.QDialog, Ui_SphyPreProcessDialog):
             self.updateConfig(module, par, 1)
         self.saveProject()
         
+    #-Return the directory and maximum size (MB) of the raster cache that is shared by projects. The directory is None if no
+    # cache is used (also for older project config files that don't have these settings).
+    def rasterCacheSettings(self):
+        return rasterCacheSettings(self.currentConfig)
+
+    #-Return the memory budget in MB for the processing (0 = half of the free memory, also for older project config files
+    # that don't have this setting)
+    def memoryBudget(self):
+        return memoryBudget(self.currentConfig)
+
+    #-Return the number of rows and columns of the tiles if the maps and forcing are processed in tiles, or None
+    def tileSize(self):
+        return tiling.tileSize(self.currentConfig)
+
+    #-Reproject, resample and clip a database raster to the model grid and write it as PCRaster map. The regridded raster is
+    # taken from the raster cache if the same raster was regridded to the same grid before.
+    def initMap(self, mapname, filename, section, option, cache, resampling='bilinear', rtype='Float32',\
+            valuescale=csf.VS_SCALAR):
+        infile = os.path.join(self.databasePath, self.databaseConfig.get(section, option))
+        outfile = os.path.join(self.resultsPath, filename)
+        s_srs = 'EPSG:' + self.databaseConfig.get(section, 'EPSG')
+        #-Create a class with the gdal methods
+        m = SpatialProcessing(infile, outfile, s_srs, self.userCRS.authid(), self.spatialRes, resampling=resampling, rtype=rtype)
+        if tiling.warpMap(m, (self.xMin, self.yMin, self.xMax, self.yMax), valuescale, cache, self.tileSize(),\
+                workerCount(self.currentConfig)):
+            self.processLog1TextEdit.append(mapname + ' was created succesfully.')
+            self.addCanvasLayer(outfile, mapname, 'raster')
+        else:
+            self.processLog1TextEdit.append(mapname + ' map was not created.')
+
     #-Function that creates the initial maps based on the selected modules
     def createInitMaps(self):
         #-clear the process log text widget
@@ -695,7 +734,6 @@ class SphyPreProcessDialog(QtGui.QDialog, Ui_SphyPreProcessDialog):
         #-set the map properties of resulting maps
         t_srs =  self.userCRS.authid()
         res = self.spatialRes
-        extent = '-te ' + str(self.xMin) + ' ' + str(self.yMin) + ' ' + str(self.xMax) + ' ' + str(self.yMax)
         #-delete old raster layers from canvas and disk if exists
         for k in self.generalMaps:
             self.deleteLayer(os.path.join(self.resultsPath, self.generalMaps[k]), 'raster')
@@ -703,96 +741,51 @@ class SphyPreProcessDialog(QtGui.QDialog, Ui_SphyPreProcessDialog):
             self.deleteLayer(os.path.join(self.resultsPath, self.routingMaps[k]), 'raster')
         for k in self.glacierMaps:
             self.deleteLayer(os.path.join(self.resultsPath, self.glacierMaps[k]), 'raster')
-
-        #-remove temporary tiffs from results dir
-        fi = glob.glob(os.path.join(self.resultsPath, 'temp*'))
-        for f in fi:
-            os.remove(f)
+        
+        #-Cache with regridded rasters that is shared by projects
+        cachedir, cachesize = self.rasterCacheSettings()
+        cache = RasterCache(cachedir, cachesize) if cachedir else None
+        #-Large models are processed in tiles of tilesize x tilesize cells by the worker processes
+        tilesize = self.tileSize()
+        workers = workerCount(self.currentConfig)
+        if tilesize is not None:
+            self.processLog1TextEdit.append('Processing the maps in tiles of %d x %d cells' % (tilesize, tilesize))
+        #-Memory budget; the estimated peak is the memory in use now plus the warped map (or tile) and its copies (Float32)
+        memory = MemoryBudget(self.memoryBudget())
+        cells = self.rows * self.cols if tilesize is None else min(self.rows * self.cols, tilesize**2)
+        estimate = (currentRSS() or 0) + cells * 4 * 4
         
         ### First make the DEM ####################################
-        #-create the commands to execute
-        commands = []
-        infile = os.path.join(self.databasePath, self.databaseConfig.get('DEM', 'file'))
-        outfile = os.path.join(self.resultsPath, 'temp.tif')
-        s_srs = 'EPSG:' + self.databaseConfig.get('DEM', 'EPSG')
-        #-Create a class with the gdal methods
-        m = SpatialProcessing(infile, outfile, s_srs, t_srs, res, extra=extent)
-        #-Project, clip and resample
-        commands.append(m.reproject())
-        #-Convert to PCRaster map
-        m.extra = '-of PCRaster'
-        m.input = m.output
-        m.output = os.path.join(self.resultsPath, self.generalMaps['DEM'])
-        commands.append(m.rasterTranslate())
-        #-Execute the command(s) in a thread
-        self.threadWorker(SubProcessWorker(commands, self.processLog1TextEdit, 'DEM', self.generalMaps['DEM'], True, 'raster'))
-        while self.thread.isRunning(): #-wait till the thread is finished before continue
-            print ''
+        self.initMap('DEM', self.generalMaps['DEM'], 'DEM', 'file', cache)
         #-set progress bar value
         mm+=1
         self.initialMapsProgressBar.setValue(mm/maps*100)
         ### make the Slope #######
-        command = self.pcrasterModelFile('"' + os.path.join(self.resultsPath, self.generalMaps['Slope']) + '"'\
-                                        + ' = slope(' + '"' + os.path.join(self.resultsPath, self.generalMaps['DEM']) + '"' + ')')
-        self.threadWorker(SubProcessWorker(['pcrcalc -f ' + command], self.processLog1TextEdit, 'Slope', self.generalMaps['Slope'], True, 'raster', env={"PATH": self.pcrBinPath}))
-        while self.thread.isRunning(): #-wait till the thread is finished before continue
-            print ''
-        #-remove temporary tiffs from results dir
-        fi = glob.glob(os.path.join(self.resultsPath, 'temp.*'))
-        for f in fi:
-            os.remove(f)
+        if tilesize is not None:
+            #-same slope as pcrcalc, calculated in tiles with a halo of one cell
+            outfile = os.path.join(self.resultsPath, self.generalMaps['Slope'])
+            if tiling.slopeMap(os.path.join(self.resultsPath, self.generalMaps['DEM']), outfile, tilesize, workers):
+                self.processLog1TextEdit.append('Slope was created succesfully.')
+                self.addCanvasLayer(outfile, 'Slope', 'raster')
+            else:
+                self.processLog1TextEdit.append('Slope map was not created.')
+        else:
+            command = self.pcrasterModelFile('"' + os.path.join(self.resultsPath, self.generalMaps['Slope']) + '"'\
+                                            + ' = slope(' + '"' + os.path.join(self.resultsPath, self.generalMaps['DEM']) + '"' + ')')
+            self.threadWorker(SubProcessWorker(['pcrcalc -f ' + command], self.processLog1TextEdit, 'Slope', self.generalMaps['Slope'], True, 'raster', env={"PATH": self.pcrBinPath}))
+            while self.thread.isRunning(): #-wait till the thread is finished before continue
+                print ''
         #-set progress bar value
         mm+=1
         self.initialMapsProgressBar.setValue(mm/maps*100)
         ### Latitude map ##############################################
-        #-create the commands to execute
-        commands = []
-        infile = os.path.join(self.databasePath, self.databaseConfig.get('LATITUDE', 'file'))
-        outfile = os.path.join(self.resultsPath, 'temp.tif')
-        s_srs = 'EPSG:' + self.databaseConfig.get('LATITUDE', 'EPSG')
-        #-Create a class with the gdal methods
-        m = SpatialProcessing(infile, outfile, s_srs, t_srs, res, extra=extent)
-        #-Project, clip and resample
-        commands.append(m.reproject())
-        #-Convert to PCRaster map
-        m.extra = '-of PCRaster'
-        m.input = m.output
-        m.output = os.path.join(self.resultsPath, self.generalMaps['Latitudes'])
-        commands.append(m.rasterTranslate())
-        #-Execute the command(s) in a thread
-        self.threadWorker(SubProcessWorker(commands, self.processLog1TextEdit, 'Latitudes', self.generalMaps['Latitudes'], True, 'raster'))
-        while self.thread.isRunning(): #-wait till the thread is finished before continue
-            print ''
-        #-remove temporary tiffs from results dir
-        fi = glob.glob(os.path.join(self.resultsPath, 'temp.*'))
-        for f in fi:
-            os.remove(f)
+        self.initMap('Latitudes', self.generalMaps['Latitudes'], 'LATITUDE', 'file', cache)
         #-set progress bar value
         mm+=1
         self.initialMapsProgressBar.setValue(mm/maps*100)
         ### Landuse map ##############################################
-        #-create the commands to execute
-        commands = []
-        infile = os.path.join(self.databasePath, self.databaseConfig.get('LANDUSE', 'file'))
-        outfile = os.path.join(self.resultsPath, 'temp.tif')
-        s_srs = 'EPSG:' + self.databaseConfig.get('LANDUSE', 'EPSG')
-        #-Create a class with the gdal methods
-        m = SpatialProcessing(infile, outfile, s_srs, t_srs, res, resampling='mode', rtype='Int32', extra=extent)
-        #-Project, clip and resample
-        commands.append(m.reproject())
-        #-Convert to PCRaster map
-        m.extra = '-of PCRaster'
-        m.input = m.output
-        m.output = os.path.join(self.resultsPath, self.generalMaps['LandUse'])
-        commands.append(m.rasterTranslate())
-        #-Execute the command(s) in a thread
-        self.threadWorker(SubProcessWorker(commands, self.processLog1TextEdit, 'LandUse', self.generalMaps['LandUse'], True, 'raster'))
-        while self.thread.isRunning(): #-wait till the thread is finished before continue
-            print ''
-        #-remove temporary tiffs from results dir
-        fi = glob.glob(os.path.join(self.resultsPath, 'temp.*'))
-        for f in fi:
-            os.remove(f)
+        self.initMap('LandUse', self.generalMaps['LandUse'], 'LANDUSE', 'file', cache, resampling='mode', rtype='Int32',\
+            valuescale=csf.VS_NOMINAL)
         #-set progress bar value
         mm+=1
         self.initialMapsProgressBar.setValue(mm/maps*100)
@@ -801,31 +794,12 @@ class SphyPreProcessDialog(QtGui.QDialog, Ui_SphyPreProcessDialog):
                         ,'Root_wilt': 'root_wilt_file', 'Root_Ksat': 'root_ksat_file', 'Sub_field': 'sub_field_file'\
                         ,'Sub_sat': 'sub_sat_file', 'Sub_Ksat': 'sub_ksat_file'}
         for smap in soilMapTiffs:
-            #-create the commands to execute
-            commands = []
-            infile = os.path.join(self.databasePath, self.databaseConfig.get('SOIL', soilMapTiffs[smap]))
-            outfile = os.path.join(self.resultsPath, 'temp.tif')
-            s_srs = 'EPSG:' + self.databaseConfig.get('SOIL', 'EPSG')
-            #-Create a class with the gdal methods
-            m = SpatialProcessing(infile, outfile, s_srs, t_srs, res, extra=extent)
-            #-Project, clip and resample
-            commands.append(m.reproject())
-            #-Convert to PCRaster map
-            m.extra = '-of PCRaster'
-            m.input = m.output
-            m.output = os.path.join(self.resultsPath, self.generalMaps[smap])
-            commands.append(m.rasterTranslate())
-            #-Execute the command(s) in a thread
-            self.threadWorker(SubProcessWorker(commands, self.processLog1TextEdit, smap, self.generalMaps[smap], True, 'raster'))
-            while self.thread.isRunning(): #-wait till the thread is finished before continue
-                print ''
-            #-remove temporary tiffs from results dir
-            fi = glob.glob(os.path.join(self.resultsPath, 'temp.*'))
-            for f in fi:
-                os.remove(f)
+            self.initMap(smap, self.generalMaps[smap], 'SOIL', soilMapTiffs[smap], cache)
             #-set progress bar value
             mm+=1
             self.initialMapsProgressBar.setValue(mm/maps*100)
+        if cache is not None:
+            self.processLog1TextEdit.append(cache.info())
         ############### ROUTING MAPS, IF MODULE IS ON ##########################
         if self.currentConfig.getint('MODULES', 'routing') == 1:
             #-delete old raster layers from canvas and disk if exists
@@ -899,66 +873,24 @@ class SphyPreProcessDialog(QtGui.QDialog, Ui_SphyPreProcessDialog):
 #                 except:
 #                     pass
             infile = os.path.join(self.databasePath, self.databaseConfig.get('GLACIER', 'file'))
-            outfile = os.path.join(self.resultsPath, 'temp.shp')
+            outfile = os.path.join(self.resultsPath, self.glacierMaps['GlacFrac'])
             s_srs = 'EPSG:' + self.databaseConfig.get('GLACIER', 'EPSG')
-            #-Project the layer to the user CRS
-            processing.runalg("qgis:reprojectlayer", infile, t_srs, outfile)
-            ########-Create gridded glacier outlines
-            infile = outfile
-            outfile = os.path.join(self.resultsPath, 'temp.tif')
             #-Create a class with the gdal methods
-            m = SpatialProcessing(infile, outfile, s_srs, t_srs, res/10, extra='-a_nodata -3.40282e+38 -burn 1.0 ' + extent)
-            self.threadWorker(SubProcessWorker([m.rasterize()], self.processLog1TextEdit, 'Gridded Randolph', outfile, True, 'raster'))
-            while self.thread.isRunning(): #-wait till the thread is finished before continue
-                print ''
-#             ########-Reclassify (NaN->0)  -> Uncertain why this is not working correctly. Therefore commented and part below is used.
-#             infile = outfile
-#             outfile = os.path.join(self.resultsPath, 'temp2.tif')
-#             processing.runalg("saga:reclassifygridvalues", infile, 0, 0, 0, 0, 0, 1, 2, 0, "0,0,0,0,0,0,0,0,0", 0, \
-#                 True, 0, False, 0, outfile)
-#             self.addCanvasLayer(outfile, 'temp2', 'raster')
-#             return
-            ########-Reclassify (NaN->0)
-            #-First convert to pcraster map
-            m.input = outfile
-            m.output = os.path.join(self.resultsPath, 'temp.map')
-            m.extra = '-of PCRaster'
-            #-Execute the command(s) in a thread
-            self.threadWorker(SubProcessWorker([m.rasterTranslate()], self.processLog1TextEdit, 'temp', m.output, False, 'raster'))
-            while self.thread.isRunning(): #-wait till the thread is finished before continue
-                print ''
-            #-Replace NaN with zero
-            infile = m.output
-            outfile = os.path.join(self.resultsPath, 'temp2.map')
-            command = self.pcrasterModelFile('"' + outfile + '" = cover("' + infile + '", 0)')
-            #-Execute the command(s) in a thread
-            self.threadWorker(SubProcessWorker(['pcrcalc -f ' + command], self.processLog1TextEdit, 'temp2', outfile, False, 'raster', env={"PATH": self.pcrBinPath}))
-            while self.thread.isRunning(): #-wait till the thread is finished before continue
-                print ''
-            #-Convert to Geotiff
-            m.input = outfile
-            m.output = os.path.join(self.resultsPath, 'temp2.tif')
-            m.extra = ''
-            #-Execute the command(s) in a thread
-            self.threadWorker(SubProcessWorker([m.rasterTranslate()], self.processLog1TextEdit, 'temp2', m.output, True, 'raster'))
-            while self.thread.isRunning(): #-wait till the thread is finished before continue
-                print ''
-            #######-Aggregate the results to the glacier fraction map
-            infile = m.output
-            outfile = os.path.join(self.resultsPath, 'temp3.tif')
-            extent = str(self.xMin) + "," +  str(self.xMax) +"," + str(self.yMin) + "," + str(self.yMax)
-            processing.runalg("grass:r.resamp.stats", infile, 0, False, False, False, extent, res, outfile)
-            self.addCanvasLayer(outfile, 'temp3', 'raster')
+            m = SpatialProcessing(infile, outfile, s_srs, t_srs, res)
+            ########-Glacier fraction map: project the glacier outlines to the user CRS, grid them at a 10 times finer resolution,
+            # and aggregate to the fraction of each cell that is covered by glaciers (in memory). The fine raster is created
+            # in strips that fit in the remaining memory budget (10 x 10 Float32 cells and a copy for each cell), which is
+            # shared by the worker processes if the map is created in tiles
+            strip = min(memory.remaining() / (1 if tilesize is None else workers), cells * 800)
+            estimate = max(estimate, (currentRSS() or 0) + strip)
+            glacfrac = tiling.fractionMap(m, (self.xMin, self.yMin, self.xMax, self.yMax), 10, strip, tilesize, workers)
             mm+=1
             self.initialMapsProgressBar.setValue(mm/maps*100)
-            ######-Convert to PCRaster map
-            m.input = outfile
-            m.output = os.path.join(self.resultsPath, self.glacierMaps['GlacFrac'])
-            m.extra = '-of PCRaster'
-            #-Execute the command(s) in a thread
-            self.threadWorker(SubProcessWorker([m.rasterTranslate()], self.processLog1TextEdit, 'GlacFrac', m.output, True, 'raster'))
-            while self.thread.isRunning(): #-wait till the thread is finished before continue
-                print ''
+            if glacfrac:
+                self.processLog1TextEdit.append('GlacFrac was created succesfully.')
+                self.addCanvasLayer(outfile, 'GlacFrac', 'raster')
+            else:
+                self.processLog1TextEdit.append('GlacFrac map was not created.')
             ########-Debris fraction map
             demfile = os.path.join(self.resultsPath, self.generalMaps['DEM'])
             slopefile = os.path.join(self.resultsPath, self.generalMaps['Slope'])
@@ -985,13 +917,9 @@ class SphyPreProcessDialog(QtGui.QDialog, Ui_SphyPreProcessDialog):
        
         self.initialMapsProgressBar.setValue(100.0)
         time.sleep(1)
+        self.processLog1TextEdit.append(memory.report(estimate))
         self.processLog1TextEdit.append('Processing is finished')
         self.initialMapsProgressBar.setValue(0.)
-        #-Try to delete the temporary layers from canvas and disk
-        self.deleteLayer(os.path.join(self.resultsPath, 'temp.shp'), 'shape')
-        self.deleteLayer(os.path.join(self.resultsPath, 'temp.tif'), 'raster')
-        self.deleteLayer(os.path.join(self.resultsPath, 'temp2.tif'), 'raster')
-        self.deleteLayer(os.path.join(self.resultsPath, 'temp3.tif'), 'raster')
         #-Activate the delineation button in the "Basin delineation" Tab
         self.delineateButton.setEnabled(1)
         
@@ -1040,23 +968,11 @@ class SphyPreProcessDialog(QtGui.QDialog, Ui_SphyPreProcessDialog):
             outfile = os.path.join(self.resultsPath, 'temp.tif')
             self.processLog2TextEdit.append('Converting Outlet(s) to raster...')
             processing.runalg("grass:v.to.rast.attribute", self.outletsShp, 0, "id", extent, self.spatialRes, -1.0, 0.0001, outfile)
-            #####-Translate GeoTiff to PCRaster map
-            infile = outfile
-            outfile = os.path.join(self.resultsPath, 'temp.map')
-            #-Create a class with the gdal methods
-            m = SpatialProcessing(infile, outfile, None, None, None, extra='-of PCRaster -ot Float32')
-            #-Execute the command(s) in a thread            
-            self.threadWorker(SubProcessWorker([m.rasterTranslate()], self.processLog2TextEdit, 'temp', outfile, False, 'raster'))
-            while self.thread.isRunning(): #-wait till the thread is finished before continue
-                print ''
-            #-Convert to nominal PCRaster map
-            infile = outfile 
-            command = self.pcrasterModelFile('"' + os.path.join(self.resultsPath, self.routingMaps['Outlets']) + '"'\
-                + ' = nominal("' + infile + '")')
-            #-Execute the command(s) in a thread
-            self.threadWorker(SubProcessWorker(['pcrcalc -f ' + command], self.processLog2TextEdit, 'Outlets', self.routingMaps['Outlets'], False, 'raster', env={"PATH": self.pcrBinPath}))
-            while self.thread.isRunning(): #-wait till the thread is finished before continue
-                print ''
+            #####-Convert GeoTiff to nominal PCRaster map
+            if translateToMap(outfile, os.path.join(self.resultsPath, self.routingMaps['Outlets']), csf.VS_NOMINAL):
+                self.processLog2TextEdit.append('Outlets was created succesfully.')
+            else:
+                self.processLog2TextEdit.append('Outlets map was not created.')
             #-update progressbar
             mm += 1
             self.delineateProgressBar.setValue(mm/maps*100)
@@ -1202,23 +1118,12 @@ class SphyPreProcessDialog(QtGui.QDialog, Ui_SphyPreProcessDialog):
             outfile = os.path.join(self.resultsPath, 'temp.tif')
             self.processLog3TextEdit.append('Converting Station(s) to raster...')
             processing.runalg("grass:v.to.rast.attribute", self.stationsShp, 0, "id", extent, self.spatialRes, -1.0, 0.0001, outfile)
-            #####-Translate GeoTiff to PCRaster map
-            infile = outfile
-            outfile = os.path.join(self.resultsPath, 'temp.map')
-            #-Create a class with the gdal methods
-            m = SpatialProcessing(infile, outfile, None, None, None, extra='-of PCRaster -ot Float32')
-            #-Execute the command(s) in a thread            
-            self.threadWorker(SubProcessWorker([m.rasterTranslate()], self.processLog3TextEdit, 'temp', outfile, False, 'raster'))
-            while self.thread.isRunning(): #-wait till the thread is finished before continue
-                print ''
-            #-Convert to nominal PCRaster map
-            infile = outfile 
-            command = self.pcrasterModelFile('"' + os.path.join(self.resultsPath, 'stations.map') + '"'\
-                + ' = nominal("' + infile + '")')
-            #-Execute the command(s) in a thread
-            self.threadWorker(SubProcessWorker(['pcrcalc -f ' + command], self.processLog3TextEdit, 'Stations', 'stations.map', True, 'raster', env={"PATH": self.pcrBinPath}))
-            while self.thread.isRunning(): #-wait till the thread is finished before continue
-                print ''
+            #####-Convert GeoTiff to nominal PCRaster map
+            if translateToMap(outfile, os.path.join(self.resultsPath, 'stations.map'), csf.VS_NOMINAL):
+                self.processLog3TextEdit.append('Stations was created succesfully.')
+                self.addCanvasLayer(os.path.join(self.resultsPath, 'stations.map'), 'Stations', 'raster')
+            else:
+                self.processLog3TextEdit.append('Stations map was not created.')
                 
                 
             self.processLog3TextEdit.append('Station creation finished.')
@@ -1278,14 +1183,16 @@ class SphyPreProcessDialog(QtGui.QDialog, Ui_SphyPreProcessDialog):
             f.dbTs = self.databaseConfig.get('METEO', 'file_timestep')
             f.dbSrs = 'EPSG:' + self.databaseConfig.get('METEO', 'EPSG')
             f.dbFormat = self.databaseConfig.get('METEO', 'format')
+        #-List with the processForcing methods to run
+        tasks = []
         if self.precFLAG:
             if self.precDB:
                 f.precDBPath = os.path.join(self.databasePath, self.databaseConfig.get('METEO', 'prec_folder'))
-                f.createPrecDB() 
+                tasks.append('createPrecDB')
             else:
                 f.precLocFile = self.precLocFile
                 f.precDataFile = self.precDataFile 
-                f.createPrecCSV()
+                tasks.append('createPrecCSV')
         if self.tempFLAG:
             if self.tempDB:
                 f.tavgDBPath = os.path.join(self.databasePath, self.databaseConfig.get('METEO', 'tavg_folder'))
@@ -1293,17 +1200,55 @@ class SphyPreProcessDialog(QtGui.QDialog, Ui_SphyPreProcessDialog):
                 f.tminDBPath = os.path.join(self.databasePath, self.databaseConfig.get('METEO', 'tmin_folder'))
                 f.dbDem = os.path.join(self.databasePath, self.databaseConfig.get('METEO', 'dem'))
                 f.modelDem = os.path.join(self.resultsPath, self.generalMaps['DEM'])
-                f.createTempDB() 
+                tasks.append('createTempDB')
             else:
                 f.tempLocFile = self.tempLocFile
                 f.tempDataFile = self.tempDataFile 
-                f.createTempCSV()
-        if not self.precFLAG and not self.tempFLAG:
+                tasks.append('createTempCSV')
+        #-Interpolation, output, block size, raster cache and memory settings, and the number of worker processes
+        workers = f.readConfig(self.currentConfig)
+        if not tasks:
             self.processLog4TextEdit.append('Nothing to process.')
-        self.forcingProgressBar.setValue(100)
-        time.sleep(.5)
+            return
+        #-Run the forcing in a thread, so QGIS stays responsive. The log, progress and summary are received with signals.
+        self.forcingThread = QtCore.QThread(self)
+        self.forcingWorker = ForcingWorker(f, tasks, workers, self.tileSize())
+        self.forcingWorker.moveToThread(self.forcingThread)
+        self.forcingWorker.log.connect(self.processLog4TextEdit.append)
+        self.forcingWorker.progress.connect(self.forcingProgress)
+        self.forcingWorker.error.connect(self.workerError)
+        self.forcingWorker.finished.connect(self.forcingFinished)
+        self.forcingThread.started.connect(self.forcingWorker.run)
+        self.forcingToolButton.setEnabled(False)
+        self.forcingCancelToolButton.setEnabled(True)
+        self.forcingThread.start()
+
+    #-Show the progress and estimated remaining time of the forcing thread
+    def forcingProgress(self, result):
+        value, eta = result
+        self.forcingProgressBar.setValue(value)
+        if eta is None:
+            self.forcingProgressBar.setFormat('%p%')
+        else:
+            eta = int(eta)
+            self.forcingProgressBar.setFormat('%%p%% - %d:%02d:%02d left' % (eta // 3600, eta % 3600 // 60, eta % 60))
+
+    #-Cancel the forcing thread; it stops after the current variable and keeps the maps that are created so far
+    def cancelForcing(self):
+        self.forcingCancelToolButton.setEnabled(False)
+        self.processLog4TextEdit.append('Cancelling...')
+        self.forcingWorker.cancel()
+
+    #-Clean up the forcing thread and show the summary of the run
+    def forcingFinished(self, summary):
+        self.forcingThread.quit()
+        self.forcingThread.wait()
+        self.processLog4TextEdit.append('\n' + summary)
+        self.forcingProgressBar.setFormat('%p%')
         self.forcingProgressBar.setValue(0)
-        
+        self.forcingToolButton.setEnabled(True)
+        self.forcingCancelToolButton.setEnabled(False)
+
 
     #-Start the worker in a thread
     def threadWorker(self, worker):
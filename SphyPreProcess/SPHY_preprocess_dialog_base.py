@@ -549,9 +549,13 @@ class Ui_SphyPreProcessDialog(object):
         self.forcingToolButton.setGeometry(QtCore.QRect(200, 300, 81, 21))
         self.forcingToolButton.setObjectName(_fromUtf8("forcingToolButton"))
         self.forcingProgressBar = QtGui.QProgressBar(self.processLog4GroupBox)
-        self.forcingProgressBar.setGeometry(QtCore.QRect(10, 300, 181, 21))
+        self.forcingProgressBar.setGeometry(QtCore.QRect(10, 300, 111, 21))
         self.forcingProgressBar.setProperty("value", 0)
         self.forcingProgressBar.setObjectName(_fromUtf8("forcingProgressBar"))
+        self.forcingCancelToolButton = QtGui.QToolButton(self.processLog4GroupBox)
+        self.forcingCancelToolButton.setEnabled(False)
+        self.forcingCancelToolButton.setGeometry(QtCore.QRect(125, 300, 71, 21))
+        self.forcingCancelToolButton.setObjectName(_fromUtf8("forcingCancelToolButton"))
         self.tempGroupBox = QtGui.QGroupBox(self.meteoTab)
         self.tempGroupBox.setGeometry(QtCore.QRect(10, 200, 361, 141))
         self.tempGroupBox.setObjectName(_fromUtf8("tempGroupBox"))
@@ -686,6 +690,7 @@ class Ui_SphyPreProcessDialog(object):
         self.precCSVRadioButton.setText(_translate("SphyPreProcessDialog", "User defined station data", None))
         self.processLog4GroupBox.setTitle(_translate("SphyPreProcessDialog", "Process log", None))
         self.forcingToolButton.setText(_translate("SphyPreProcessDialog", "Create forcing", None))
+        self.forcingCancelToolButton.setText(_translate("SphyPreProcessDialog", "Cancel", None))
         self.tempGroupBox.setTitle(_translate("SphyPreProcessDialog", "Temperature", None))
         self.tempDBRadioButton.setText(_translate("SphyPreProcessDialog", "Database", None))
         self.tempCSVRadioButton.setText(_translate("SphyPreProcessDialog", "User defined station data", None))
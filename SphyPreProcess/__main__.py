@@ -0,0 +1,34 @@
+# The SPHY model Pre-Processor interface plugin for QGIS:
+# A QGIS plugin that allows the user to create SPHY model input data based on a database. 
+#
+# Copyright (C) 2015  Wilco Terink
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Email: terinkw@gmail.com
+
+#-Authorship information-###################################################################
+__author__ = "Wilco Terink"
+__copyright__ = "Wilco Terink"
+__license__ = "GPL"
+__version__ = "1.0.0"
+__email__ = "terinkw@gmail.com"
+__date__ ='1 January 2017'
+############################################################################################
+
+#-Run the preprocessing without QGIS, e.g. python -m SphyPreProcess run project.cfg --stages clone,initmaps,forcing
+import sys
+from .pipeline import main
+
+sys.exit(main())
@@ -0,0 +1,231 @@
+# The SPHY model Pre-Processor interface plugin for QGIS:
+# A QGIS plugin that allows the user to create SPHY model input data based on a database. 
+#
+# Copyright (C) 2015  Wilco Terink
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Email: terinkw@gmail.com
+
+#-Authorship information-###################################################################
+__author__ = "Wilco Terink"
+__copyright__ = "Wilco Terink"
+__license__ = "GPL"
+__version__ = "1.0.0"
+__email__ = "terinkw@gmail.com"
+__date__ ='1 January 2017'
+############################################################################################
+
+import os, struct
+import numpy as np
+
+#-PCRaster value scales
+VS_BOOLEAN = 0xE0
+VS_NOMINAL = 0xE2
+VS_ORDINAL = 0xF2
+VS_SCALAR = 0xEB
+VS_DIRECTION = 0xFB
+VS_LDD = 0xF0
+
+#-PCRaster cell representations
+CR_UINT1 = 0x00
+CR_INT4 = 0x26
+CR_REAL4 = 0x5A
+CR_REAL8 = 0xDB
+
+#-Projection: y decreases from top to bottom (PCRaster yb2t)
+PT_YDECT2B = 1
+
+#-Cell representation, NumPy type, and missing value of each value scale
+VALUESCALES = {VS_BOOLEAN: CR_UINT1, VS_LDD: CR_UINT1, VS_NOMINAL: CR_INT4, VS_ORDINAL: CR_INT4, VS_SCALAR: CR_REAL4,\
+               VS_DIRECTION: CR_REAL4}
+CELLREPR = {CR_UINT1: np.uint8, CR_INT4: np.int32, CR_REAL4: np.float32, CR_REAL8: np.float64}
+MISSING = {CR_UINT1: 255, CR_INT4: -2147483648}
+
+#-Value scale names as used by the GDAL PCRaster driver
+VALUESCALE_NAMES = {'VS_BOOLEAN': VS_BOOLEAN, 'VS_NOMINAL': VS_NOMINAL, 'VS_ORDINAL': VS_ORDINAL, 'VS_SCALAR': VS_SCALAR,\
+                    'VS_DIRECTION': VS_DIRECTION, 'VS_LDD': VS_LDD}
+
+SIGNATURE = b'RUU CROSS SYSTEM MAP FORMAT'
+DATA_OFFSET = 256
+
+#-Class that reads and writes PCRaster maps (Cross System Format, version 2) with NumPy, without the GDAL PCRaster
+# driver or the PCRaster command line utilities. The cells are read with a memory map.
+class CSFMap():
+    def __init__(self, rows, cols, xul, yul, cellsize, valuescale=VS_SCALAR, cellrepr=None):
+        self.rows = int(rows)
+        self.cols = int(cols)
+        self.xUL = float(xul)
+        self.yUL = float(yul)
+        self.cellSize = float(cellsize)
+        self.valueScale = valuescale
+        self.cellRepr = VALUESCALES[valuescale] if cellrepr is None else cellrepr
+        self.data = None
+
+    #-GDAL geotransform of the map
+    def geoTransform(self):
+        return (self.xUL, self.cellSize, 0., self.yUL, 0., -self.cellSize)
+
+    #-Read the header of a PCRaster map and memory map its cells
+    @classmethod
+    def read(cls, filename):
+        with open(filename, 'rb') as f:
+            header = f.read(DATA_OFFSET)
+        if not header.startswith(SIGNATURE):
+            raise IOError(filename + ' is not a PCRaster map')
+        #-Byte order of the file: the byteOrder field is 1 in the byte order of the system that wrote it
+        order = '<' if struct.unpack('<I', header[46:50])[0] == 1 else '>'
+        valuescale, cellrepr = struct.unpack(order + 'HH', header[64:68])
+        xul, yul = struct.unpack(order + 'dd', header[84:100])
+        rows, cols = struct.unpack(order + 'II', header[100:108])
+        cellsize = struct.unpack(order + 'd', header[108:116])[0]
+        m = cls(rows, cols, xul, yul, cellsize, valuescale, cellrepr)
+        dtype = np.dtype(CELLREPR[cellrepr]).newbyteorder(order)
+        m.data = np.memmap(filename, dtype=dtype, mode='r', offset=DATA_OFFSET, shape=(rows, cols))
+        return m
+
+    #-Return the cells, or a window (row, col, rows, cols) of the cells, as Float32 array with NaN for missing values
+    def array(self, window=None):
+        cells = self.data
+        if window is not None:
+            row, col, rows, cols = window
+            cells = cells[row:row + rows, col:col + cols]
+        data = np.array(cells, dtype=np.float32)
+        if self.cellRepr in MISSING:
+            data[np.asarray(cells) == MISSING[self.cellRepr]] = np.nan
+        return data  #-REAL4/REAL8 missing values (all bits set) are already NaN
+
+    #-Convert an array with NaN for missing values to the (little endian) cell representation of the value scale. Returns
+    # the cells together with a boolean array that is False for the missing values.
+    def cells(self, data):
+        data = np.asarray(data)
+        dtype = CELLREPR[self.cellRepr]
+        if data.dtype.kind == 'f':
+            valid = np.isfinite(data)
+        else:
+            valid = np.ones(data.shape, dtype=bool)
+        if self.cellRepr in MISSING:
+            mv = MISSING[self.cellRepr]
+            cells = np.where(valid, data, 0).astype(dtype)
+            if self.valueScale == VS_BOOLEAN:
+                cells = (cells != 0).astype(dtype)
+            cells[~valid] = mv
+        else:
+            cells = np.where(valid, data, 0).astype(dtype)
+            #-the missing value of floating point cells has all bits set
+            bits = np.uint32 if dtype == np.float32 else np.uint64
+            cells.view(bits)[~valid] = np.iinfo(bits).max
+        return cells.astype(self.dtype()), valid
+
+    #-Little endian NumPy type of the cells
+    def dtype(self):
+        return np.dtype(CELLREPR[self.cellRepr]).newbyteorder('<')
+
+    #-Missing value in the cell representation, as array with one cell
+    def missing(self):
+        return self.cells(np.array([np.nan]))[0]
+
+    #-Header of the map with the minimum and maximum value (the missing value if minmax is None)
+    def header(self, minmax=None):
+        if minmax is None:
+            minmax = self.missing()[0], self.missing()[0]
+        #-Minimum and maximum value, stored in the cell representation in the first bytes of a 8 byte field
+        pad = b'\0' if self.cellRepr == CR_INT4 else b'\xff'
+        minmax = b''.join(np.array(v, dtype=self.dtype()).tobytes().ljust(8, pad) for v in minmax)
+        main = struct.pack('<32sHIHIHI', SIGNATURE, 2, 0, PT_YDECT2B, 0, 1, 1).ljust(64, b'\0')
+        raster = struct.pack('<HH', self.valueScale, self.cellRepr) + minmax + struct.pack('<ddIIddd', self.xUL,\
+            self.yUL, self.rows, self.cols, self.cellSize, self.cellSize, 0.)
+        return (main + raster).ljust(DATA_OFFSET, b'\0')
+
+    #-Write a map. Data is an array with NaN for missing values, which is converted to the cell representation of the
+    # value scale.
+    def write(self, filename, data):
+        cells, valid = self.cells(data)
+        minmax = (cells[valid].min(), cells[valid].max()) if valid.any() else None
+        if os.path.isfile(filename):
+            os.remove(filename)
+        with open(filename, 'wb') as f:
+            f.write(self.header(minmax))
+            f.write(cells.tobytes())
+
+#-Class that writes a PCRaster map in parts, e.g. the tiles of a large model grid, without holding the complete map in
+# memory. The parts are written in a memory map of the cells: of a new map, whose cells are not written when it is
+# created (so they are zero until a part is written), or of an existing map if only the filename is given.
+class MapWriter():
+    def __init__(self, filename, rows=None, cols=None, geotransform=None, valuescale=VS_SCALAR):
+        self.filename = filename
+        self.minmax = None
+        if rows is None:
+            self.map = CSFMap.read(filename)
+            self.map.data = None
+        else:
+            self.map = CSFMap(rows, cols, geotransform[0], geotransform[3], geotransform[1], valuescale)
+            if os.path.isfile(filename):
+                os.remove(filename)
+            with open(filename, 'wb') as f:
+                f.write(self.map.header())
+                f.truncate(DATA_OFFSET + self.map.rows * self.map.cols * self.map.dtype().itemsize)
+        self.cells = np.memmap(filename, dtype=self.map.dtype(), mode='r+', offset=DATA_OFFSET, shape=(self.map.rows,\
+            self.map.cols))
+
+    #-Write an array with NaN for missing values at the upper left cell (row, col) of the map
+    def write(self, row, col, data):
+        cells, valid = self.map.cells(data)
+        rows, cols = cells.shape
+        self.cells[row:row + rows, col:col + cols] = cells
+        if valid.any():
+            lo, hi = cells[valid].min(), cells[valid].max()
+            if self.minmax is not None:
+                lo, hi = min(lo, self.minmax[0]), max(hi, self.minmax[1])
+            self.minmax = (lo, hi)
+
+    #-Write the cells to disk and update the minimum and maximum value in the header, unless other parts of the map are
+    # still written by other processes (see setMinMax)
+    def close(self, header=True):
+        self.cells.flush()
+        self.cells = None
+        if header:
+            setMinMax(self.filename, self.minmax)
+
+#-Function that returns True if a file is a PCRaster map
+def isMap(filename):
+    try:
+        with open(filename, 'rb') as f:
+            return f.read(len(SIGNATURE)) == SIGNATURE
+    except IOError:
+        return False
+
+#-Function that sets the minimum and maximum value (the missing value if minmax is None) in the header of a map
+def setMinMax(filename, minmax):
+    m = CSFMap.read(filename)
+    m.data = None
+    with open(filename, 'r+b') as f:
+        f.write(m.header(minmax))
+
+#-Function that writes an array as PCRaster map with the geotransform of the model grid
+def writeMap(filename, data, geotransform, valuescale=VS_SCALAR):
+    rows, cols = np.shape(data)
+    CSFMap(rows, cols, geotransform[0], geotransform[3], geotransform[1], valuescale).write(filename, data)
+
+#-Function that reads a PCRaster map, or a window (row, col, rows, cols) of the map, as Float32 array with NaN for missing
+# values, and returns it with the geotransform of the map or window
+def readMap(filename, window=None):
+    m = CSFMap.read(filename)
+    data = m.array(window)
+    geotransform = m.geoTransform()
+    if window is not None:
+        geotransform = (geotransform[0] + window[1] * m.cellSize, m.cellSize, 0., geotransform[3] - window[0] *\
+            m.cellSize, 0., -m.cellSize)
+    m.data = None
+    return data, geotransform
@@ -0,0 +1,141 @@
+# The SPHY model Pre-Processor interface plugin for QGIS:
+# A QGIS plugin that allows the user to create SPHY model input data based on a database. 
+#
+# Copyright (C) 2015  Wilco Terink
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Email: terinkw@gmail.com
+
+#-Authorship information-###################################################################
+__author__ = "Wilco Terink"
+__copyright__ = "Wilco Terink"
+__license__ = "GPL"
+__version__ = "1.0.0"
+__email__ = "terinkw@gmail.com"
+__date__ ='1 January 2017'
+############################################################################################
+
+import os, glob
+import numpy as np
+
+#-netCDF4 is optional: it is only required for the NetCDF output of the forcing
+try:
+    import netCDF4
+except ImportError:
+    netCDF4 = None
+
+#-Import the spatial reference with the traditional axis order
+from regrid import spatialReference
+
+#-Fill value of the forcing cubes
+FILLVALUE = -9999.
+
+#-Long name and units of the forcing variables
+ATTRIBUTES = {'prec': ('precipitation', 'mm d-1'), 'tair': ('average air temperature', 'degrees C'),\
+              'tavg': ('average air temperature', 'degrees C'), 'tmax': ('maximum air temperature', 'degrees C'),\
+              'tmin': ('minimum air temperature', 'degrees C')}
+
+#-Class that writes a forcing variable as one compressed NetCDF cube (time, y, x) on the model grid, instead of one
+# PCRaster map per day. Days are buffered in memory and written per time chunk, so each chunk is compressed only once.
+class ForcingCube():
+    def __init__(self, filename, name, engine, startdate, timesteps, dayoffset=0, chunkdays=32):
+        self.chunkDays = max(1, min(chunkdays, timesteps))
+        self.buffer = []
+        self.bufferStart = 0
+        self.written = 0
+        self.nc = netCDF4.Dataset(filename, 'w', format='NETCDF4')
+        self.nc.createDimension('time', timesteps)
+        self.nc.createDimension('y', engine.rows)
+        self.nc.createDimension('x', engine.cols)
+        #-Time in days since the start date of the complete period
+        time = self.nc.createVariable('time', 'i4', ('time',))
+        time.units = 'days since ' + startdate.strftime('%Y-%m-%d') + ' 00:00:00'
+        time.calendar = 'standard'
+        time[:] = dayoffset + np.arange(timesteps)
+        #-Cell centres of the model grid
+        x = self.nc.createVariable('x', 'f8', ('x',))
+        x.standard_name = 'projection_x_coordinate'
+        x[:] = engine.xMin + (np.arange(engine.cols) + 0.5) * engine.res
+        y = self.nc.createVariable('y', 'f8', ('y',))
+        y.standard_name = 'projection_y_coordinate'
+        y[:] = engine.yMax - (np.arange(engine.rows) + 0.5) * engine.res
+        #-Grid mapping with the coordinate system and geotransform of the clone
+        crs = self.nc.createVariable('crs', 'i4')
+        crs.spatial_ref = spatialReference(engine.t_srs).ExportToWkt()
+        crs.GeoTransform = ' '.join(str(v) for v in engine.geoTransform)
+        crs.epsg_code = engine.t_srs
+        #-Forcing variable, chunked per time chunk and compressed
+        self.var = self.nc.createVariable(name, 'f4', ('time', 'y', 'x'), zlib=True, complevel=4,\
+            chunksizes=(self.chunkDays, engine.rows, engine.cols), fill_value=FILLVALUE)
+        self.var.grid_mapping = 'crs'
+        if name.lower() in ATTRIBUTES:
+            self.var.long_name, self.var.units = ATTRIBUTES[name.lower()]
+
+    #-Write the map of a day (index in this cube). NaN is written as fill value.
+    def write(self, index, data):
+        if self.buffer and index != self.bufferStart + len(self.buffer):
+            self.flush()
+        if not self.buffer:
+            self.bufferStart = index
+        self.buffer.append(np.where(np.isfinite(data), data, FILLVALUE).astype(np.float32))
+        self.written += 1
+        if len(self.buffer) == self.chunkDays:
+            self.flush()
+
+    #-Write the buffered days to the file
+    def flush(self):
+        if self.buffer:
+            self.var[self.bufferStart:self.bufferStart + len(self.buffer)] = np.array(self.buffer)
+            self.buffer = []
+
+    #-Write the buffered days and the number of days that are written, so it can be verified that a part is complete
+    def close(self):
+        self.flush()
+        self.nc.days_written = self.written
+        self.nc.close()
+
+#-Function that returns the days (index in the complete period) of the cubes of parts of the period (name_part*.nc) for each
+# forcing variable. The days of a part are only included if all of them are written, i.e. the part is complete.
+def partDays(outdir):
+    days = {}
+    for f in glob.glob(os.path.join(outdir, '*_part*.nc')):
+        name = os.path.basename(f).rsplit('_part', 1)[0]
+        nc = netCDF4.Dataset(f)
+        time = nc.variables['time'][:]
+        if getattr(nc, 'days_written', 0) == len(time):
+            days.setdefault(name, set()).update(int(d) for d in time)
+        nc.close()
+    return days
+
+#-Function that merges the cubes that are written by the worker processes for parts of the period (name_part*.nc)
+# into one cube per forcing variable, and removes the parts
+def mergeCubes(outdir, engine, startdate, timesteps, chunkdays=32):
+    parts = {}
+    for f in glob.glob(os.path.join(outdir, '*_part*.nc')):
+        name = os.path.basename(f).rsplit('_part', 1)[0]
+        parts.setdefault(name, []).append(f)
+    for name in parts:
+        cube = ForcingCube(os.path.join(outdir, name + '.nc'), name, engine, startdate, timesteps, chunkdays=chunkdays)
+        for f in sorted(parts[name]):
+            nc = netCDF4.Dataset(f)
+            days = nc.variables['time'][:]
+            var = nc.variables[name]
+            var.set_auto_mask(False)
+            for i in range(0, len(days), cube.chunkDays):
+                block = var[i:i + cube.chunkDays]
+                cube.var[days[i]:days[i] + len(block)] = block
+            nc.close()
+            os.remove(f)
+        cube.close()
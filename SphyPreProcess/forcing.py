@@ -27,24 +27,83 @@ __email__ = "terinkw@gmail.com"
 __date__ ='1 January 2017'
 ############################################################################################
 
-import datetime, subprocess, os, glob, csv, math
-from osgeo import osr
+import datetime, os, glob, csv, time, collections
+import numpy as np
+
+#-Import the in-process gdal warp engine
+from warp import WarpEngine
+#-Import the batched coordinate transformation
+from regrid import transformPoints
+#-Import the reader for monthly NetCDF files
+from slab import MonthSlabReader
+#-Import the cache with regridded rasters that is shared by projects
+from rastercache import RasterCache
+#-Import the interpolation of station data to the model grid
+import interpolation
+from interpolation import InverseDistanceInterpolator, NearestStationsInterpolator, DelaunayInterpolator
+#-Import the columnar cache of station data CSV files
+from stationdata import StationData
+#-Import the NetCDF output of the forcing
+import cube
+from cube import ForcingCube
+#-Import the PCRaster map writer for the tiles of a large model grid
+import csf
+#-Import the manifest with the completed forcing maps
+from manifest import ForcingManifest, fileFingerprint, settingsFingerprint
+#-Import the memory budget
+from memory import MemoryBudget, currentRSS
+
+#-Return the directory and maximum size (MB) of the raster cache that is shared by projects, from the [GENERAL] section of a
+# project config file. The directory is None if no cache is used (also for older project config files that don't have these settings).
+def rasterCacheSettings(config):
+    cachedir = None
+    size = 2000
+    if config.has_option('GENERAL', 'Cache_dir') and config.get('GENERAL', 'Cache_dir'):
+        cachedir = os.path.expanduser(config.get('GENERAL', 'Cache_dir'))
+    if config.has_option('GENERAL', 'Cache_size'):
+        size = config.getfloat('GENERAL', 'Cache_size')
+    return cachedir, size
+
+#-Return the memory budget in MB for the processing from the [GENERAL] section of a project config file (0 = half of the free
+# memory, also for older project config files that don't have this setting)
+def memoryBudget(config):
+    if config.has_option('GENERAL', 'Memory_budget'):
+        return config.getfloat('GENERAL', 'Memory_budget')
+    return 0
+
+#-Return the number of worker processes from the [FORCING] section of a project config file. They process the forcing, and
+# the tiles of the initial maps of a model that is processed in tiles (1 for older project config files).
+def workerCount(config):
+    if config.has_option('FORCING', 'workers'):
+        return config.getint('FORCING', 'workers')
+    return 1
+
+#-Function that splits a period of timesteps days in count shards of consecutive days. Returns the (day offset, number of
+# days) of each shard; the lengths of the shards differ at most one day.
+def shardRanges(timesteps, count):
+    return [(i * timesteps // count, (i + 1) * timesteps // count - i * timesteps // count) for i in range(count)]
 
 #-Class that defines the processing of the meteorological forcings
 class processForcing():
     def __init__(self, resultsdir, t_srs, resolution, extent, startdate, enddate, \
-            textlog, progbar, procsteps, pcrbinpath):
-        #-Create forcing directory in results directory if it does not exist
+            textlog, progbar, procsteps, pcrbinpath, tempdir=None, dayoffset=0, clean=True):
+        #-Create forcing directory in results directory if it does not exist. Old forcing files are removed when the run
+        # starts (see prepareOutput), unless they can be resumed. Worker processes don't clean (clean=False).
         self.outdir = os.path.join(resultsdir, 'forcing/')
         if not os.path.isdir(self.outdir):
-            os.mkdir(self.outdir)
-        else: #-remove old forcing files
-            f = glob.glob(self.outdir + '*' )
-            for fi in f:
-                os.remove(fi)
+            try:
+                os.mkdir(self.outdir)
+            except OSError: #-created by another worker process or shard in the meantime
+                pass
+        self.clean = clean
             
-        #-Directory for temporary files
-        self.tempdir = resultsdir
+        #-Results directory (with clone.map and dem.map) and directory for temporary files
+        self.resultsdir = resultsdir
+        if tempdir is None:
+            tempdir = resultsdir
+        self.tempdir = tempdir
+        #-Number of days before the start date, used for the pcraster extension if only a part of the period is processed
+        self.dayOffset = dayoffset
         #-Set the general settings
         self.t_srs = t_srs
         self.xMin = str(extent[0])
@@ -72,6 +131,47 @@ class processForcing():
         self.precDataFile = None
         self.tempLocFile = None
         self.tempDataFile = None
+        #-Interpolation of the user-defined stations: method (idw or delaunay), inverse distance power, number of nearest stations and
+        # search radius (0 = all stations)
+        self.interpolation = 'idw'
+        self.idwPower = 2.0
+        self.idwNeighbours = 0
+        self.idwRadius = 0.
+        #-Output format of the forcing: a PCRaster map per day (pcraster) or a NetCDF cube per variable (netcdf). Worker
+        # processes write a cube for their part of the period (cubePart), which are merged afterwards.
+        self.outputFormat = 'pcraster'
+        self.cubePart = False
+        #-Resume the forcing of a previous run: maps that are complete according to the manifest are not created again
+        self.resume = True
+        self.manifest = None
+        self.manifestFile = self.outdir + 'manifest.json'
+        #-Shard (index, count) if only a part of the period is processed, e.g. on one of the nodes that share the results
+        # folder (see setShard), or None
+        self.shard = None
+        #-Upper left cell (row, col) of the model grid in the maps if the model grid is a tile of a larger model grid, or
+        # None. The maps of the tiles are written in their window of the maps of the complete model grid (see tiling.py).
+        self.tile = None
+        #-Directory and maximum size (MB) of the cache with regridded database rasters that is shared by projects (None = no cache)
+        self.rasterCacheDir = None
+        self.rasterCacheSize = 2000
+        #-Number of days that are processed as one block (0 = determined from the memory budget)
+        self.blockDays = 0
+        #-Memory budget in MB (0 = half of the free memory). The block size and the size of the interpolation weights caches
+        # are chosen to stay under the budget.
+        self.memoryBudget = 0
+        self.memory = None
+        #-Memory in bytes that the interpolation weights caches may use at most
+        self.cacheMemory = 0
+        #-Set to True (e.g. by the forcing worker thread) to stop the run after the current variable; the maps that are
+        # created so far are kept, so the run can be resumed
+        self.cancelled = False
+        #-Tasks that could not be started (e.g. because the input is not found), and the dates (date strings) that are not
+        # found per variable
+        self.failed = []
+        self.missing = collections.OrderedDict()
+        #-Number of maps that are created and skipped (complete) by the run
+        self.created = 0
+        self.skipped = 0
         #-Log
         self.textLog = textlog
         #-progressbar
@@ -80,502 +180,679 @@ class processForcing():
         self.counter = 0.
         #-PCRaster bin directory
         self.pcrBinPath = pcrbinpath
+        #-In-process gdal engine that warps the database forcing to the model grid
+        self.engine = WarpEngine(t_srs, resolution, extent, self.resultsdir + 'clone.map')
+        #-Readers for monthly NetCDF files, one for each forcing variable
+        self.slabReaders = {}
+        #-Lapse rate corrections of the temperature, calculated once per run
+        self.lapseRates = {}
+        #-Station tables (ID, X, Y, elevation) of the location files, read and transformed once per run
+        self.stationTables = {}
         
-    #-Create precipitation forcing based on the database    
+    #-Process the forcing tasks (createPrecDB, createPrecCSV, createTempDB, createTempCSV) in one loop over the days.
+    # The days are processed in blocks: for each block all variables are read, regridded or interpolated to the model
+    # grid as a (days, rows, cols) array and written before the next block is processed, so the period is walked only
+    # once, the regridding weights are shared by the variables, and each step is one vectorized operation per block.
+    def run(self, tasks):
+        setups = {'createPrecDB': self.precDBVariables, 'createTempDB': self.tempDBVariables, 'createPrecCSV':\
+                  self.precCSVVariables, 'createTempCSV': self.tempCSVVariables}
+        if self.clean:
+            self.prepareOutput(tasks)
+        self.memory = MemoryBudget(self.memoryBudget)
+        self.cacheMemory = 0
+        #-Variables to process: (map name, function that returns the (dates, rows, cols) block of a list of dates and a
+        # boolean array that is False for the dates that are not found, clip to clone, function that returns the
+        # fingerprint of the input of a date)
+        variables = []
+        finish = []
+        self.failed = []
+        for task in tasks:
+            setup = setups[task]()
+            if setup is not None:
+                variables += setup[0]
+                finish.append(setup[1])
+            else:
+                self.failed.append(task)
+        if not variables:
+            return 0
+        if self.rasterCacheDir and self.engine.rasterCache is None:
+            self.engine.rasterCache = RasterCache(self.rasterCacheDir, self.rasterCacheSize)
+        cubes = self.openCubes([v[0] for v in variables])
+        #-Manifest with the completed maps (PCRaster output only)
+        manifest = None
+        if not cubes and (self.resume or self.shard is not None or self.tile is not None):
+            manifest = ForcingManifest(self.manifestFile)
+            manifest.load()
+        self.manifest = manifest
+        self.skipped = 0
+        self.created = 0
+        blockdays = self.blockSize()
+        #-Estimated peak memory: the memory in use now (with the weights, lapse rates etc.), the weights caches when they are
+        # full, and the block
+        estimate = (currentRSS() or 0) + self.cacheMemory + blockdays * self.dayMemory()
+        self.missing = collections.OrderedDict()
+        starttime = time.time()
+        for b in range(0, self.timeSteps, blockdays):
+            if self.cancelled:
+                break
+            days = range(b, min(b + blockdays, self.timeSteps))
+            dates = [self.startDate + datetime.timedelta(days=i) for i in days]
+            for name, read, clip, source in variables:
+                if self.cancelled:
+                    break
+                #-Maps of the block that have to be created: (day index, date, date string, map file, fingerprint)
+                todo = []
+                for i, curdate in zip(days, dates):
+                    datestr = '%04d-%02d-%02d' % (curdate.year, curdate.month, curdate.day)
+                    mapfile = self.outdir + name + self.pcrExtention(i+1)
+                    fingerprint = source(curdate) if manifest else None
+                    if manifest and manifest.isComplete(mapfile, datestr, fingerprint):
+                        self.skipped += 1
+                        #-Progress bar
+                        self.counter += 1
+                        self.progBar.setValue(self.counter/self.procSteps*100)
+                    else:
+                        todo.append((i, curdate, datestr, mapfile, fingerprint))
+                if not todo:
+                    continue
+                data, found = read([t[1] for t in todo])
+                if clip:
+                    data = np.where(self.engine.cloneMask(), data, np.nan)
+                for (i, curdate, datestr, mapfile, fingerprint), d, ok in zip(todo, data, found):
+                    self.textLog.append(name + ' ' + datestr)
+                    if not ok:
+                        self.missing.setdefault(name, []).append(datestr)
+                    elif cubes:
+                        cubes[name].write(i, d)
+                        self.created += 1
+                    else:
+                        minmax = self.writeMap(mapfile, d)
+                        self.created += 1
+                        if manifest and fingerprint:
+                            manifest.add(mapfile, datestr, fingerprint, minmax)
+                    #-Progress bar
+                    self.counter += 1
+                    self.progBar.setValue(self.counter/self.procSteps*100)
+            #-Save the manifest after every block, so not too much is lost if the run is interrupted
+            if manifest:
+                self.saveManifest()
+        if self.clean:
+            self.logMissing()
+        if self.cancelled:
+            self.info('\nProcessing of the forcing is cancelled')
+        seconds = time.time() - starttime
+        self.info('\n%d forcing maps created in %.1f s (%.1f maps/s, blocks of %d days)' % (self.created, seconds,\
+            self.created / seconds if seconds > 0 else 0., blockdays))
+        self.info(self.memory.report(estimate))
+        for c in cubes.values():
+            c.close()
+        if manifest:
+            self.saveManifest()
+            if self.skipped:
+                self.info('\n' + str(self.skipped) + ' forcing maps were already complete and are not created again')
+        if self.engine.rasterCache is not None:
+            self.info(self.engine.rasterCache.info())
+        if not self.cancelled and self.clean:
+            for f in finish:
+                f()
+
+    #-Append a message to the log. The parts of a run (e.g. in worker processes, see parallel.py) only log their progress
+    # and errors: the start and end of the tasks are logged once for the complete run (see startTasks and finishTasks).
+    def info(self, text):
+        if self.clean:
+            self.textLog.append(text)
+
+    #-Add the dates that are not found per variable by a part of the run (e.g. a worker process, see parallel.py)
+    def addMissing(self, missing):
+        for name, datestrs in missing.items():
+            self.missing.setdefault(name, []).extend(datestrs)
+
+    #-Log the dates that are not found, with one line per variable
+    def logMissing(self):
+        for name, datestrs in self.missing.items():
+            datestrs = sorted(set(datestrs))
+            if len(datestrs) == 1:
+                self.textLog.append('Error: ' + name + ' for ' + datestrs[0] + ' not found')
+            else:
+                self.textLog.append('Error: ' + name + ' for ' + str(len(datestrs)) + ' days from ' + datestrs[0] + ' to ' +\
+                    datestrs[-1] + ' not found')
+
+    #-Description of a task for the log
+    def taskName(self, task):
+        var = 'precipitation' if task in ['createPrecDB', 'createPrecCSV'] else 'temperature'
+        if task in ['createPrecDB', 'createTempDB']:
+            return var + ' from ' + str(self.dbSource) + ' database'
+        return var + ' from user-defined CSV files'
+
+    #-Log the start of the tasks of a run that is processed in parts
+    def startTasks(self, tasks):
+        for task in tasks:
+            self.textLog.append('Processing ' + self.taskName(task) + '...')
+
+    #-Log the end of the tasks of a run that is processed in parts, except the tasks that failed in a part
+    def finishTasks(self, tasks, failed=()):
+        for task in tasks:
+            if task in failed:
+                continue
+            if task == 'createPrecCSV':
+                self.finishCSV('precipitation', StationData(self.precDataFile, os.path.join(self.resultsdir, 'cache')))
+            elif task == 'createTempCSV':
+                self.finishCSV('temperature', StationData(self.tempDataFile, os.path.join(self.resultsdir, 'cache')))
+            else:
+                self.textLog.append('\nProcessing ' + self.taskName(task) + ' finished!')
+
+    #-Summary of a run that took seconds, with the number of maps that are created and that were already complete
+    def summary(self, seconds):
+        seconds = int(seconds)
+        duration = '%d:%02d:%02d' % (seconds // 3600, seconds % 3600 // 60, seconds % 60)
+        if self.cancelled:
+            summary = 'Forcing cancelled after ' + duration + ': '
+        else:
+            summary = 'Forcing finished in ' + duration + ': '
+        return summary + '%d maps created, %d maps were already complete' % (self.created, self.skipped)
+
+    #-Read the optional forcing settings from the [FORCING] section of a project config file (older project config files don't
+    # have all of these settings), and the shared raster cache and memory budget from the [GENERAL] section. Returns the number
+    # of worker processes.
+    def readConfig(self, config):
+        #-Interpolation settings for the user-defined stations
+        if config.has_option('FORCING', 'interpolation'):
+            self.interpolation = config.get('FORCING', 'interpolation')
+        if config.has_option('FORCING', 'idw_power'):
+            self.idwPower = config.getfloat('FORCING', 'idw_power')
+        if config.has_option('FORCING', 'idw_neighbours'):
+            self.idwNeighbours = config.getint('FORCING', 'idw_neighbours')
+        if config.has_option('FORCING', 'idw_radius'):
+            self.idwRadius = config.getfloat('FORCING', 'idw_radius')
+        #-Output format of the forcing, and resume of a previous run
+        if config.has_option('FORCING', 'output'):
+            self.outputFormat = config.get('FORCING', 'output')
+        if config.has_option('FORCING', 'resume'):
+            self.resume = config.getint('FORCING', 'resume') == 1
+        #-Number of days that are processed as one block
+        if config.has_option('FORCING', 'block_days'):
+            self.blockDays = config.getint('FORCING', 'block_days')
+        #-Cache with regridded database rasters that is shared by projects, and the memory budget
+        self.rasterCacheDir, self.rasterCacheSize = rasterCacheSettings(config)
+        self.memoryBudget = memoryBudget(config)
+        return workerCount(config)
+
+    #-Settings of a run that determine the forcing maps. Maps of a previous run can only be resumed if these are the same.
+    def runSettings(self, tasks):
+        modeldem = self.modelDem if self.modelDem else self.resultsdir + 'dem.map'
+        settings = {'tasks': sorted(tasks), 't_srs': self.t_srs, 'resolution': self.t_res, 'extent': [self.xMin, self.yMin,\
+                    self.xMax, self.yMax], 'dbSource': self.dbSource, 'dbSrs': self.dbSrs, 'interpolation':\
+                    [self.interpolation, self.idwPower, self.idwNeighbours, self.idwRadius], 'clone':\
+                    fileFingerprint(self.resultsdir + 'clone.map'), 'dem': fileFingerprint(modeldem)}
+        for f in ['dbDem', 'precLocFile', 'tempLocFile']:
+            settings[f] = fileFingerprint(getattr(self, f)) if getattr(self, f) else None
+        return settingsFingerprint(settings)
+
+    #-Prepare the forcing directory for a run. If the settings and start date are the same as in the previous run, then
+    # the maps that are complete according to the manifest are kept (resume), and only maps after the end date are
+    # removed. Otherwise all old forcing files are removed.
+    def prepareOutput(self, tasks):
+        if self.shard is not None:
+            return self.prepareShard(tasks)
+        settings = self.runSettings(tasks)
+        startdate = self.startDate.isoformat()
+        manifest = ForcingManifest(self.manifestFile)
+        if self.resume and self.outputFormat != 'netcdf' and manifest.load() and manifest.settings == settings and\
+                manifest.startDate == startdate:
+            self.mergeManifests(manifest)
+            enddate = self.endDate.isoformat()
+            for name in list(manifest.maps):
+                if manifest.maps[name]['date'] > enddate:
+                    del manifest.maps[name]
+                    if os.path.isfile(self.outdir + name):
+                        os.remove(self.outdir + name)
+            self.removeAuxFiles(self.outdir)
+            self.textLog.append('Resuming the forcing of the previous run: ' + str(len(manifest.maps)) + ' maps are complete\n')
+        else: #-remove old forcing files
+            f = glob.glob(self.outdir + '*' )
+            for fi in f:
+                os.remove(fi)
+            manifest.reset(settings, startdate)
+        manifest.save()
+
+    #-Prepare the forcing directory for a shard. Other shards may be writing to the same directory, so nothing is removed:
+    # the shard has its own manifest, and the maps of a previous run of the shard that are complete are kept (resume) if
+    # the settings and the start date of the complete period are the same.
+    def prepareShard(self, tasks):
+        settings = self.runSettings(tasks)
+        startdate = (self.startDate - datetime.timedelta(days=self.dayOffset)).isoformat()
+        manifest = ForcingManifest(self.manifestFile)
+        if self.resume and manifest.load() and manifest.settings == settings and manifest.startDate == startdate:
+            self.mergeManifests(manifest)
+            self.textLog.append('Resuming shard %d of %d: %d maps are complete\n' % (self.shard[0], self.shard[1],\
+                len(manifest.maps)))
+        else:
+            for f in glob.glob(self.manifestFile[:-5] + '_part*.json'):
+                os.remove(f)
+            manifest.reset(settings, startdate)
+        manifest.save()
+
+    #-Merge the part manifests of the worker processes into the manifest
+    def mergeManifests(self, manifest=None):
+        if manifest is None:
+            manifest = ForcingManifest(self.manifestFile)
+            if not manifest.load():
+                return
+        for f in glob.glob(self.manifestFile[:-5] + '_part*.json'):
+            manifest.merge(f)
+        manifest.save()
+
+    #-Save the manifest; worker processes save the maps they created in a part manifest
+    def saveManifest(self):
+        if self.clean:
+            self.manifest.save()
+        else:
+            self.manifest.save(self.manifestFile[:-5] + '_part%05d.json' % self.dayOffset, part=True)
+
+    #-Write a forcing map of the model grid. A tile is written in its window of the map of the complete model grid, which
+    # is created before the tiles are processed; returns the minimum and maximum value of the tile (None if all are missing).
+    def writeMap(self, mapfile, data):
+        if self.tile is None:
+            self.engine.writeMap(mapfile, data, clip=False)
+            return None
+        writer = csf.MapWriter(mapfile)
+        writer.write(self.tile[0], self.tile[1], data)
+        writer.close(header=False)
+        return writer.minmax
+
+    #-Manifest file of shard index of count shards
+    def shardManifestFile(self, index, count):
+        return self.outdir + 'manifest_shard%03dof%03d.json' % (index, count)
+
+    #-Process only shard index (0, 1, ..., count-1) of count shards of the period: a range of consecutive days that does
+    # not overlap with the other shards, so the shards can be run at the same time by independent processes (e.g. batch
+    # jobs on different nodes) that only share the results folder. The day offset gives the maps the pcraster extension of
+    # the complete period, and the NetCDF output is written as a cube for the part of the period. Use verifyShards when all
+    # shards are finished.
+    def setShard(self, index, count):
+        if count < 1 or count > self.timeSteps or index < 0 or index >= count:
+            raise ValueError('Shard %d of %d is not possible for a period of %d days' % (index, count, self.timeSteps))
+        offset, days = shardRanges(self.timeSteps, count)[index]
+        self.procSteps = self.procSteps * days / float(self.timeSteps)
+        self.startDate = self.startDate + datetime.timedelta(days=offset)
+        self.endDate = self.startDate + datetime.timedelta(days=days - 1)
+        self.timeSteps = days
+        self.dayOffset = self.dayOffset + offset
+        self.shard = (index, count)
+        self.manifestFile = self.shardManifestFile(index, count)
+        self.cubePart = True
+
+    #-Names of the forcing variables (maps) that are created by the tasks
+    def variableNames(self, tasks):
+        names = []
+        for task in tasks:
+            if task in ['createPrecDB', 'createPrecCSV']:
+                names.append('prec')
+            elif task == 'createTempCSV' or self.dbSource == 'WFDEI':
+                names += ['Tair', 'Tmax', 'Tmin']
+            elif self.dbSource == 'FEWS_RFE2.0_GSOD':
+                names += ['tair', 'tmax', 'tmin']
+            elif self.dbSource == 'ERA-INTERIM':
+                names += ['tavg', 'tmax', 'tmin']
+        return names
+
+    #-Verify the forcing of the complete period after all count shards have finished, and merge their output. The manifests
+    # of the shards are merged into the manifest of the forcing (PCRaster output), or the cubes of the shards into one cube
+    # per variable (NetCDF output). Nothing is merged if maps are missing, so the incomplete shards can be run again and
+    # resume where they stopped. Returns True if the forcing is complete.
+    def verifyShards(self, tasks, count):
+        names = self.variableNames(tasks)
+        netcdf = self.outputFormat == 'netcdf' and cube.netCDF4 is not None
+        if netcdf:
+            days = cube.partDays(self.outdir)
+        else:
+            settings = self.runSettings(tasks)
+            startdate = self.startDate.isoformat()
+            manifest = ForcingManifest(self.manifestFile)
+            manifest.reset(settings, startdate)
+        missing = 0
+        for index, (offset, n) in enumerate(shardRanges(self.timeSteps, count)):
+            if not netcdf:
+                #-Maps of the shard, including the part manifests of its worker processes if the shard was interrupted
+                part = ForcingManifest(self.shardManifestFile(index, count))
+                if part.load() and part.settings == settings and part.startDate == startdate:
+                    for f in glob.glob(part.filename[:-5] + '_part*.json'):
+                        part.merge(f)
+                    part.save()
+                    manifest.maps.update(part.maps)
+            lacking = 0
+            for i in range(offset, offset + n):
+                curdate = self.startDate + datetime.timedelta(days=i)
+                datestr = '%04d-%02d-%02d' % (curdate.year, curdate.month, curdate.day)
+                for name in names:
+                    if netcdf:
+                        complete = i in days.get(name, ())
+                    else:
+                        complete = manifest.hasMap(self.outdir + name + self.pcrExtention(i+1), datestr)
+                    if not complete:
+                        lacking += 1
+            first = self.startDate + datetime.timedelta(days=offset)
+            last = first + datetime.timedelta(days=n - 1)
+            if lacking:
+                self.textLog.append('Shard %d of %d (%s to %s) is incomplete: %d of %d maps are missing' % (index, count,\
+                    first.isoformat(), last.isoformat(), lacking, n * len(names)))
+            missing += lacking
+        if missing:
+            self.textLog.append('\nThe forcing is incomplete: %d maps are missing. Run the incomplete shards again.' % missing)
+            return False
+        if netcdf:
+            cube.mergeCubes(self.outdir, self.engine, self.startDate, self.timeSteps)
+        else:
+            manifest.save()
+        for index in range(count):
+            if os.path.isfile(self.shardManifestFile(index, count)):
+                os.remove(self.shardManifestFile(index, count))
+        self.textLog.append('\nThe forcing of all %d shards is complete: %d maps' % (count, self.timeSteps * len(names)))
+        return True
+
+    #-Open a NetCDF cube for each variable if the output format is netcdf, otherwise return an empty dictionary
+    def openCubes(self, names):
+        cubes = {}
+        if self.outputFormat != 'netcdf':
+            return cubes
+        if cube.netCDF4 is None:
+            self.textLog.append('Warning: NetCDF output requires netCDF4, the forcing is written as PCRaster maps instead')
+            return cubes
+        #-Start date of the complete period
+        startdate = self.startDate - datetime.timedelta(days=self.dayOffset)
+        for name in names:
+            if self.cubePart:
+                filename = self.outdir + name + '_part%05d.nc' % self.dayOffset
+            else:
+                filename = self.outdir + name + '.nc'
+            cubes[name] = ForcingCube(filename, name, self.engine, startdate, self.timeSteps, self.dayOffset)
+        return cubes
+
+    #-Create precipitation forcing based on the database
     def createPrecDB(self):
-        #-If the database is from WFDEI (Watch forcing)
+        self.run(['createPrecDB'])
+
+    #-Create temperature forcing based on the database
+    def createTempDB(self):
+        self.run(['createTempDB'])
+
+    #-Create precipitation forcing based on user-defined stations
+    def createPrecCSV(self):
+        self.run(['createPrecCSV'])
+
+    #-Create temperature forcing based on user-defined stations
+    def createTempCSV(self):
+        self.run(['createTempCSV'])
+
+    #-Precipitation variable from the database
+    def precDBVariables(self):
+        #-If the database is from WFDEI (Watch forcing): regrid the day from the monthly file to the model grid and
+        # convert from mm/s to mm/d
         if self.dbSource == 'WFDEI':
-            self.textLog.append('Processing precipitation from ' + self.dbSource + ' database...\n')
-            for i in range(0, self.timeSteps):
-                daynr = i+1 # required for pcraster extension
-                curdate = self.startDate + datetime.timedelta(days=i)
-                year = str(curdate.year)
-                month = curdate.month
-                if month<10:
-                    month = '0'+str(month)
-                else:
-                    month = str(month)
-                day = curdate.day
-                if day<10:
-                    day = '0'+str(day)
-                else:
-                    day = str(day)
-                commands = []
-                #-command for extracting band and converting to GTiff format
-                com = 'gdal_translate -ot Float32 -of GTiff -b ' + day + ' ' + self.precDBPath + 'Prec_daily_WFDEI_GPCC_cl_' +\
-                    year + month + '.nc ' + self.tempdir + 'temp.tif'
-                commands.append(com)
-                #-command to project, resample, and extract to the correct extent
-                com = 'gdalwarp -s_srs ' + self.dbSrs + ' -t_srs ' + self.t_srs + ' -te ' + \
-                     self.xMin + ' ' + self.yMin + ' ' + self.xMax + ' ' + self.yMax + ' -tr ' + \
-                     self.t_res + ' ' + self.t_res + ' -r bilinear ' + self.tempdir + 'temp.tif ' + \
-                     self.tempdir + 'temp2.tif'
-                commands.append(com)
-                #-command to convert to pcraster map
-                com = 'gdal_translate -of PCRaster -ot Float32 ' + self.tempdir + 'temp2.tif ' + self.tempdir + 'temp.map'
-                commands.append(com)
-                pcrstr = self.pcrExtention(daynr)
-                #-command to convert to pcraster map with extension and convert from mm/s to mm/d
-                com = self.pcrasterModelFile('"' + self.outdir + 'prec' + pcrstr + '" = if("' + self.tempdir + 'clone.map", 3600 * 24 * "' + self.tempdir + 'temp.map")')
-                commands.append('pcrcalc -f ' + com)
-                self.subProcessing(commands)
-                #-Progress bar
-                self.counter += 1
-                self.progBar.setValue(self.counter/self.procSteps*100)
-                #-Text log
-                self.textLog.append('Prec ' + year + '-' + month + '-' + day)
-                #-Remove unnecessary files
-                self.removeFiles(self.tempdir, self.outdir)
-                
-            self.textLog.append('\nProcessing precipitation from ' + self.dbSource + ' database finished!')
-        
+            def path(date):
+                return self.precDBPath + 'Prec_daily_WFDEI_GPCC_cl_%04d%02d.nc' % (date.year, date.month)
+            def read(dates):
+                prec, found = self.slabBlock('prec', path, dates)
+                return prec * np.float32(3600 * 24), found
+            def source(date):
+                return fileFingerprint(path(date), ':' + str(date.day))
         #-Else if the database is from FEWS_RFE2.0 (For South East Afrika Database) or from ERA-INTERIM (Used for Iberian Peninsula)
         elif self.dbSource == 'FEWS_RFE2.0_GSOD' or self.dbSource == 'ERA-INTERIM':
-            self.textLog.append('Processing precipitation from ' + self.dbSource + ' database...\n')
-            for i in range(0, self.timeSteps):
-                daynr = i+1 # required for pcraster extension
-                curdate = self.startDate + datetime.timedelta(days=i)
-                year = str(curdate.year)
-                month = curdate.month
-                if month<10:
-                    month = '0'+str(month)
-                else:
-                    month = str(month)
-                day = curdate.day
-                if day<10:
-                    day = '0'+str(day)
-                else:
-                    day = str(day)
-                commands = []
-                #-command to project, resample, and extract to the correct extent
-                com = 'gdalwarp -ot Float32 -s_srs ' + self.dbSrs + ' -t_srs ' + self.t_srs + ' -te ' + \
-                     self.xMin + ' ' + self.yMin + ' ' + self.xMax + ' ' + self.yMax + ' -tr ' + \
-                     self.t_res + ' ' + self.t_res + ' -r bilinear ' + self.precDBPath + year + month + \
-                     day + '_prec.tif ' + self.tempdir + 'temp.tif'
-                commands.append(com)
-                #-command to convert to pcraster map
-                com = 'gdal_translate -of PCRaster -ot Float32 ' + self.tempdir + 'temp.tif ' + self.tempdir + 'temp.map'
-                commands.append(com)
-                pcrstr = self.pcrExtention(daynr)
-                #-command to convert to pcraster map with extension
-                com = self.pcrasterModelFile('"' + self.outdir + 'prec' + pcrstr + '" = if("' + self.tempdir + 'clone.map", "' + self.tempdir + 'temp.map")')
-                commands.append('pcrcalc -f ' + com)
-                self.subProcessing(commands)
-                #-Progress bar
-                self.counter += 1
-                self.progBar.setValue(self.counter/self.procSteps*100)
-                #-Text log
-                self.textLog.append('Prec ' + year + '-' + month + '-' + day)
-                #-Remove unnecessary files
-                self.removeFiles(self.tempdir, self.outdir)
-            self.textLog.append('\nProcessing precipitation from ' + self.dbSource + ' database finished!')
+            def path(date):
+                return self.precDBPath + '%04d%02d%02d_prec.tif' % (date.year, date.month, date.day)
+            def read(dates):
+                return self.engine.regridBlock([path(d) for d in dates], self.dbSrs)
+            def source(date):
+                return fileFingerprint(path(date))
         else:
             self.textLog.append('Error: processing of precipitation from database not possible because database is not found')
-        
-    #-Create temperature forcing based on the database
-    def createTempDB(self):
-        #-If the database is from WFDEI (Watch forcing)
+            return None
+        self.info('Processing precipitation from ' + self.dbSource + ' database...\n')
+        def finish():
+            self.textLog.append('\nProcessing precipitation from ' + self.dbSource + ' database finished!')
+        return [('prec', read, True, source)], finish
+
+    #-Temperature variables from the database, corrected for the elevation with a lapse rate
+    def tempDBVariables(self):
+        variables = []
+        #-If the database is from WFDEI (Watch forcing): regrid the day from the monthly file, correct with the difference
+        # between the model dem and WFDEI dem, and convert from Kelvin to degrees Celsius
         if self.dbSource == 'WFDEI':
-            self.textLog.append('\nProcessing temperature from ' + self.dbSource + ' database...\n')
-            commands = []
-            #-Convert the WFDEI dem (NetCDF) to a GeoTiff
-            com = 'gdal_translate -of GTiff ' + self.dbDem + ' ' + self.tempdir + 'temp.tif'
-            commands.append(com)
-            self.textLog.append('\nConverting WFDEI dem to GeoTiff')
-            #-Resample the WFDEI dem to the clone projection, extent, and resolution
-            com = 'gdalwarp -r bilinear -ot Float32 -s_srs ' + self.dbSrs + ' -t_srs ' + self.t_srs + \
-                ' -tr ' + self.t_res + ' ' + self.t_res + ' -te ' + self.xMin + ' ' + \
-                self.yMin + ' ' + self.xMax + ' ' + self.yMax + ' ' + self.tempdir + \
-                'temp.tif ' + self.tempdir + 'temp2.tif'
-            commands.append(com)
-            self.textLog.append('\nResampling WFDEI dem to clone resolution, projection, and extent')
-            #-Convert to PCRaster format
-            com = 'gdal_translate -of PCRaster ' + self.tempdir + 'temp2.tif ' + \
-                self.tempdir + 'demWFDEI.map'
-            commands.append(com)
-            self.textLog.append('\nConverting WFDEI dem to pcraster format: demWFDEI.map')
-            #-Difference between model dem and WFDEI dem
-            com = self.pcrasterModelFile('"' + self.tempdir + 'demDiff.map' + '" = "' + self.modelDem + '" - "' + self.tempdir + 'demWFDEI.map"') 
-            commands.append('pcrcalc -f ' + com)
-            self.textLog.append('\nCalculating the difference between the model dem and WFDEI dem: demDiff.map\n')
-            self.subProcessing(commands)
-            #-Remove temporary files
-            self.removeFiles(self.tempdir, self.outdir)
-            #-Loop over the 3 temperature forcings and create daily maps
-            forcings = {'Tair': self.tavgDBPath, 'Tmax': self.tmaxDBPath, 'Tmin': self.tminDBPath}
-            for f in forcings:
-                for i in range(0, self.timeSteps):
-                    daynr = i+1 # required for pcraster extension
-                    curdate = self.startDate + datetime.timedelta(days=i)
-                    year = str(curdate.year)
-                    month = curdate.month
-                    if month<10:
-                        month = '0'+str(month)
-                    else:
-                        month = str(month)
-                    day = curdate.day
-                    if day<10:
-                        day = '0'+str(day)
-                    else:
-                        day = str(day)
-                    self.textLog.append(f + ' ' + year + '-' + month + '-' + day)    
-                    commands = []
-                    #-command for extracting band and converting to GTiff format
-                    com = 'gdal_translate -ot Float32 -of GTiff -b ' + day + ' ' + forcings[f] + f + '_daily_WFDEI_cl_' +\
-                        year + month + '.nc ' + self.tempdir + 'temp.tif'
-                    commands.append(com)
-                    #-command to project, resample, and extract to the correct extent
-                    com = 'gdalwarp -s_srs ' + self.dbSrs + ' -t_srs ' + self.t_srs + ' -te ' + \
-                        self.xMin + ' ' + self.yMin + ' ' + self.xMax + ' ' + self.yMax + ' -tr ' + \
-                        self.t_res + ' ' + self.t_res + ' -r bilinear ' + self.tempdir + 'temp.tif ' + \
-                        self.tempdir + 'temp2.tif'
-                    commands.append(com)
-                    #-command to convert to pcraster map
-                    com = 'gdal_translate -of PCRaster -ot Float32 ' + self.tempdir + 'temp2.tif ' + self.tempdir + 'temp.map'
-                    commands.append(com)
-                    pcrstr = self.pcrExtention(daynr)
-                    #-command to calculate the correct temperature using a lapse rate and the demDiff.map
-                    com = self.pcrasterModelFile('"' + self.outdir + f + pcrstr + '" = ("' + self.tempdir + \
-                        'temp.map" + (-0.0065 * "' + self.tempdir + 'demDiff.map")) - 273.15')
-                    commands.append('pcrcalc -f ' + com)
-                    self.subProcessing(commands)
-                    #-Progress bar
-                    self.counter += 1
-                    self.progBar.setValue(self.counter/self.procSteps*100)
-                    #-Remove temporary files
-                    self.removeFiles(self.tempdir, self.outdir)
-            
-            self.textLog.append('\nProcessing temperature from ' + self.dbSource + ' database finished!')
-        
-        #-Else if the database is GSOD interpolated stations (interpolated to reference elevation = 0 MASL).
-        elif self.dbSource == 'FEWS_RFE2.0_GSOD':  
-            self.textLog.append('\nProcessing temperature from ' + self.dbSource + ' database...\n')
-            #-Loop over the 3 temperature forcings and create daily maps
-            forcings = {'tair': self.tavgDBPath, 'tmax': self.tmaxDBPath, 'tmin': self.tminDBPath}
-            for f in forcings:
-                for i in range(0, self.timeSteps):
-                    daynr = i+1 # required for pcraster extension
-                    curdate = self.startDate + datetime.timedelta(days=i)
-                    year = str(curdate.year)
-                    month = curdate.month
-                    if month<10:
-                        month = '0'+str(month)
-                    else:
-                        month = str(month)
-                    day = curdate.day
-                    if day<10:
-                        day = '0'+str(day)
-                    else:
-                        day = str(day)
-                    self.textLog.append(f + ' ' + year + '-' + month + '-' + day)    
-                    commands = []
-                    #-command to project, resample, and extract to the correct extent
-                    com = 'gdalwarp -ot Float32 -s_srs ' + self.dbSrs + ' -t_srs ' + self.t_srs + ' -te ' + \
-                        self.xMin + ' ' + self.yMin + ' ' + self.xMax + ' ' + self.yMax + ' -tr ' + \
-                        self.t_res + ' ' + self.t_res + ' -r bilinear ' + forcings[f] + f + '_' + \
-                        year + month + day + '.tif ' + self.tempdir + 'temp.tif'
-                    commands.append(com)
-                    #-command to convert to pcraster map
-                    com = 'gdal_translate -of PCRaster -ot Float32 ' + self.tempdir + 'temp.tif ' + self.tempdir + 'temp.map'
-                    commands.append(com)
-                    pcrstr = self.pcrExtention(daynr)
-                    #-command to calculate the correct temperature using a lapse rate and the dem.map
-                    com = self.pcrasterModelFile('"' + self.outdir + f + pcrstr + '" = ("' + self.tempdir + \
-                        'temp.map" + (-0.0065 * "' + self.modelDem +'"))')
-                    commands.append('pcrcalc -f ' + com)
-                    self.subProcessing(commands)
-                    #-Progress bar
-                    self.counter += 1
-                    self.progBar.setValue(self.counter/self.procSteps*100)
-                    #-Remove temporary files
-                    self.removeFiles(self.tempdir, self.outdir)
-            self.textLog.append('\nProcessing temperature from ' + self.dbSource + ' database finished!')
-        
-        #-If the database is from ERA-INTERIM (Used for Iberian Peninsula)
+            self.info('\nProcessing temperature from ' + self.dbSource + ' database...\n')
+            self.info('\nCalculating the difference between the model dem and WFDEI dem\n')
+            offset = self.lapseRateOffset(self.dbDem, -273.15)
+            if offset is None:
+                return None
+            for f, path in [('Tair', self.tavgDBPath), ('Tmax', self.tmaxDBPath), ('Tmin', self.tminDBPath)]:
+                def filename(date, f=f, path=path):
+                    return path + f + '_daily_WFDEI_cl_%04d%02d.nc' % (date.year, date.month)
+                def read(dates, f=f, filename=filename):
+                    temp, found = self.slabBlock(f, filename, dates)
+                    return temp + offset, found
+                def source(date, filename=filename):
+                    return fileFingerprint(filename(date), ':' + str(date.day))
+                variables.append((f, read, False, source))
+        #-Else if the database is GSOD interpolated stations (interpolated to reference elevation = 0 MASL)
+        elif self.dbSource == 'FEWS_RFE2.0_GSOD':
+            self.info('\nProcessing temperature from ' + self.dbSource + ' database...\n')
+            offset = self.lapseRateOffset()
+            if offset is None:
+                return None
+            for f, path in [('tair', self.tavgDBPath), ('tmax', self.tmaxDBPath), ('tmin', self.tminDBPath)]:
+                def filename(date, f=f, path=path):
+                    return path + f + '_%04d%02d%02d.tif' % (date.year, date.month, date.day)
+                def read(dates, filename=filename):
+                    temp, found = self.engine.regridBlock([filename(d) for d in dates], self.dbSrs)
+                    return temp + offset, found
+                def source(date, filename=filename):
+                    return fileFingerprint(filename(date))
+                variables.append((f, read, False, source))
+        #-If the database is from ERA-INTERIM (Used for Iberian Peninsula): regrid, and correct with the difference between
+        # the model dem and ERA dem. The regridding is linear, so the reference elevation temperature of the ERA dem
+        # (A+(B*0.0065)) and the correction with the model dem are combined in one offset on the model grid that is
+        # calculated only once per run.
         elif self.dbSource == 'ERA-INTERIM':
-            self.textLog.append('\nProcessing temperature from ' + self.dbSource + ' database...\n')
-            #-Loop over the 3 temperature forcings and create daily maps
-            forcings = {'tavg': self.tavgDBPath, 'tmax': self.tmaxDBPath, 'tmin': self.tminDBPath}
-            for f in forcings:
-                for i in range(0, self.timeSteps):
-                    daynr = i+1 # required for pcraster extension
-                    curdate = self.startDate + datetime.timedelta(days=i)
-                    year = str(curdate.year)
-                    month = curdate.month
-                    if month<10:
-                        month = '0'+str(month)
-                    else:
-                        month = str(month)
-                    day = curdate.day
-                    if day<10:
-                        day = '0'+str(day)
-                    else:
-                        day = str(day)
-                    self.textLog.append(f + ' ' + year + '-' + month + '-' + day)    
-                    commands = []
-                    #-Calculate reference elevation temperature
-                    com = 'gdal_calc.py -A ' + forcings[f] + year + month + day + '_' + f + '.tif -B ' + \
-                        self.dbDem + ' --outfile=' + self.tempdir + 'temp.tif --calc="A+(B*0.0065)"'
-                    commands.append(com)
-                    #-command to project, resample, and extract to the correct extent
-                    com = 'gdalwarp -s_srs ' + self.dbSrs + ' -t_srs ' + self.t_srs + ' -te ' + \
-                        self.xMin + ' ' + self.yMin + ' ' + self.xMax + ' ' + self.yMax + ' -tr ' + \
-                        self.t_res + ' ' + self.t_res + ' -r bilinear ' + self.tempdir + 'temp.tif ' + \
-                        self.tempdir + 'temp2.tif'
-                    commands.append(com)
-                    #-Convert reference temperature map to pcraster map
-                    com = 'gdal_translate -of PCRaster -ot Float32 ' + self.tempdir + 'temp2.tif ' + self.tempdir + 'temp.map'
-                    commands.append(com)
-                    #-command to calculate the correct temperature using a lapse rate
-                    pcrstr = self.pcrExtention(daynr)
-                    com = self.pcrasterModelFile('"' + self.outdir + f + pcrstr + '" = "' + self.tempdir + \
-                        'temp.map" - (0.0065 * "' + self.modelDem + '")')
-                    commands.append('pcrcalc -f ' + com)
-                    self.subProcessing(commands)
-                    #-Progress bar
-                    self.counter += 1
-                    self.progBar.setValue(self.counter/self.procSteps*100)
-                    #-Remove temporary files
-                    self.removeFiles(self.tempdir, self.outdir)
-
-            self.textLog.append('\nProcessing temperature from ' + self.dbSource + ' database finished!')    
+            self.info('\nProcessing temperature from ' + self.dbSource + ' database...\n')
+            offset = self.lapseRateOffset(self.dbDem)
+            if offset is None:
+                return None
+            for f, path in [('tavg', self.tavgDBPath), ('tmax', self.tmaxDBPath), ('tmin', self.tminDBPath)]:
+                def filename(date, f=f, path=path):
+                    return path + '%04d%02d%02d_' % (date.year, date.month, date.day) + f + '.tif'
+                def source(date, filename=filename):
+                    return fileFingerprint(filename(date))
+                def read(dates, filename=filename):
+                    temp, found = self.engine.regridBlock([filename(d) for d in dates], self.dbSrs)
+                    return temp + offset, found
+                variables.append((f, read, False, source))
         else:
             self.textLog.append('\nError: processing of temperature from database not possible because database is not found')
-        
-    #-Create precipitation forcing based on user-defined stations        
-    def createPrecCSV(self):
-        if os.path.isfile(self.precLocFile) and os.path.isfile(self.precDataFile):
-            self.textLog.append('Processing precipitation from user-defined CSV files...\n')
-            stations = self.readStationsLoc(self.precLocFile)
-            #-outsize in pixels
-            outsizeX = int(math.floor((int(self.xMax) - int(self.xMin)) / float(self.t_res)))
-            outsizeY = int(math.floor((int(self.yMax) - int(self.yMin)) / float(self.t_res)))
-            with open(self.precDataFile, 'rb') as csvfile:
-                rain_data = csv.reader(csvfile, delimiter=',')
-                rain_data.next()
-                for row in rain_data:
-                    date = datetime.datetime.strptime(row[0], '%d-%m-%Y')
-                    date = datetime.date(date.year, date.month, date.day)
-                    if date > self.startDate or date > self.endDate: #-check if period can be found in user defined data
-                        self.textLog.append('\nError: Defined period to process can not be found in data csv file!')
-                        return 0
-                    elif date == self.startDate: #-stop if start date is found
-                        daynr = 1
-                        break
-                self.textLog.append('Prec ' + str(date.year) + '-' + str(date.month) + '-' + str(date.day))
-                #-Create output csv file
-                f = open(os.path.join(self.tempdir, 'temp_prec.csv'), 'w')
-                f.write('X,Y,temp_prec\n')
-                #-Write first day of data to file
-                for i in range(1, len(row)):
-                    ##-TEST FOR missing values
-                    if int(float(row[i])) != -9999:
-                        f.write('%f,%f,%f\n' %(float(stations[i-1][1]), float(stations[i-1][2]), float(row[i])))
-                f.close()
-                #-Create a VRT file
-                self.vrtCreate('temp_prec')
-                commands = []
-                #-Convert to a grid
-                com = 'gdal_grid -a invdist:power=2.0:smoothing=0.0 -ot Float32 -txe ' + self.xMin + \
-                    ' ' + self.xMax + ' -tye ' + self.yMin + ' ' + self.yMax + ' -outsize ' + str(outsizeX) + \
-                    ' ' + str(outsizeY) + ' -l temp_prec ' + self.tempdir + 'temp_prec.vrt ' + self.tempdir + 'temp.tif'
-                commands.append(com)
-                #-Warp to extent and resolution
-                com = 'gdalwarp -te ' + self.xMin + ' ' + self.yMin + ' '  + self.xMax + ' ' + self.yMax +\
-                 ' -tr ' + self.t_res + ' ' + self.t_res + ' -r bilinear ' + self.tempdir + 'temp.tif ' +\
-                 self.tempdir + 'temp2.tif'
-                commands.append(com)
-                #-Convert to pcraster map
-                com = 'gdal_translate -of PCRaster ' + self.tempdir + 'temp2.tif ' + self.tempdir + 'temp.map'
-                commands.append(com)
-                #-Clip from clone
-                pcrstr = self.pcrExtention(daynr)
-                com = self.pcrasterModelFile('"' + self.outdir + 'prec' + pcrstr + '" = if("' + self.tempdir + 'clone.map", "' + self.tempdir + 'temp.map")')
-                commands.append('pcrcalc -f ' + com)
-                self.subProcessing(commands)
-                #-Progress bar
-                self.counter += 1
-                self.progBar.setValue(self.counter/self.procSteps*100)
-                #-Remove temporary files
-                self.removeFiles(self.tempdir, self.outdir)
-                #-Continue looping until the end date
-                for row in rain_data:
-                    daynr+=1
-                    date = datetime.datetime.strptime(row[0],'%d-%m-%Y')
-                    date = datetime.date(date.year, date.month, date.day)
-                    if date>self.endDate:
-                        self.textLog.append('\nError: Defined period to process can not be found in data csv file!')
-                        return 0
-                    self.textLog.append('Prec ' + str(date.year) + '-' + str(date.month) + '-' + str(date.day))
-                    #-Create output csv file
-                    f = open(os.path.join(self.tempdir, 'temp_prec.csv'), 'w')
-                    f.write('X,Y,temp_prec\n')
-                    for i in range(1, len(row)):
-                        ##-TEST FOR missing values
-                        if int(float(row[i])) != -9999:
-                            f.write('%f,%f,%f\n' %(float(stations[i-1][1]), float(stations[i-1][2]), float(row[i])))
-                    f.close()
-                    #-Create a VRT File
-                    self.vrtCreate('temp_prec')
-                    commands = []
-                    #-Convert to a grid
-                    com = 'gdal_grid -a invdist:power=2.0:smoothing=0.0 -ot Float32 -txe ' + self.xMin + \
-                        ' ' + self.xMax + ' -tye ' + self.yMin + ' ' + self.yMax + ' -outsize ' + str(outsizeX) + \
-                        ' ' + str(outsizeY) + ' -l temp_prec ' + self.tempdir + 'temp_prec.vrt ' + self.tempdir + 'temp.tif'
-                    commands.append(com)
-                    #-Warp to extent and resolution
-                    com = 'gdalwarp -te ' + self.xMin + ' ' + self.yMin + ' '  + self.xMax + ' ' + self.yMax +\
-                     ' -tr ' + self.t_res + ' ' + self.t_res + ' -r bilinear ' + self.tempdir + 'temp.tif ' +\
-                     self.tempdir + 'temp2.tif'
-                    commands.append(com)
-                    #-Convert to pcraster map
-                    com = 'gdal_translate -of PCRaster ' + self.tempdir + 'temp2.tif ' + self.tempdir + 'temp.map'
-                    commands.append(com)
-                    #-Clip from clone
-                    pcrstr = self.pcrExtention(daynr)
-                    com = self.pcrasterModelFile('"' + self.outdir + 'prec' + pcrstr + '" = if("' + self.tempdir + 'clone.map", "' + self.tempdir + 'temp.map")')
-                    commands.append('pcrcalc -f ' + com)
-                    self.subProcessing(commands)
-                    #-Progress bar
-                    self.counter += 1
-                    self.progBar.setValue(self.counter/self.procSteps*100)
-                    #-Remove temporary files
-                    self.removeFiles(self.tempdir, self.outdir)
-                    #-Stop if end date is found
-                    if date == self.endDate:
-                        self.textLog.append('\nProcessing precipitation from user-defined CSV files finished!')
-                        break
-                #-if the CSV file has less records than the user defined end date
-                if date<self.endDate:
-                    self.textLog.append('\nProcessing precipitation from user-defined CSV files finished, but not all dates are processed because the data CSV file contains a shorter period than defined by the user!')
+            return None
+        def finish():
+            self.textLog.append('\nProcessing temperature from ' + self.dbSource + ' database finished!')
+        return variables, finish
+
+    #-Open the station locations and data CSV files, and return the interpolator and the data, or None if the files are
+    # not found or if the period can not be found in the data
+    def stationData(self, locfile, datafile, var):
+        if not (locfile and datafile and os.path.isfile(locfile) and os.path.isfile(datafile)):
+            self.textLog.append('\nError: processing of ' + var + ' not possible because CSV files not found')
+            return None
+        stations = self.readStationsLoc(locfile)
+        #-Interpolation weights between the stations and the model grid (calculated only once)
+        idw = self.stationInterpolator(stations)
+        #-Station data from the columnar cache of the data CSV file
+        data = StationData(datafile, os.path.join(self.resultsdir, 'cache'))
+        #-Check if the period can be found in the user-defined data. A part of the period (see parallel.py) is checked with
+        # the start date of the complete period, the dates after the end of the data are logged as not found.
+        startdate = self.startDate - datetime.timedelta(days=self.dayOffset)
+        if data.row(startdate) is None or self.startDate > self.endDate:
+            self.textLog.append('\nError: Defined period to process can not be found in data csv file!')
+            return None
+        return stations, idw, data
+
+    #-Log the end of the processing of user-defined CSV files
+    def finishCSV(self, var, data):
+        #-if the CSV file has less records than the user defined end date
+        if data.row(self.endDate) is None:
+            self.textLog.append('\nProcessing ' + var + ' from user-defined CSV files finished, but not all dates are processed because the data CSV file contains a shorter period than defined by the user!')
         else:
-            self.textLog.append('\nError: processing of precipitation not possible because CSV files not found')
+            self.textLog.append('\nProcessing ' + var + ' from user-defined CSV files finished!')
 
-    #-Create temperature forcing based on user-defined stations        
-    def createTempCSV(self):
-        if os.path.isfile(self.tempLocFile) and os.path.isfile(self.tempDataFile):
-            self.textLog.append('\nProcessing temperature from user-defined CSV files...\n')
-            stations = self.readStationsLoc(self.tempLocFile)
-            #-outsize in pixels
-            outsizeX = int(math.floor((int(self.xMax) - int(self.xMin)) / float(self.t_res)))
-            outsizeY = int(math.floor((int(self.yMax) - int(self.yMin)) / float(self.t_res)))
-            with open(self.tempDataFile, 'rb') as csvfile:
-                temp_data = csv.reader(csvfile, delimiter=',')
-                temp_data.next()
-                for row in temp_data:
-                    date = datetime.datetime.strptime(row[0], '%d-%m-%Y')
-                    date = datetime.date(date.year, date.month, date.day)
-                    if date > self.startDate or date > self.endDate: #-check if period can be found in user defined data
-                        self.textLog.append('\nError: Defined period to process can not be found in data csv file!')
-                        return 0
-                    elif date == self.startDate: #-stop if start date is found
-                        daynr = 1
-                        break
-                #-forcing CSV should be in order Tair, Tmax, Tmin
-                forcings = {'Tmin': 'temp_tmin', 'Tmax': 'temp_tmax', 'Tair': 'temp_tair'}
-                s = 0  # counter required for knowing which column to start in the data file
-                for f in forcings:
-                    self.textLog.append(f + ' ' + str(date.year) + '-' + str(date.month) + '-' + str(date.day))
-                    #-Create output csv file for temperature
-                    fvar = forcings[f]
-                    fi = open(os.path.join(self.tempdir,  fvar + '.csv'), 'w')
-                    fi.write('X,Y,' + fvar + '\n')
-                    #-Write first day of data to file
-                    for i in range(1, len(stations) + 1):
-                        ##-TEST FOR missing values
-                        if int(float(row[i+s])) != -9999:
-                            Tref = float(stations[i-1][3]) * 0.0065 + float(row[i+s])  #-convert temperature to reference level temperature
-                            fi.write('%f,%f,%f\n' %(float(stations[i-1][1]), float(stations[i-1][2]), Tref))
-                    fi.close()
-                    #-Create a VRT file
-                    self.vrtCreate(fvar)
-                    commands = []
-                    #-Convert to a grid
-                    com = 'gdal_grid -a invdist:power=2.0:smoothing=0.0 -ot Float32 -txe ' + self.xMin + \
-                        ' ' + self.xMax + ' -tye ' + self.yMin + ' ' + self.yMax + ' -outsize ' + str(outsizeX) + \
-                        ' ' + str(outsizeY) + ' -l ' + fvar + ' ' + self.tempdir + fvar + '.vrt ' + self.tempdir + 'temp.tif'
-                    commands.append(com)
-                    #-Warp to extent and resolution
-                    com = 'gdalwarp -te ' + self.xMin + ' ' + self.yMin + ' '  + self.xMax + ' ' + self.yMax +\
-                     ' -tr ' + self.t_res + ' ' + self.t_res + ' -r bilinear ' + self.tempdir + 'temp.tif ' +\
-                     self.tempdir + 'temp2.tif'
-                    commands.append(com)
-                    #-Convert to pcraster map
-                    com = 'gdal_translate -of PCRaster ' + self.tempdir + 'temp2.tif ' + self.tempdir + 'temp.map'
-                    commands.append(com)
-                    #-Calculate the temperature using the DEM and the reference temperature
-                    pcrstr = self.pcrExtention(daynr)
-                    com = self.pcrasterModelFile('"' + self.outdir + f + pcrstr + '" = ("' + self.tempdir + 'dem.map" * -0.0065) + "' + self.tempdir + 'temp.map"')
-                    commands.append('pcrcalc -f ' + com)
-                    self.subProcessing(commands)
-                    #-Progress bar
-                    self.counter += 1
-                    self.progBar.setValue(self.counter/self.procSteps*100)
-                    #-Remove temporary files
-                    self.removeFiles(self.tempdir, self.outdir)
-                    #-update column number
-                    s = s + len(stations)
-                #-Continue looping until the end date
-                for row in temp_data:
-                    daynr+=1
-                    date = datetime.datetime.strptime(row[0],'%d-%m-%Y')
-                    date = datetime.date(date.year, date.month, date.day)
-                    if date>self.endDate:
-                        self.textLog.append('\nError: Defined period to process can not be found in data csv file!')
-                        return 0
-                    s = 0  # counter required for knowing which column to start in the data file
-                    for f in forcings:
-                        self.textLog.append(f + ' ' + str(date.year) + '-' + str(date.month) + '-' + str(date.day))
-                        #-Create output csv file for temperature
-                        fvar = forcings[f]
-                        fi = open(os.path.join(self.tempdir,  fvar + '.csv'), 'w')
-                        fi.write('X,Y,' + fvar + '\n')
-                        for i in range(1, len(stations) + 1):
-                            ##-TEST FOR missing values
-                            if int(float(row[i+s])) != -9999:
-                                Tref = float(stations[i-1][3]) * 0.0065 + float(row[i+s])  #-convert temperature to reference level temperature
-                                fi.write('%f,%f,%f\n' %(float(stations[i-1][1]), float(stations[i-1][2]), Tref))
-                        fi.close()
-                        #-Create a VRT file
-                        self.vrtCreate(fvar)
-                        commands = []
-                        #-Convert to a grid
-                        com = 'gdal_grid -a invdist:power=2.0:smoothing=0.0 -ot Float32 -txe ' + self.xMin + \
-                            ' ' + self.xMax + ' -tye ' + self.yMin + ' ' + self.yMax + ' -outsize ' + str(outsizeX) + \
-                            ' ' + str(outsizeY) + ' -l ' + fvar + ' ' + self.tempdir + fvar + '.vrt ' + self.tempdir + 'temp.tif'
-                        commands.append(com)
-                        #-Warp to extent and resolution
-                        com = 'gdalwarp -te ' + self.xMin + ' ' + self.yMin + ' '  + self.xMax + ' ' + self.yMax +\
-                         ' -tr ' + self.t_res + ' ' + self.t_res + ' -r bilinear ' + self.tempdir + 'temp.tif ' +\
-                         self.tempdir + 'temp2.tif'
-                        commands.append(com)
-                        #-Convert to pcraster map
-                        com = 'gdal_translate -of PCRaster ' + self.tempdir + 'temp2.tif ' + self.tempdir + 'temp.map'
-                        commands.append(com)
-                        #-Calculate the temperature using the DEM and the reference temperature
-                        pcrstr = self.pcrExtention(daynr)
-                        com = self.pcrasterModelFile('"' + self.outdir + f + pcrstr + '" = ("' + self.tempdir + 'dem.map" * -0.0065) + "' + self.tempdir + 'temp.map"')
-                        commands.append('pcrcalc -f ' + com)
-                        self.subProcessing(commands)
-                        #-Progress bar
-                        self.counter += 1
-                        self.progBar.setValue(self.counter/self.procSteps*100)
-                        #-Remove temporary files
-                        self.removeFiles(self.tempdir, self.outdir)
-                        #-update column number
-                        s = s + len(stations)
-                    #-Stop if end date is found
-                    if date == self.endDate:
-                        self.textLog.append('\nProcessing temperature from user-defined CSV files finished!')
-                        break
-                #-if the CSV file has less records than the user defined end date
-                if date<self.endDate:
-                    self.textLog.append('\nProcessing temperature from user-defined CSV files finished, but not all dates are processed because the data CSV file contains a shorter period than defined by the user!')
+    #-Precipitation variable from user-defined stations, interpolated to the model grid and clipped from clone
+    def precCSVVariables(self):
+        self.info('Processing precipitation from user-defined CSV files...\n')
+        station = self.stationData(self.precLocFile, self.precDataFile, 'precipitation')
+        if station is None:
+            return None
+        stations, idw, data = station
+        def read(dates):
+            values, found = data.blockValues(dates, 0, len(stations))
+            return idw.interpolateBlock(values), found
+        def source(date):
+            return data.fingerprint(date, 0, len(stations))
+        def finish():
+            self.finishCSV('precipitation', data)
+            self.textLog.append(idw.cacheInfo())
+        return [('prec', read, True, source)], finish
+
+    #-Temperature variables from user-defined stations. The temperature is converted to reference level temperature with
+    # the station elevation, interpolated to the model grid, and corrected with the model dem.
+    def tempCSVVariables(self):
+        self.info('\nProcessing temperature from user-defined CSV files...\n')
+        station = self.stationData(self.tempLocFile, self.tempDataFile, 'temperature')
+        if station is None:
+            return None
+        stations, idw, data = station
+        #-Station elevations, used to convert temperature to reference level temperature
+        elevation = np.array([float(s[3]) for s in stations], dtype=np.float32) * np.float32(0.0065)
+        #-Lapse rate correction with the model dem
+        offset = self.lapseRateOffset()
+        if offset is None:
+            return None
+        variables = []
+        #-forcing CSV should be in order Tair, Tmax, Tmin
+        for i, f in enumerate(['Tair', 'Tmax', 'Tmin']):
+            def read(dates, s=i*len(stations)): # s is the column to start in the data file
+                values, found = data.blockValues(dates, s, len(stations))
+                return idw.interpolateBlock(values + elevation) + offset, found
+            def source(date, s=i*len(stations)):
+                return data.fingerprint(date, s, len(stations))
+            variables.append((f, read, False, source))
+        def finish():
+            self.finishCSV('temperature', data)
+            self.textLog.append(idw.cacheInfo())
+        return variables, finish
+
+    #-Return the interpolator for the user-defined stations. Inverse distance weighting uses all stations, unless the
+    # number of nearest stations or a search radius is set. Delaunay (linear) interpolation requires scipy.
+    # The number of station patterns in the weights cache is limited to a quarter of the memory budget. The memory of the
+    # interpolator is the cache, and for inverse distance weighting with all stations also the matrix with the inverse
+    # distances that the weights of each pattern are taken from.
+    def stationInterpolator(self, stations):
+        cells = self.engine.rows * self.engine.cols
+        method = 'idw'
+        neighbours = self.idwNeighbours
+        if self.interpolation == 'delaunay':
+            if interpolation.Delaunay is not None:
+                method = 'delaunay'
+            else:
+                self.textLog.append('Warning: Delaunay interpolation requires scipy, inverse distance weighting is used instead')
+        elif self.idwNeighbours > 0 or self.idwRadius > 0:
+            method = 'nearest'
+        #-The (cells, stations) matrix of inverse distance weighting with all stations must fit in the memory that is left,
+        # otherwise only the nearest stations of which the weights fit in half of it are used
+        if method == 'idw' and self.memory and cells * len(stations) * 4 > self.memory.remaining():
+            neighbours = int(max(1, min(len(stations), self.memory.remaining() / 2. // (cells * 8))))
+            self.textLog.append('Warning: the inverse distance weights of %d stations for %d cells (%.0f MB) do not fit in '\
+                'the memory budget (%.0f MB left); the nearest %d stations are used instead. Set idw_neighbours in the '\
+                '[FORCING] section of the project config file to choose the number of stations.' % (len(stations), cells,\
+                cells * len(stations) * 4 / 1024.**2, self.memory.remaining() / 1024.**2, neighbours))
+            method = 'nearest'
+        #-Size of the weights of one station pattern: (index int32, weight float32) pairs for the stations that are used per
+        # cell, or a (cells, stations) float32 matrix for inverse distance weighting with all stations
+        if method == 'delaunay':
+            entry = cells * 3 * 8
+        elif method == 'nearest':
+            entry = cells * (neighbours if neighbours > 0 else len(stations)) * 8
         else:
-            self.textLog.append('\nError: processing of temperature not possible because CSV files not found')   
-        
+            entry = cells * len(stations) * 4
+        base = entry if method == 'idw' else 0
+        cachesize = self.memory.cacheEntries(32, entry) if self.memory else 32
+        self.cacheMemory += base + cachesize * entry
+        if method == 'delaunay':
+            return DelaunayInterpolator(stations, self.engine, cachesize)
+        if method == 'nearest':
+            return NearestStationsInterpolator(stations, self.engine, self.idwPower, neighbours, self.idwRadius, cachesize)
+        return InverseDistanceInterpolator(stations, self.engine, self.idwPower, cachesize)
+
+    #-Settings that are required to create this instance again in another process (see parallel.py)
+    def settings(self):
+        attributes = ['dbSource', 'dbTs', 'dbSrs', 'dbFormat', 'precDBPath', 'tavgDBPath', 'tmaxDBPath', 'tminDBPath',\
+                      'modelDem', 'dbDem', 'precLocFile', 'precDataFile', 'tempLocFile', 'tempDataFile',\
+                      'interpolation', 'idwPower', 'idwNeighbours', 'idwRadius', 'outputFormat', 'resume',\
+                      'rasterCacheDir', 'rasterCacheSize', 'blockDays', 'memoryBudget', 'manifestFile']
+        settings = {'resultsdir': self.resultsdir, 't_srs': self.t_srs, 'resolution': self.t_res, 'extent': [self.xMin,\
+                    self.yMin, self.xMax, self.yMax], 'pcrbinpath': self.pcrBinPath}
+        settings['attributes'] = dict((a, getattr(self, a)) for a in attributes)
+        return settings
+
+    #-Return the lapse rate correction of the temperature (-0.0065 degrees per m) as array on the model grid. It is
+    # the model dem, or the difference between the model dem and the database dem (dbdem) if the database temperature
+    # is not at reference level, times the lapse rate, plus a constant (e.g. -273.15 for Kelvin to degrees Celsius).
+    # The correction is calculated only once per run, and is None if a dem can not be read.
+    def lapseRateOffset(self, dbdem=None, constant=0.):
+        key = (dbdem, constant)
+        if key not in self.lapseRates:
+            modeldem = self.modelDem if self.modelDem else self.resultsdir + 'dem.map'
+            dem = self.engine.readModelMap(modeldem)
+            if dem is None:
+                self.textLog.append('\nError: processing of temperature not possible because ' + modeldem + ' is not found')
+                return None
+            if dbdem:
+                refdem = self.engine.regrid(dbdem, self.dbSrs)
+                if refdem is None:
+                    self.textLog.append('\nError: processing of temperature not possible because ' + dbdem + ' is not found')
+                    return None
+                dem = dem - refdem
+            self.lapseRates[key] = (dem * np.float32(-0.0065) + np.float32(constant)).astype(np.float32)
+        return self.lapseRates[key]
+
+    #-Memory in bytes that is needed for one day of a block: about 128 bytes per model cell for the block and the temporary
+    # arrays of the regridding or interpolation
+    def dayMemory(self):
+        return self.engine.rows * self.engine.cols * 128
+
+    #-Number of days that are processed as one block. It is set with blockDays, or determined from the memory budget (0):
+    # the blocks use the part of the budget that is left after the weights caches. Blocks are at most a year.
+    def blockSize(self):
+        if self.blockDays > 0:
+            return max(1, min(int(self.blockDays), self.timeSteps))
+        remaining = self.memory.remaining() - self.cacheMemory
+        return max(1, min(366, self.timeSteps, int(remaining // self.dayMemory())))
+
+    #-Return the reader for monthly NetCDF files of a forcing variable
+    def slabReader(self, var):
+        if var not in self.slabReaders:
+            self.slabReaders[var] = MonthSlabReader(self.engine, self.dbSrs)
+        return self.slabReaders[var]
+
+    #-Read and regrid a block of dates from the monthly NetCDF files of a forcing variable (path returns the file of a date).
+    # Returns the (dates, rows, cols) block and a boolean array that is False for the dates that could not be read.
+    def slabBlock(self, var, path, dates):
+        data = np.empty((len(dates), self.engine.rows, self.engine.cols), dtype=np.float32)
+        found = np.zeros(len(dates), dtype=bool)
+        months = collections.OrderedDict()
+        for i, d in enumerate(dates):
+            months.setdefault(path(d), []).append(i)
+        for filename, index in months.items():
+            data[index], found[index] = self.slabReader(var).readDays(filename, [dates[i].day for i in index])
+        return data, found
+
     #-Function to determine pcraster extentsion number
     def pcrExtention(self, day):
+        #-Day number in the complete period
+        day = day + self.dayOffset
         #-Make pcraster string
         if day < 10:
             pcrstr = "0000.00"+str(day)
@@ -595,87 +872,32 @@ class processForcing():
             pcrstr = "00"+thous+"."+hund
         return pcrstr
 
-    #-Remove temporary files    
-    def removeFiles(self, d1, d2):
-        f = glob.glob(d1 + 'temp*')
-        for fi in f:
-            os.remove(fi)
-        f = glob.glob(d2 + '*xml')
-        for fi in f:
-            os.remove(fi)
+    #-Remove the .aux.xml files that gdal created next to the maps in older versions. Nothing creates them anymore (the maps
+    # are written without gdal, and gdal does not write .aux.xml files, see warp.py), so this is done once per run and not
+    # after every day.
+    def removeAuxFiles(self, d):
+        for fi in glob.glob(d + '*.aux.xml'):
+            try:
+                os.remove(fi)
+            except OSError: #-already removed by another worker process
+                pass
             
-    #-Function that creates a pcraster model file (*.mod)
-    def pcrasterModelFile(self, command):
-        #-Create a batch file
-        batchfile = os.path.dirname(__file__) + '/pcraster/run.mod'
-        f = open(batchfile, "w")
-        f.write(command)
-        f.close()
-        return batchfile
-    
-    #-Subprocessing the commands to execute
-    def subProcessing(self, commands):    
-        for command in commands:
-            if command.find('pcrcalc')>=0:
-                environ = {"PATH": self.pcrBinPath}
-            else:
-                environ = None
-            process = subprocess.Popen(
-                command,
-                shell=True,
-                stdout=subprocess.PIPE,
-                stdin=subprocess.PIPE,
-                stderr=subprocess.STDOUT,
-                universal_newlines=False,
-                env=environ
-                )
-            proc = process.communicate()[0]
-            if proc.find('Warning')>=0:
-                print '...'
-            elif proc.find('WARNING')>=0:
-                print '...'
-            else:
-                print proc
-                
-    #-Function to transform coordinates of stations from lat/lon to user-defined CRS
-    def coordinateTransform(self, s_srs, t_srs, lon, lat):
-        #-Source coordinate system
-        source = osr.SpatialReference()
-        source.ImportFromEPSG(s_srs)
-        #-Target coordinate system
-        target = osr.SpatialReference()
-        target.ImportFromEPSG(t_srs)
-        #-Transfrom
-        transform = osr.CoordinateTransformation(source, target)
-        (X, Y, Height) = transform.TransformPoint(lon, lat)
-        return X, Y
+    #-Function to transform coordinates of stations from lat/lon to user-defined CRS. Arrays with longitudes and latitudes
+    # are transformed in one call, with a transformation that is created only once.
+    def coordinateTransform(self, lon, lat):
+        return transformPoints('EPSG:4326', self.t_srs, lon, lat)
     
-    #-Function to read the ID, location, and elevation for all stations
+    #-Function to read the ID, location, and elevation for all stations. The station table is read and transformed only
+    # once per run for each location file, and shared by the forcing variables (e.g. precipitation and temperature).
     def readStationsLoc(self, f):
-        stations = []
-        t_srs = int((self.t_srs).split('EPSG:')[1])
-        with open(f, 'rb') as csvfile:
-            locations = csv.reader(csvfile, delimiter=',')
-            locations.next()
-            for row in locations:
-                locXY = self.coordinateTransform(4326, t_srs, float(row[3]), float(row[2]))
-                X = locXY[0]
-                Y = locXY[1]
-                #statdata = [int(row[0]), X, Y, float(row[4])]
-                statdata = [str(row[0]), X, Y, float(row[4])]
-                stations.append(statdata)
-        return stations
-                
-    #-Function to create VRT file
-    def vrtCreate(self, fvar):
-        epsg = int((self.t_srs).split('EPSG:')[1])
-        f = open(self.tempdir + fvar + '.vrt', 'w')
-        f.write('<OGRVRTDataSource>\n')
-        f.write('<OGRVRTLayer name="' + fvar + '">\n')
-        f.write('<SrcDataSource>' + self.tempdir + fvar + '.csv</SrcDataSource>\n')
-        f.write('<GeometryType>wkbPoint</GeometryType>\n')
-        f.write('<LayerSRS>epsg:'+str(epsg)+'</LayerSRS>\n')
-        f.write('<GeometryField encoding="PointFromColumns" x="X" y="Y" z="' + fvar + '"/>\n')
-        f.write('</OGRVRTLayer>\n')
-        f.write('</OGRVRTDataSource>\n')
-        f.close()
\ No newline at end of file
+        key = (os.path.abspath(f), fileFingerprint(f))
+        if key not in self.stationTables:
+            rows = []
+            with open(f, 'rb') as csvfile:
+                locations = csv.reader(csvfile, delimiter=',')
+                locations.next()
+                for row in locations:
+                    rows.append(row)
+            X, Y = self.coordinateTransform([float(row[3]) for row in rows], [float(row[2]) for row in rows])
+            self.stationTables[key] = [[str(row[0]), x, y, float(row[4])] for row, x, y in zip(rows, X, Y)]
+        return self.stationTables[key]
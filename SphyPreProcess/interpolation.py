@@ -0,0 +1,279 @@
+# The SPHY model Pre-Processor interface plugin for QGIS:
+# A QGIS plugin that allows the user to create SPHY model input data based on a database. 
+#
+# Copyright (C) 2015  Wilco Terink
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Email: terinkw@gmail.com
+
+#-Authorship information-###################################################################
+__author__ = "Wilco Terink"
+__copyright__ = "Wilco Terink"
+__license__ = "GPL"
+__version__ = "1.0.0"
+__email__ = "terinkw@gmail.com"
+__date__ ='1 January 2017'
+############################################################################################
+
+import collections
+import numpy as np
+
+#-scipy is optional: its KD-tree is used for the nearest stations search if it is available, and it is required for
+# the Delaunay triangulation
+try:
+    from scipy.spatial import cKDTree, Delaunay
+except ImportError:
+    cKDTree = None
+    Delaunay = None
+
+#-Base class for the interpolation of station values to the model grid. The station locations don't change, so the
+# weights are calculated only once for each pattern of available stations and each day is then a matrix-vector product
+# (or a block of days with the same pattern a matrix-matrix product).
+# The weights are kept in an LRU cache that is keyed by the bitmask of available stations, because days with the same
+# stations missing use the same weights.
+class StationInterpolator():
+    def __init__(self, stations, engine, cachesize=32):
+        self.engine = engine
+        #-LRU cache with the normalized weights for each pattern of available stations
+        self.cache = collections.OrderedDict()
+        self.cacheSize = cachesize
+        self.hits = 0
+        self.misses = 0
+        #-Station coordinates in the model coordinate system (output of processForcing.readStationsLoc)
+        self.stationX = np.array([float(s[1]) for s in stations])
+        self.stationY = np.array([float(s[2]) for s in stations])
+        #-Cell centres of the model grid
+        x = engine.xMin + (np.arange(engine.cols) + 0.5) * engine.res
+        y = engine.yMax - (np.arange(engine.rows) + 0.5) * engine.res
+        x, y = np.meshgrid(x, y)
+        self.cellX = x.ravel()
+        self.cellY = y.ravel()
+
+    #-Return the normalized weights for the available stations, from the cache if possible
+    def weights(self, available):
+        key = np.packbits(available).tobytes()
+        if key in self.cache:
+            self.hits += 1
+            w = self.cache.pop(key)
+        else:
+            self.misses += 1
+            w = self.computeWeights(available)
+            if len(self.cache) >= self.cacheSize:
+                self.cache.popitem(last=False)  #-remove the least recently used weights
+        self.cache[key] = w
+        return w
+
+    #-Calculate the normalized weights for the available stations (implemented by the interpolation methods)
+    def computeWeights(self, available):
+        raise NotImplementedError
+
+    #-Apply the weights to the values of the available stations, a (stations) array or a (days, stations) array
+    # (implemented by the interpolation methods)
+    def apply(self, weights, values):
+        raise NotImplementedError
+
+    #-Interpolate the station values (NaN for missing values) to the model grid
+    def interpolate(self, values):
+        available = np.isfinite(values)
+        if not available.any():
+            grid = np.empty(len(self.cellX), dtype=np.float32)
+            grid[:] = np.nan
+        else:
+            grid = self.apply(self.weights(available), values[available].astype(np.float32))
+        return grid.reshape((self.engine.rows, self.engine.cols))
+
+    #-Interpolate a (days, stations) block of station values (NaN for missing values) to a (days, rows, cols) block. The
+    # days are grouped by their pattern of available stations, and each group is interpolated at once.
+    def interpolateBlock(self, values):
+        available = np.isfinite(values)
+        grid = np.empty((len(values), len(self.cellX)), dtype=np.float32)
+        grid[:] = np.nan
+        groups = collections.OrderedDict()
+        for i, key in enumerate(np.packbits(available, axis=1)):
+            groups.setdefault(key.tobytes(), []).append(i)
+        for days in groups.values():
+            a = available[days[0]]
+            if a.any():
+                grid[days] = self.apply(self.weights(a), values[days][:, a].astype(np.float32))
+        return grid.reshape((len(values), self.engine.rows, self.engine.cols))
+
+    #-Return a summary of the weights cache usage, for the log
+    def cacheInfo(self):
+        total = self.hits + self.misses
+        rate = 100. * self.hits / total if total else 0.
+        memory = 0
+        for w in self.cache.values():
+            if isinstance(w, tuple):
+                memory += sum(a.nbytes for a in w)
+            else:
+                memory += w.nbytes
+        return 'Interpolation weights cache: %d hits, %d misses (hit rate %.1f%%), %d station patterns in memory (%.1f MB)'\
+            % (self.hits, self.misses, rate, len(self.cache), memory / 1024.**2)
+
+#-Inverse distance weighting with all stations, the same as gdal_grid -a invdist:power=2.0:smoothing=0.0 does. The
+# inverse distances between the cell centres and the stations are calculated once as a (cells, stations) Float32 matrix,
+# in blocks of cells to limit the memory of the temporary (Float64) distances.
+class InverseDistanceInterpolator(StationInterpolator):
+    def __init__(self, stations, engine, power=2.0, cachesize=32):
+        StationInterpolator.__init__(self, stations, engine, cachesize)
+        self.power = power
+        self.inverseDistanceWeights()
+
+    #-Calculate the (cells, stations) matrix with inverse distance weights. Cells that are located exactly on a
+    # station get the value of that station, like gdal_grid does.
+    def inverseDistanceWeights(self):
+        ncells = len(self.cellX)
+        self.idw = np.empty((ncells, len(self.stationX)), dtype=np.float32)
+        exactcells = []
+        exactstations = []
+        block = max(1, 2**22 // max(1, len(self.stationX)))  #-limit the memory of the (cells, stations) distance matrix
+        for i in range(0, ncells, block):
+            dist2 = (self.cellX[i:i+block, None] - self.stationX[None, :])**2 + (self.cellY[i:i+block, None] -\
+                self.stationY[None, :])**2
+            exact = dist2 == 0
+            c, s = np.nonzero(exact)
+            exactcells.append(c + i)
+            exactstations.append(s)
+            with np.errstate(divide='ignore'):
+                self.idw[i:i+block] = np.where(exact, 0., dist2 ** (-self.power / 2.))
+        self.exactCells = np.concatenate(exactcells) if exactcells else np.zeros(0, dtype=np.int64)
+        self.exactStations = np.concatenate(exactstations) if exactstations else np.zeros(0, dtype=np.int64)
+
+    #-Normalized (cells, available stations) weights
+    def computeWeights(self, available):
+        w = self.idw[:, available]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            w /= w.sum(axis=1)[:, None]  #-in place, the weights are a copy of the columns of the available stations
+        #-Cells on top of an available station get the value of that station
+        exact = available[self.exactStations]
+        cells = self.exactCells[exact]
+        w[cells] = 0.
+        w[cells, (np.cumsum(available) - 1)[self.exactStations[exact]]] = 1.
+        return w
+
+    def apply(self, weights, values):
+        return values.dot(weights.T)
+
+#-Inverse distance weighting with only the nearest stations (neighbours) and/or the stations within a search radius,
+# the same as gdal_grid -a invdist:power=2.0:max_points=neighbours:radius1=radius:radius2=radius does. The cost per
+# day scales with the number of neighbours instead of with the number of stations. The nearest stations are searched
+# with a KD-tree (scipy) if it is available, otherwise with NumPy in blocks of cells. Cells without stations within the
+# search radius get no data.
+class NearestStationsInterpolator(StationInterpolator):
+    def __init__(self, stations, engine, power=2.0, neighbours=0, radius=0., cachesize=32):
+        StationInterpolator.__init__(self, stations, engine, cachesize)
+        self.power = power
+        self.neighbours = int(neighbours)
+        self.radius = float(radius)
+
+    #-Return the squared distances and indices (cells, k) of the k nearest stations (x, y) for all cells. With a search
+    # radius the KD-tree only returns the stations within it; the missing neighbours get an infinite distance.
+    def nearest(self, x, y, k, radius=0.):
+        if cKDTree is not None:
+            tree = cKDTree(np.column_stack((x, y)))
+            dist, index = tree.query(np.column_stack((self.cellX, self.cellY)), k,\
+                distance_upper_bound=np.nextafter(radius, np.inf) if radius > 0 else np.inf)
+            dist = dist.reshape((len(self.cellX), k))
+            index = index.reshape((len(self.cellX), k))
+            index[index == len(x)] = 0
+            return dist**2, index
+        dist2 = np.empty((len(self.cellX), k))
+        index = np.empty((len(self.cellX), k), dtype=np.int64)
+        block = max(1, 2**22 // len(x))  #-limit the memory of the (cells, stations) distance matrix
+        for i in range(0, len(self.cellX), block):
+            d = (self.cellX[i:i+block, None] - x[None, :])**2 + (self.cellY[i:i+block, None] - y[None, :])**2
+            if k < len(x):
+                idx = np.argpartition(d, k - 1, axis=1)[:, :k]
+            else:
+                idx = np.tile(np.arange(len(x)), (len(d), 1))
+            index[i:i+block] = idx
+            dist2[i:i+block] = d[np.arange(len(d))[:, None], idx]
+        return dist2, index
+
+    #-Return the largest number of stations (x, y) within the search radius of a cell (at least 1)
+    def withinRadius(self, x, y):
+        points = np.column_stack((self.cellX, self.cellY))
+        if cKDTree is not None:
+            return max(1, max(len(s) for s in cKDTree(np.column_stack((x, y))).query_ball_point(points, self.radius)))
+        count = 1
+        block = max(1, 2**22 // len(x))  #-limit the memory of the (cells, stations) distance matrix
+        for i in range(0, len(self.cellX), block):
+            d = (self.cellX[i:i+block, None] - x[None, :])**2 + (self.cellY[i:i+block, None] - y[None, :])**2
+            count = max(count, (d <= self.radius**2).sum(axis=1).max())
+        return int(count)
+
+    #-Normalized weights (cells, k) and the index (cells, k) of the available stations they belong to. Without a maximum
+    # number of neighbours the number of stations within the search radius is used, so only those stations are stored.
+    def computeWeights(self, available):
+        x = self.stationX[available]
+        y = self.stationY[available]
+        k = len(x)
+        if self.neighbours > 0:
+            k = min(k, self.neighbours)
+        elif self.radius > 0:
+            k = min(k, self.withinRadius(x, y))
+        dist2, index = self.nearest(x, y, k, self.radius)
+        with np.errstate(divide='ignore'):
+            w = dist2 ** (-self.power / 2.)
+        if self.radius > 0:
+            w[dist2 > self.radius**2] = 0.
+        #-Cells on top of a station get the value of that station
+        exact = dist2 == 0
+        hit = exact.any(axis=1)
+        w[hit] = np.where(exact[hit], 1., 0.)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            w = w / w.sum(axis=1)[:, None]  #-no stations within the search radius results in NaN
+        return index.astype(np.int32), w.astype(np.float32)
+
+    def apply(self, weights, values):
+        index, w = weights
+        return (w * values[..., index]).sum(axis=-1)
+
+#-Linear interpolation on a Delaunay triangulation of the stations. For each cell the enclosing triangle and the
+# barycentric weights of its three stations are stored, so each day is a product with 3 weights per cell. Cells outside
+# the convex hull of the stations get the value of the nearest station.
+class DelaunayInterpolator(NearestStationsInterpolator):
+    def __init__(self, stations, engine, cachesize=32):
+        NearestStationsInterpolator.__init__(self, stations, engine, neighbours=1, cachesize=cachesize)
+
+    #-Barycentric weights (cells, 3) and the index (cells, 3) of the available stations they belong to
+    def computeWeights(self, available):
+        x = self.stationX[available]
+        y = self.stationY[available]
+        ncells = len(self.cellX)
+        index = np.zeros((ncells, 3), dtype=np.int32)
+        w = np.zeros((ncells, 3), dtype=np.float32)
+        #-Nearest station for the cells outside the convex hull
+        outside = np.ones(ncells, dtype=bool)
+        try:
+            tri = Delaunay(np.column_stack((x, y)))
+        except Exception: #-less than 3 stations, or all stations on one line
+            tri = None
+        if tri is not None:
+            points = np.column_stack((self.cellX, self.cellY))
+            simplex = tri.find_simplex(points)
+            outside = simplex < 0
+            inside = ~outside
+            s = simplex[inside]
+            #-Barycentric coordinates from the affine transformation of the triangles
+            T = tri.transform[s]
+            b = np.einsum('ijk,ik->ij', T[:, :2], points[inside] - T[:, 2])
+            index[inside] = tri.simplices[s]
+            w[inside] = np.column_stack((b, 1. - b.sum(axis=1)))
+        if outside.any():
+            dist2, nearest = self.nearest(x, y, 1)
+            index[outside, 0] = nearest[outside, 0]
+            w[outside] = (1., 0., 0.)
+        return index, w
@@ -0,0 +1,115 @@
+# The SPHY model Pre-Processor interface plugin for QGIS:
+# A QGIS plugin that allows the user to create SPHY model input data based on a database. 
+#
+# Copyright (C) 2015  Wilco Terink
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Email: terinkw@gmail.com
+
+#-Authorship information-###################################################################
+__author__ = "Wilco Terink"
+__copyright__ = "Wilco Terink"
+__license__ = "GPL"
+__version__ = "1.0.0"
+__email__ = "terinkw@gmail.com"
+__date__ ='1 January 2017'
+############################################################################################
+
+import os, json, hashlib
+
+#-Function that returns a fingerprint (size and modification time) of an input file, or None if it does not exist
+def fileFingerprint(filename, extra=''):
+    try:
+        stat = os.stat(filename)
+    except OSError:
+        return None
+    return '%s:%d:%d%s' % (os.path.basename(filename), stat.st_size, int(stat.st_mtime), extra)
+
+#-Function that returns a fingerprint of the settings of a run (a dictionary that can be converted to JSON)
+def settingsFingerprint(settings):
+    return hashlib.sha1(json.dumps(settings, sort_keys=True).encode('utf-8')).hexdigest()
+
+#-Class with the manifest of the forcing maps that are completed: for each map the date, the fingerprint of the input
+# and the file size. It is used to skip the maps that are already complete and valid if a run is restarted or the
+# period is extended. Worker processes save the maps they added in a part manifest, which is merged afterwards.
+class ForcingManifest():
+    def __init__(self, filename):
+        self.filename = filename
+        self.settings = None
+        self.startDate = None
+        self.maps = {}
+        self.added = {}
+
+    #-Load the manifest; returns False if it does not exist or can not be read
+    def load(self):
+        if not os.path.isfile(self.filename):
+            return False
+        try:
+            with open(self.filename, 'r') as f:
+                m = json.load(f)
+        except ValueError: #-incomplete manifest
+            return False
+        self.settings = m.get('settings')
+        self.startDate = m.get('startdate')
+        self.maps = m.get('maps', {})
+        return True
+
+    #-Start a new manifest for the settings and start date of a run
+    def reset(self, settings, startdate):
+        self.settings = settings
+        self.startDate = startdate
+        self.maps = {}
+        self.added = {}
+
+    #-Save the manifest (or only the added maps to a part manifest). A temporary file is written first, so the manifest
+    # is never incomplete if the run is interrupted.
+    def save(self, filename=None, part=False):
+        filename = filename or self.filename
+        m = {'settings': self.settings, 'startdate': self.startDate, 'maps': self.added if part else self.maps}
+        tempfile = filename + '.tmp'
+        with open(tempfile, 'w') as f:
+            json.dump(m, f)
+        if os.path.isfile(filename):
+            os.remove(filename)
+        os.rename(tempfile, filename)
+
+    #-Merge a part manifest that is saved by a worker process, and remove it
+    def merge(self, filename):
+        part = ForcingManifest(filename)
+        if part.load() and part.settings == self.settings and part.startDate == self.startDate:
+            self.maps.update(part.maps)
+        os.remove(filename)
+
+    #-Return True if a map is complete: it exists, has the recorded size, and is made from the same input for the date
+    def isComplete(self, mapfile, date, source):
+        entry = self.maps.get(os.path.basename(mapfile))
+        if entry is None or source is None or entry['source'] != source:
+            return False
+        return self.hasMap(mapfile, date)
+
+    #-Return True if a map is recorded for the date, and exists with the recorded size (without checking its input)
+    def hasMap(self, mapfile, date):
+        entry = self.maps.get(os.path.basename(mapfile))
+        if entry is None or entry['date'] != date:
+            return False
+        return os.path.isfile(mapfile) and os.path.getsize(mapfile) == entry['size']
+
+    #-Record a completed map, with the minimum and maximum value of the part of the map that is written if it is a tile
+    def add(self, mapfile, date, source, minmax=None):
+        entry = {'date': date, 'source': source, 'size': os.path.getsize(mapfile)}
+        if minmax is not None:
+            entry['minmax'] = [float(v) for v in minmax]
+        self.maps[os.path.basename(mapfile)] = entry
+        self.added[os.path.basename(mapfile)] = entry
@@ -0,0 +1,143 @@
+# The SPHY model Pre-Processor interface plugin for QGIS:
+# A QGIS plugin that allows the user to create SPHY model input data based on a database. 
+#
+# Copyright (C) 2015  Wilco Terink
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Email: terinkw@gmail.com
+
+#-Authorship information-###################################################################
+__author__ = "Wilco Terink"
+__copyright__ = "Wilco Terink"
+__license__ = "GPL"
+__version__ = "1.0.0"
+__email__ = "terinkw@gmail.com"
+__date__ ='1 January 2017'
+############################################################################################
+
+import os, sys
+
+#-The resource module is not available on Windows, where the process memory is requested with ctypes instead
+try:
+    import resource
+except ImportError:
+    resource = None
+
+MB = 1024.**2
+
+#-Function that returns the memory counters (working set and peak working set in bytes) of the current process on Windows,
+# or None if they can not be determined
+def windowsMemoryCounters():
+    try:
+        import ctypes
+        from ctypes import wintypes
+        class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+            _fields_ = [('cb', wintypes.DWORD), ('PageFaultCount', wintypes.DWORD), ('PeakWorkingSetSize', ctypes.c_size_t),\
+                        ('WorkingSetSize', ctypes.c_size_t), ('QuotaPeakPagedPoolUsage', ctypes.c_size_t),\
+                        ('QuotaPagedPoolUsage', ctypes.c_size_t), ('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t),\
+                        ('QuotaNonPagedPoolUsage', ctypes.c_size_t), ('PagefileUsage', ctypes.c_size_t),\
+                        ('PeakPagefileUsage', ctypes.c_size_t)]
+        counters = PROCESS_MEMORY_COUNTERS()
+        counters.cb = ctypes.sizeof(counters)
+        process = ctypes.windll.kernel32.GetCurrentProcess()
+        if not ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb):
+            return None
+        return counters.WorkingSetSize, counters.PeakWorkingSetSize
+    except Exception:
+        return None
+
+#-Function that returns the free physical memory in bytes, or 1 GB if it can not be determined
+def availableMemory():
+    try:
+        return os.sysconf('SC_AVPHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
+    except (AttributeError, ValueError, OSError): #-not available on Windows
+        pass
+    try:
+        import ctypes
+        class MEMORYSTATUSEX(ctypes.Structure):
+            _fields_ = [('dwLength', ctypes.c_ulong), ('dwMemoryLoad', ctypes.c_ulong), ('ullTotalPhys', ctypes.c_ulonglong),\
+                        ('ullAvailPhys', ctypes.c_ulonglong), ('ullTotalPageFile', ctypes.c_ulonglong),\
+                        ('ullAvailPageFile', ctypes.c_ulonglong), ('ullTotalVirtual', ctypes.c_ulonglong),\
+                        ('ullAvailVirtual', ctypes.c_ulonglong), ('ullAvailExtendedVirtual', ctypes.c_ulonglong)]
+        status = MEMORYSTATUSEX()
+        status.dwLength = ctypes.sizeof(status)
+        if ctypes.windll.kernel32.GlobalMemoryStatusEx(ctypes.byref(status)):
+            return status.ullAvailPhys
+    except Exception:
+        pass
+    return 1024**3
+
+#-Function that returns the peak resident set size (RSS) in bytes of the current process, or of the largest finished child
+# process (e.g. the worker processes of the parallel forcing), or None if it can not be determined
+def peakRSS(children=False):
+    if resource is not None:
+        usage = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF)
+        #-ru_maxrss is in kilobytes, except on Mac OS X where it is in bytes
+        return usage.ru_maxrss if sys.platform == 'darwin' else usage.ru_maxrss * 1024
+    if not children:
+        counters = windowsMemoryCounters()
+        if counters is not None:
+            return counters[1]
+    return None
+
+#-Function that returns the current resident set size (RSS) in bytes of the current process, or the peak RSS if the current
+# RSS can not be determined
+def currentRSS():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (IOError, OSError, ValueError, IndexError, AttributeError):
+        pass
+    counters = windowsMemoryCounters()
+    if counters is not None:
+        return counters[0]
+    return peakRSS()
+
+#-Class with a memory budget for the processing. The block sizes, number of worker processes and cache sizes are chosen
+# such that the estimated peak memory stays under the budget. Without a budget (0) half of the free memory is used.
+class MemoryBudget():
+    def __init__(self, budget=0):
+        if budget and budget > 0:
+            self.bytes = budget * MB  #-budget in MB
+        else:
+            self.bytes = availableMemory() / 2.
+        #-Memory that is in use when the budget is created, e.g. by QGIS if the processing runs in QGIS
+        self.start = currentRSS() or 0
+
+    #-Memory in bytes that is left of the budget, with the memory that the process allocated since the budget was created
+    # (the memory that was already in use, e.g. by QGIS, is not charged to the budget)
+    def remaining(self):
+        used = max(0., (currentRSS() or self.start) - self.start)
+        return max(0., self.bytes - used)
+
+    #-Number of items (e.g. days of a block) of size itemsize bytes that fit in the remaining memory, between 1 and maxitems
+    def items(self, itemsize, maxitems):
+        return int(max(1, min(maxitems, self.remaining() // max(1, itemsize))))
+
+    #-Number of worker processes that fit in the budget, if each worker needs perworker bytes
+    def workers(self, requested, perworker):
+        return int(max(1, min(requested, self.bytes // max(1, perworker))))
+
+    #-Number of entries of size entrysize bytes of a cache that may use a fraction of the budget, between 1 and requested
+    def cacheEntries(self, requested, entrysize, fraction=0.25):
+        return int(max(1, min(requested, self.bytes * fraction // max(1, entrysize))))
+
+    #-Return the estimated and actual peak memory for the log
+    def report(self, estimate, children=False):
+        peak = peakRSS(children)
+        text = 'Memory: budget %.0f MB, estimated peak %.0f MB' % (self.bytes / MB, estimate / MB)
+        if peak is not None:
+            text += ', ' + ('peak RSS of the worker processes' if children else 'peak RSS') + ' %.0f MB' % (peak / MB)
+        return text
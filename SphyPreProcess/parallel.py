@@ -0,0 +1,210 @@
+# The SPHY model Pre-Processor interface plugin for QGIS:
+# A QGIS plugin that allows the user to create SPHY model input data based on a database. 
+#
+# Copyright (C) 2015  Wilco Terink
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Email: terinkw@gmail.com
+
+#-Authorship information-###################################################################
+__author__ = "Wilco Terink"
+__copyright__ = "Wilco Terink"
+__license__ = "GPL"
+__version__ = "1.0.0"
+__email__ = "terinkw@gmail.com"
+__date__ ='1 January 2017'
+############################################################################################
+
+import os, sys, time, math, datetime, shutil, collections, multiprocessing
+
+#-Import forcing processing
+from forcing import processForcing
+#-Import the merge of the NetCDF cubes of the workers
+import cube
+#-Import the memory budget
+from memory import MemoryBudget, MB
+
+#-Memory in bytes that a worker process needs besides the forcing blocks (Python, NumPy and gdal)
+WORKERMEMORY = 150 * MB
+#-Minimum number of days of the blocks of a worker process, used to determine how many workers fit in the memory budget
+WORKERDAYS = 30
+
+#-Function that makes sure worker processes can be started. In QGIS sys.executable is the QGIS application, so workers
+# need to be started with the Python interpreter.
+def setWorkerExecutable():
+    if sys.platform == 'win32' and not os.path.basename(sys.executable).lower().startswith('python'):
+        multiprocessing.set_executable(os.path.join(sys.exec_prefix, 'pythonw.exe'))
+
+#-Class that replaces the text log in a worker process and sends the text to the main process
+class QueueLog():
+    def __init__(self, queue):
+        self.queue = queue
+
+    def append(self, text):
+        self.queue.put(('log', text))
+
+#-Class that replaces the progress bar in a worker process and sends each finished step to the main process
+class QueueProgress():
+    def __init__(self, queue):
+        self.queue = queue
+
+    def setValue(self, value):
+        self.queue.put(('step', 1))
+
+#-Function that returns the processForcing instance for a part of the period, with the settings of the processForcing
+# instance of the complete period (see processForcing.settings). Each part has its own directory for temporary files, and
+# the day offset makes sure the output maps get the pcraster extension of the complete period.
+def chunkForcing(settings, startdate, enddate, dayoffset, tempdir, textlog, progbar):
+    if not os.path.isdir(tempdir):
+        os.makedirs(tempdir)
+    f = processForcing(settings['resultsdir'], settings['t_srs'], settings['resolution'], settings['extent'], startdate,\
+        enddate, textlog, progbar, 1., settings['pcrbinpath'], tempdir=tempdir + '/', dayoffset=dayoffset, clean=False)
+    for a in settings['attributes']:
+        setattr(f, a, settings['attributes'][a])
+    #-NetCDF output is written as a cube for this part of the period
+    f.cubePart = True
+    return f
+
+#-Function that processes the forcing for a part of the period in a worker process. Returns the number of maps that are
+# created and skipped, the tasks that failed and the dates that are not found per variable.
+def processChunk(settings, tasks, startdate, enddate, dayoffset, tempdir, queue):
+    f = chunkForcing(settings, startdate, enddate, dayoffset, tempdir, QueueLog(queue), QueueProgress(queue))
+    f.run(tasks)
+    shutil.rmtree(tempdir, ignore_errors=True)
+    return f.created, f.skipped, f.failed, f.missing
+
+#-Class that processes the forcing with a pool of worker processes. The period is split in chunks of consecutive days
+# that are processed in parallel. Log messages and progress of the workers are passed on to the log and progress bar
+# of the processForcing instance.
+class ParallelForcing():
+    def __init__(self, forcing, workers, chunksperworker=4):
+        self.forcing = forcing
+        self.workers = workers
+        self.chunksPerWorker = chunksperworker
+        #-Directory for temporary files of the workers; shards that share the results folder each have their own
+        if forcing.shard is None:
+            self.scratchdir = os.path.join(forcing.resultsdir, 'scratch')
+        else:
+            self.scratchdir = os.path.join(forcing.resultsdir, 'scratch_shard%03dof%03d' % forcing.shard)
+
+    #-Split the period in chunks of consecutive days: (startdate, enddate, dayoffset)
+    def chunks(self):
+        n = self.forcing.timeSteps
+        size = int(math.ceil(n / float(min(n, self.workers * self.chunksPerWorker))))
+        chunks = []
+        for offset in range(0, n, size):
+            start = self.forcing.startDate + datetime.timedelta(days=offset)
+            end = self.forcing.startDate + datetime.timedelta(days=min(offset + size, n) - 1)
+            chunks.append((start, end, offset))
+        return chunks
+
+    #-Memory in bytes that a worker process needs
+    def workerMemory(self):
+        return WORKERMEMORY + WORKERDAYS * self.forcing.dayMemory()
+
+    #-Arguments of processChunk for each job: (settings, startdate, enddate, dayoffset, tempdir)
+    def jobs(self, settings):
+        jobs = []
+        for i, (start, end, offset) in enumerate(self.chunks()):
+            jobs.append((settings, start, end, self.forcing.dayOffset + offset, os.path.join(self.scratchdir, 'chunk' +\
+                str(i))))
+        return jobs
+
+    #-Finish the run after all jobs are done: merge the NetCDF cubes of the workers into one cube per variable. The cubes
+    # of a shard are merged with the other shards when all shards are finished (see processForcing.verifyShards).
+    def finish(self):
+        if self.forcing.outputFormat == 'netcdf' and cube.netCDF4 is not None and self.forcing.shard is None:
+            self.forcing.textLog.append('\nMerging the NetCDF forcing of the worker processes...')
+            cube.mergeCubes(self.forcing.outdir, self.forcing.engine, self.forcing.startDate, self.forcing.timeSteps)
+
+    #-Number of progress steps of all jobs
+    def steps(self):
+        return self.forcing.procSteps
+
+    #-Pass a log message or finished step of a worker on to the text log or progress bar
+    def handle(self, key, value):
+        if key == 'log':
+            self.forcing.textLog.append(value)
+        else:
+            self.forcing.counter += value
+            self.forcing.progBar.setValue(self.forcing.counter/self.steps()*100)
+
+    #-Pass the log messages and progress of the workers on to the text log and progress bar
+    def update(self, queue):
+        while not queue.empty():
+            self.handle(*queue.get())
+
+    #-Prepare the output before the jobs are started: remove the old forcing, or keep the complete maps if the previous
+    # run is resumed
+    def prepare(self, tasks):
+        self.forcing.prepareOutput(tasks)
+
+    #-Run the tasks (processForcing method names) for the complete period
+    def run(self, tasks):
+        setWorkerExecutable()
+        #-Number of workers that fit in the memory budget; each worker gets an equal share of the budget
+        budget = MemoryBudget(self.forcing.memoryBudget)
+        workers = budget.workers(self.workers, self.workerMemory())
+        if workers < self.workers:
+            self.forcing.textLog.append('The memory budget of %.0f MB allows %d instead of %d worker processes' %\
+                (budget.bytes / MB, workers, self.workers))
+            self.workers = workers
+        self.forcing.textLog.append('Processing forcing with ' + str(self.workers) + ' worker processes...\n')
+        self.prepare(tasks)
+        self.forcing.startTasks(tasks)
+        settings = self.forcing.settings()
+        settings['attributes']['memoryBudget'] = budget.bytes / self.workers / MB
+        manager = multiprocessing.Manager()
+        queue = manager.Queue()
+        pool = multiprocessing.Pool(self.workers)
+        results = []
+        for jobsettings, start, end, dayoffset, tempdir in self.jobs(settings):
+            results.append(pool.apply_async(processChunk, (jobsettings, tasks, start, end, dayoffset, tempdir, queue)))
+        pool.close()
+        while not all(r.ready() for r in results):
+            self.update(queue)
+            #-Stop the workers if the run is cancelled; the maps in their part manifests are kept
+            if self.forcing.cancelled:
+                pool.terminate()
+                break
+            time.sleep(0.2)
+        pool.join()
+        self.update(queue)
+        self.forcing.created = 0
+        self.forcing.skipped = 0
+        failed = set()
+        self.forcing.missing = collections.OrderedDict()
+        for r in results:
+            if not r.ready():
+                continue
+            try:
+                created, skipped, tasksfailed, missing = r.get()
+                self.forcing.created += created
+                self.forcing.skipped += skipped
+                failed.update(tasksfailed)
+                self.forcing.addMissing(missing)
+            except Exception as e:
+                self.forcing.textLog.append('\nError: worker process failed: ' + str(e))
+                failed.update(tasks)
+        manager.shutdown()
+        #-Merge the manifests with the maps that are created by the workers
+        self.forcing.mergeManifests()
+        self.forcing.logMissing()
+        if not self.forcing.cancelled:
+            self.finish()
+            self.forcing.finishTasks(tasks, failed)
+        shutil.rmtree(self.scratchdir, ignore_errors=True)
+        if self.forcing.cancelled:
+            self.forcing.textLog.append('\nProcessing of the forcing is cancelled')
@@ -0,0 +1,478 @@
+# The SPHY model Pre-Processor interface plugin for QGIS:
+# A QGIS plugin that allows the user to create SPHY model input data based on a database. 
+#
+# Copyright (C) 2015  Wilco Terink
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Email: terinkw@gmail.com
+
+#-Authorship information-###################################################################
+__author__ = "Wilco Terink"
+__copyright__ = "Wilco Terink"
+__license__ = "GPL"
+__version__ = "1.0.0"
+__email__ = "terinkw@gmail.com"
+__date__ ='1 January 2017'
+############################################################################################
+
+import os, sys, subprocess, tempfile, datetime, time, argparse, ConfigParser
+import numpy as np
+
+#-Import the class with gdal processing commands
+from spatial_processing import SpatialProcessing
+#-Import the PCRaster map reader/writer
+import csf
+#-Import the cache with regridded rasters that is shared by projects
+from rastercache import RasterCache
+#-Import the memory budget
+from memory import MemoryBudget, currentRSS
+#-Import forcing processing, in one process or with worker processes
+from forcing import processForcing, rasterCacheSettings, memoryBudget, workerCount
+#-Import processing in tiles for large models
+import tiling
+
+#-Stages of the preprocessing, in the order in which they are run
+STAGES = ['clone', 'initmaps', 'delineate', 'stations', 'forcing']
+
+#-Maps that are created by the preprocessing (the same as in the GUI). The general maps are always created, the glacier and
+# routing maps only if these modules are turned on.
+GENERALMAPS = {'DEM': 'dem.map', 'Slope': 'slope.map', 'Root_field': 'root_field.map', 'Root_sat': 'root_sat.map',\
+               'Root_dry': 'root_dry.map', 'Root_wilt': 'root_wilt.map', 'Root_Ksat': 'root_ksat.map', 'Sub_field': 'sub_field.map',\
+               'Sub_sat': 'sub_sat.map', 'Sub_Ksat': 'sub_ksat.map', 'LandUse': 'landuse.map', 'Latitudes': 'latitude.map'}
+GLACIERMAPS = {'GlacFrac': 'glacfrac.map', 'GlacFracCI': 'glac_cleanice.map', 'GlacFracDB': 'glac_debris.map'}
+ROUTINGMAPS = {'LDD': 'ldd.map', 'Outlets': 'outlets.map', 'Rivers': 'river.map', 'AccuFlux': 'accuflux.map', 'Sub-basins': 'subbasins.map'}
+
+#-Soil maps and their option in the [SOIL] section of the database metadata
+SOILMAPS = {'Root_field': 'root_field_file', 'Root_sat': 'root_sat_file', 'Root_dry': 'root_dry_file', 'Root_wilt': 'root_wilt_file',\
+            'Root_Ksat': 'root_ksat_file', 'Sub_field': 'sub_field_file', 'Sub_sat': 'sub_sat_file', 'Sub_Ksat': 'sub_ksat_file'}
+
+#-Function that returns the EPSG code of a WGS 84 / UTM zone, e.g. 32645 for zone 45N (instead of the lookup in the QGIS database)
+def utmEPSG(zone, hemisphere):
+    if hemisphere.upper() == 'S':
+        return 32700 + int(zone)
+    return 32600 + int(zone)
+
+#-Class that replaces the text log of the GUI: every line is written to the stream (default stdout)
+class PrintLog():
+    def __init__(self, stream=None):
+        self.stream = stream if stream is not None else sys.stdout
+
+    def append(self, text):
+        self.stream.write(text + '\n')
+        self.stream.flush()
+
+#-Class that replaces the progress bar of the GUI: the progress is written to the log in steps of step percent
+class PrintProgress():
+    def __init__(self, log, step=10):
+        self.log = log
+        self.step = step
+        self.last = 0
+
+    def setValue(self, value):
+        value = int(value) // self.step * self.step
+        if value > self.last:
+            self.last = value
+            self.log.append('Progress: %d%%' % value)
+
+#-Class that runs the stages of the preprocessing of a project without QGIS, with the settings of the project config file
+# (see config/preprocess_config_template.cfg). The maps are created in the same way as by the GUI.
+class PreProcessPipeline():
+    def __init__(self, configfile, log=None):
+        self.configFile = configfile
+        self.config = ConfigParser.ConfigParser(allow_no_value = True)
+        if not self.config.read(configfile):
+            raise IOError('Project config file ' + configfile + ' could not be read')
+        self.log = log if log is not None else PrintLog()
+        #-Folders with the database, the results, and PCRaster
+        self.databasePath = os.path.expanduser(self.config.get('GENERAL', 'Database_dir'))
+        self.resultsPath = os.path.join(os.path.expanduser(self.config.get('GENERAL', 'Results_dir')), '')
+        self.pcrBinPath = os.path.expanduser(self.config.get('GENERAL', 'Pcraster_dir'))
+        self.databaseConfig = None
+        if os.path.isfile(os.path.join(self.databasePath, 'metadata.cfg')):
+            self.databaseConfig = ConfigParser.ConfigParser(allow_no_value = True)
+            self.databaseConfig.read(os.path.join(self.databasePath, 'metadata.cfg'))
+        #-Coordinate system (WGS 84 / UTM zone) and period to process
+        self.t_srs = 'EPSG:' + str(utmEPSG(self.config.getint('GENERAL', 'utmZoneNr'), self.config.get('GENERAL', 'utmZoneStr')))
+        self.startdate = datetime.date(self.config.getint('GENERAL', 'startyear'), self.config.getint('GENERAL', 'startmonth'),\
+            self.config.getint('GENERAL', 'startday'))
+        self.enddate = datetime.date(self.config.getint('GENERAL', 'endyear'), self.config.getint('GENERAL', 'endmonth'),\
+            self.config.getint('GENERAL', 'endday'))
+        #-Area: resolution, extent, and the number of columns and rows of the model grid
+        self.spatialRes = self.config.getint('AREA', 'resolution')
+        self.xMin = self.config.getint('AREA', 'xmin')
+        self.xMax = self.config.getint('AREA', 'xmax')
+        self.yMin = self.config.getint('AREA', 'ymin')
+        self.yMax = self.config.getint('AREA', 'ymax')
+        self.cols = int(round(float(self.xMax - self.xMin) / self.spatialRes))
+        self.rows = int(round(float(self.yMax - self.yMin) / self.spatialRes))
+        #-Size of the tiles if the maps and forcing are processed in tiles, or None
+        self.tileSize = tiling.tileSize(self.config)
+        #-Modules for which maps are created
+        self.routing = self.config.getint('MODULES', 'routing') == 1
+        self.glacier = self.config.getint('MODULES', 'glacier') == 1
+        #-Outlet(s) and station(s) shapefiles (False if not defined)
+        self.outletsShp = self.existingFile('DELINEATION', 'outlets_shp')
+        self.stationsShp = self.existingFile('STATIONS', 'stations_shp')
+
+    #-Return the file of an option of the project config file, or False if it is not defined or doesn't exist
+    def existingFile(self, section, option):
+        if self.config.has_option(section, option) and self.config.get(section, option):
+            filename = os.path.expanduser(self.config.get(section, option))
+            if os.path.exists(filename):
+                return filename
+        return False
+
+    #-Full path of a file in the results folder
+    def path(self, filename):
+        return os.path.join(self.resultsPath, filename)
+
+    #-Extent (xmin, ymin, xmax, ymax) and geotransform of the model grid
+    def extent(self):
+        return (self.xMin, self.yMin, self.xMax, self.yMax)
+
+    def geoTransform(self):
+        return (float(self.xMin), float(self.spatialRes), 0., float(self.yMax), 0., -float(self.spatialRes))
+
+    #-Run a pcrcalc expression that creates the map filename, and log the result. Returns True if the map was created.
+    def pcrcalc(self, mapname, filename, expression):
+        handle, modfile = tempfile.mkstemp(suffix='.mod')
+        os.write(handle, expression)
+        os.close(handle)
+        env = dict(os.environ)
+        env['PATH'] = self.pcrBinPath + os.pathsep + env.get('PATH', '')
+        try:
+            process = subprocess.Popen('pcrcalc -f "' + modfile + '"', shell=True, stdout=subprocess.PIPE,\
+                stderr=subprocess.STDOUT, env=env)
+            output = process.communicate()[0]
+        finally:
+            os.remove(modfile)
+        if process.returncode == 0 and os.path.isfile(self.path(filename)):
+            self.log.append(mapname + ' was created succesfully.')
+            return True
+        self.log.append(mapname + ' map was not created.')
+        if output.strip():
+            self.log.append(output.strip())
+        return False
+
+    #-Clip a map in the results folder to the clone
+    def clip(self, mapname, filename):
+        return self.pcrcalc(mapname, filename, '"%s" = if("%s","%s")' % (self.path(filename), self.path('clone.map'),\
+            self.path(filename)))
+
+    #-Run the stages in the order of STAGES. The run stops at the first stage that fails. Returns True if all stages succeeded.
+    def run(self, stages, workers=None, shard=None):
+        methods = {'clone': self.createClone, 'initmaps': self.createInitMaps, 'delineate': self.delineate,\
+                   'stations': self.createStations, 'forcing': lambda: self.createForcing(workers, shard)}
+        for stage in STAGES:
+            if stage not in stages:
+                continue
+            self.log.append('\nStage ' + stage + '...')
+            start = time.time()
+            if not methods[stage]():
+                self.log.append('Error: stage ' + stage + ' failed, the remaining stages are not run')
+                return False
+            self.log.append('Stage %s finished in %.1f s' % (stage, time.time() - start))
+        return True
+
+    #-Create a boolean clone for the extent of the area (same as mapattr -s -P yb2t -B would create)
+    def createClone(self):
+        if self.rows <= 0 or self.cols <= 0:
+            self.log.append('Error: the area is not defined in the [AREA] section of ' + self.configFile)
+            return False
+        if not os.path.isdir(self.resultsPath):
+            os.makedirs(self.resultsPath)
+        clone = np.ones((self.rows, self.cols), dtype=np.uint8)
+        csf.writeMap(self.path('clone.map'), clone, self.geoTransform(), csf.VS_BOOLEAN)
+        self.log.append('Clone map was successfully created.')
+        return True
+
+    #-Reproject, resample and clip a database raster to the model grid and write it as PCRaster map
+    def initMap(self, mapname, filename, section, option, cache, resampling='bilinear', rtype='Float32', valuescale=csf.VS_SCALAR):
+        infile = os.path.join(self.databasePath, self.databaseConfig.get(section, option))
+        s_srs = 'EPSG:' + self.databaseConfig.get(section, 'EPSG')
+        m = SpatialProcessing(infile, self.path(filename), s_srs, self.t_srs, self.spatialRes, resampling=resampling, rtype=rtype)
+        if tiling.warpMap(m, self.extent(), valuescale, cache, self.tileSize, workerCount(self.config)):
+            self.log.append(mapname + ' was created succesfully.')
+            return True
+        self.log.append(mapname + ' map was not created.')
+        return False
+
+    #-Create the initial maps of the general modules, and of the routing and glacier modules if these are turned on. The clone
+    # is created again, because the delineation may have clipped it to the basin. If the model is processed in tiles, the
+    # database maps, slope and glacier fraction are created per tile. The routing maps are created for the complete dem,
+    # because the flow directions depend on the complete catchment.
+    def createInitMaps(self):
+        if not self.databaseConfig:
+            self.log.append('Error: no database found in ' + self.databasePath)
+            return False
+        if not self.createClone():
+            return False
+        #-Cache with regridded rasters that is shared by projects
+        cachedir, cachesize = rasterCacheSettings(self.config)
+        cache = RasterCache(cachedir, cachesize) if cachedir else None
+        #-Memory budget; the estimated peak is the memory in use now plus the warped map (or tile) and its copies (Float32)
+        memory = MemoryBudget(memoryBudget(self.config))
+        cells = self.rows * self.cols if self.tileSize is None else min(self.rows * self.cols, self.tileSize**2)
+        estimate = (currentRSS() or 0) + cells * 4 * 4
+        workers = workerCount(self.config)
+        if self.tileSize is not None:
+            self.log.append('Processing the maps in tiles of %d x %d cells' % (self.tileSize, self.tileSize))
+        ok = self.initMap('DEM', GENERALMAPS['DEM'], 'DEM', 'file', cache)
+        if self.tileSize is not None:
+            slope = tiling.slopeMap(self.path(GENERALMAPS['DEM']), self.path(GENERALMAPS['Slope']), self.tileSize, workers)
+            self.log.append('Slope was created succesfully.' if slope else 'Slope map was not created.')
+            ok = slope and ok
+        else:
+            ok = self.pcrcalc('Slope', GENERALMAPS['Slope'], '"%s" = slope("%s")' % (self.path(GENERALMAPS['Slope']),\
+                self.path(GENERALMAPS['DEM']))) and ok
+        ok = self.initMap('Latitudes', GENERALMAPS['Latitudes'], 'LATITUDE', 'file', cache) and ok
+        ok = self.initMap('LandUse', GENERALMAPS['LandUse'], 'LANDUSE', 'file', cache, resampling='mode', rtype='Int32',\
+            valuescale=csf.VS_NOMINAL) and ok
+        for smap in sorted(SOILMAPS):
+            ok = self.initMap(smap, GENERALMAPS[smap], 'SOIL', SOILMAPS[smap], cache) and ok
+        if cache is not None:
+            self.log.append(cache.info())
+        #-Routing maps: ldd, accumulated flux, rivers (> 50 cells), and outlets (pits) with their sub-basins
+        if self.routing:
+            ldd = self.path(ROUTINGMAPS['LDD'])
+            ok = self.pcrcalc('LDD', ROUTINGMAPS['LDD'], '"%s" = lddcreate("%s", 1e31, 1e31, 1e31, 1e31)' % (ldd,\
+                self.path(GENERALMAPS['DEM']))) and ok
+            ok = self.pcrcalc('LDD', ROUTINGMAPS['LDD'], '"%s" = lddrepair("%s")' % (ldd, ldd)) and ok
+            ok = self.pcrcalc('AccuFlux', ROUTINGMAPS['AccuFlux'], '"%s" = accuflux("%s",1)' % (self.path(ROUTINGMAPS['AccuFlux']),\
+                ldd)) and ok
+            ok = self.pcrcalc('Rivers', ROUTINGMAPS['Rivers'], '"%s" = "%s" > 50' % (self.path(ROUTINGMAPS['Rivers']),\
+                self.path(ROUTINGMAPS['AccuFlux']))) and ok
+            ok = self.pcrcalc('Outlets', ROUTINGMAPS['Outlets'], '"%s" = pit("%s")' % (self.path(ROUTINGMAPS['Outlets']), ldd)) and ok
+            ok = self.pcrcalc('Sub-basins', ROUTINGMAPS['Sub-basins'], '"%s" = subcatchment("%s","%s")' %\
+                (self.path(ROUTINGMAPS['Sub-basins']), ldd, self.path(ROUTINGMAPS['Outlets']))) and ok
+        #-Glacier maps: fraction of each cell covered by glaciers, and the debris covered and clean ice fractions
+        if self.glacier:
+            infile = os.path.join(self.databasePath, self.databaseConfig.get('GLACIER', 'file'))
+            s_srs = 'EPSG:' + self.databaseConfig.get('GLACIER', 'EPSG')
+            m = SpatialProcessing(infile, self.path(GLACIERMAPS['GlacFrac']), s_srs, self.t_srs, self.spatialRes)
+            #-The fine raster is created in strips that fit in the remaining memory budget (shared by the tile workers)
+            strip = min(memory.remaining() / (1 if self.tileSize is None else workers), cells * 800)
+            estimate = max(estimate, (currentRSS() or 0) + strip)
+            if tiling.fractionMap(m, self.extent(), 10, strip, self.tileSize, workers):
+                self.log.append('GlacFrac was created succesfully.')
+            else:
+                self.log.append('GlacFrac map was not created.')
+                ok = False
+            glacfrac = self.path(GLACIERMAPS['GlacFrac'])
+            debris = self.path(GLACIERMAPS['GlacFracDB'])
+            ok = self.pcrcalc('GlacFracDB', GLACIERMAPS['GlacFracDB'], '"%s" = scalar(if("%s" lt 4100 and scalar(atan("%s")) lt 24 and "%s" gt 0, 1, 0))' %\
+                (debris, self.path(GENERALMAPS['DEM']), self.path(GENERALMAPS['Slope']), glacfrac)) and ok
+            ok = self.pcrcalc('GlacFracCI', GLACIERMAPS['GlacFracCI'], '"%s" = scalar(if("%s" eq 0 and "%s" gt 0, 1, 0))' %\
+                (self.path(GLACIERMAPS['GlacFracCI']), debris, glacfrac)) and ok
+        self.log.append(memory.report(estimate))
+        return ok
+
+    #-Convert a point shapefile with an id attribute (outlets or stations) to a nominal PCRaster map
+    def pointsToMap(self, mapname, shapefile, filename):
+        m = SpatialProcessing(shapefile, self.path(filename), self.t_srs, self.t_srs, self.spatialRes)
+        data = m.rasterizeAttribute(self.extent(), 'id')
+        if data is None:
+            self.log.append(mapname + ' map was not created.')
+            return False
+        csf.writeMap(self.path(filename), data, self.geoTransform(), csf.VS_NOMINAL)
+        self.log.append(mapname + ' was created succesfully.')
+        return True
+
+    #-Delineate the basin(s) upstream of the outlets, create the sub-basins, and clip the maps to the basin outline
+    def delineate(self):
+        ldd = self.path(ROUTINGMAPS['LDD'])
+        if not self.outletsShp or not os.path.isfile(ldd):
+            self.log.append('Error: missing outlets.shp and/or ldd.map in output folder.')
+            return False
+        basin = self.path('basin.map')
+        outlets = self.path(ROUTINGMAPS['Outlets'])
+        ok = self.pointsToMap('Outlets', self.outletsShp, ROUTINGMAPS['Outlets'])
+        self.log.append('Delineating basin...')
+        ok = self.pcrcalc('Basin', 'basin.map', '"%s" = catchment("%s","%s")' % (basin, ldd, outlets)) and ok
+        if self.config.getint('DELINEATION', 'subbasins') == 1:
+            self.log.append('Creating sub-basins...')
+            ok = self.pcrcalc('Sub-basins', ROUTINGMAPS['Sub-basins'], '"%s" = subcatchment("%s","%s")' %\
+                (self.path(ROUTINGMAPS['Sub-basins']), ldd, outlets)) and ok
+        if self.config.getint('DELINEATION', 'clip') == 1:
+            self.log.append('Clipping maps to basin outline...')
+            #-Re-create the clone, based on the delineated basin map
+            ok = self.pcrcalc('Clone', 'clone.map', '"%s" = boolean("%s")' % (self.path('clone.map'), basin)) and ok
+            maps = dict(GENERALMAPS)
+            if self.glacier:
+                maps.update(GLACIERMAPS)
+            maps.update(ROUTINGMAPS)
+            for k in sorted(maps):
+                ok = self.clip(k, maps[k]) and ok
+            #-Repair the ldd, because clipping may result in an unsound ldd
+            ok = self.pcrcalc('LDD', ROUTINGMAPS['LDD'], '"%s" = lddrepair("%s")' % (ldd, ldd)) and ok
+            ok = self.clip('Basin', 'basin.map') and ok
+        self.log.append('Basin delineation finished.')
+        return ok
+
+    #-Convert the station(s) shapefile to a nominal PCRaster map with the stations
+    def createStations(self):
+        if not self.stationsShp:
+            self.log.append('Error: missing stations.shp in output folder.')
+            return False
+        self.log.append('Converting Station(s) to raster...')
+        ok = self.pointsToMap('Stations', self.stationsShp, 'stations.map')
+        self.log.append('Station creation finished.')
+        return ok
+
+    #-Return a processForcing instance with the settings of the [FORCING] section, the tasks (processForcing method names) to
+    # run, and the number of worker processes in the config file. The instance is None if the forcing can not be processed.
+    def forcingSetup(self):
+        precFlag = self.config.getint('FORCING', 'precFLAG') == 1
+        tempFlag = self.config.getint('FORCING', 'tempFLAG') == 1
+        precDB = self.config.getint('FORCING', 'precDB') == 1
+        tempDB = self.config.getint('FORCING', 'tempDB') == 1
+        #-Settings for the progress
+        timeSteps = ((self.enddate - self.startdate).days + 1)
+        procSteps = 0.
+        if precFlag:
+            procSteps += timeSteps
+        if tempFlag:
+            procSteps += (timeSteps * 3)
+        if not procSteps:
+            return None, [], 1
+        if (precFlag and precDB or tempFlag and tempDB) and not self.databaseConfig:
+            self.log.append('Error: no database found in ' + self.databasePath)
+            return None, [], 1
+        f = processForcing(self.resultsPath, self.t_srs, self.spatialRes, list(self.extent()), self.startdate, self.enddate,\
+            self.log, PrintProgress(self.log), procSteps, self.pcrBinPath)
+        if precFlag and precDB or tempFlag and tempDB:
+            #-Database properties
+            f.dbSource = self.databaseConfig.get('METEO', 'source')
+            f.dbTs = self.databaseConfig.get('METEO', 'file_timestep')
+            f.dbSrs = 'EPSG:' + self.databaseConfig.get('METEO', 'EPSG')
+            f.dbFormat = self.databaseConfig.get('METEO', 'format')
+        #-List with the processForcing methods to run
+        tasks = []
+        if precFlag:
+            if precDB:
+                f.precDBPath = os.path.join(self.databasePath, self.databaseConfig.get('METEO', 'prec_folder'))
+                tasks.append('createPrecDB')
+            else:
+                f.precLocFile = self.existingFile('FORCING', 'precLocFile') or None
+                f.precDataFile = self.existingFile('FORCING', 'precDataFile') or None
+                tasks.append('createPrecCSV')
+        if tempFlag:
+            if tempDB:
+                f.tavgDBPath = os.path.join(self.databasePath, self.databaseConfig.get('METEO', 'tavg_folder'))
+                f.tmaxDBPath = os.path.join(self.databasePath, self.databaseConfig.get('METEO', 'tmax_folder'))
+                f.tminDBPath = os.path.join(self.databasePath, self.databaseConfig.get('METEO', 'tmin_folder'))
+                f.dbDem = os.path.join(self.databasePath, self.databaseConfig.get('METEO', 'dem'))
+                f.modelDem = self.path(GENERALMAPS['DEM'])
+                tasks.append('createTempDB')
+            else:
+                f.tempLocFile = self.existingFile('FORCING', 'tempLocFile') or None
+                f.tempDataFile = self.existingFile('FORCING', 'tempDataFile') or None
+                tasks.append('createTempCSV')
+        #-Interpolation, output, block size, raster cache and memory settings, and the number of worker processes
+        workers = f.readConfig(self.config)
+        return f, tasks, workers
+
+    #-Create the forcing with the settings of the [FORCING] section. The number of worker processes is taken from the config
+    # file if workers is None. If shard is given as (index, count), then only that shard of the period is processed (see
+    # processForcing.setShard), and verifyForcing has to be run when all shards are finished.
+    def createForcing(self, workers=None, shard=None):
+        f, tasks, configured = self.forcingSetup()
+        if not tasks:
+            self.log.append('Nothing to process.')
+            return True
+        if f is None:
+            return False
+        if workers is None:
+            workers = configured
+        if shard is not None:
+            try:
+                f.setShard(shard[0], shard[1])
+            except ValueError, e:
+                self.log.append('Error: ' + str(e))
+                return False
+            self.log.append('Processing shard %d of %d: %s to %s' % (shard[0], shard[1], f.startDate.isoformat(),\
+                f.endDate.isoformat()))
+        start = time.time()
+        try:
+            tiling.runForcing(f, tasks, workers, self.tileSize)
+        except ValueError, e:
+            self.log.append('Error: ' + str(e))
+            return False
+        self.log.append('\n' + f.summary(time.time() - start))
+        return not f.cancelled
+
+    #-Verify that the forcing of all shards is complete, and merge the output of the shards. Returns True if the forcing is
+    # complete.
+    def verifyForcing(self, shards):
+        f, tasks, workers = self.forcingSetup()
+        if not tasks:
+            self.log.append('Nothing to process.')
+            return True
+        if f is None:
+            return False
+        return f.verifyShards(tasks, shards)
+
+#-Function that parses a shard argument INDEX/COUNT, e.g. 0/8 for the first of 8 shards
+def shardArgument(value):
+    try:
+        index, count = [int(v) for v in value.split('/')]
+    except ValueError:
+        raise argparse.ArgumentTypeError('shard should be INDEX/COUNT, e.g. 0/8')
+    if count < 1 or index < 0 or index >= count:
+        raise argparse.ArgumentTypeError('shard index should be 0 to COUNT-1')
+    return index, count
+
+#-Command line interface, e.g. python -m SphyPreProcess run project.cfg --stages clone,initmaps,forcing. The forcing can be
+# split in shards that run as independent jobs (e.g. on different nodes) that share the results folder:
+#   python -m SphyPreProcess run project.cfg --shard 0/8   (... up to --shard 7/8)
+#   python -m SphyPreProcess verify project.cfg --shards 8
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m SphyPreProcess', description='Run the SPHY preprocessing of a project without QGIS.')
+    commands = parser.add_subparsers(dest='command')
+    run = commands.add_parser('run', help='run stages of the preprocessing with the settings of a project config file')
+    run.add_argument('config', help='project config file (see config/preprocess_config_template.cfg)')
+    run.add_argument('--stages', default=None, help='comma separated stages to run (default: all, or forcing with --shard), '\
+        'they are always run in the order ' + ','.join(STAGES))
+    run.add_argument('--workers', type=int, default=None, help='number of worker processes for the forcing (default: workers '\
+        'in the [FORCING] section)')
+    run.add_argument('--shard', type=shardArgument, default=None, metavar='INDEX/COUNT', help='only create the forcing for '\
+        'shard INDEX (0 to COUNT-1) of the period split in COUNT shards; run verify when all shards are finished')
+    verify = commands.add_parser('verify', help='verify that the forcing of all shards is complete and merge their output')
+    verify.add_argument('config', help='project config file (see config/preprocess_config_template.cfg)')
+    verify.add_argument('--shards', type=int, required=True, metavar='COUNT', help='number of shards')
+    args = parser.parse_args(argv)
+    if args.command == 'run':
+        if args.stages is None:
+            args.stages = 'forcing' if args.shard else ','.join(STAGES)
+        stages = [s.strip() for s in args.stages.split(',') if s.strip()]
+        unknown = [s for s in stages if s not in STAGES]
+        if unknown:
+            parser.error('unknown stage(s) ' + ', '.join(unknown) + ', choose from ' + ','.join(STAGES))
+        if args.shard and stages != ['forcing']:
+            parser.error('--shard can only be used for the forcing stage')
+    elif args.shards < 1:
+        parser.error('--shards should be at least 1')
+    try:
+        pipeline = PreProcessPipeline(args.config)
+    except (IOError, ConfigParser.Error), e:
+        print >> sys.stderr, 'Error: ' + str(e)
+        return 2
+    if args.command == 'verify':
+        ok = pipeline.verifyForcing(args.shards)
+    else:
+        ok = pipeline.run(stages, args.workers, args.shard)
+    if ok:
+        return 0
+    return 1
@@ -0,0 +1,141 @@
+# The SPHY model Pre-Processor interface plugin for QGIS:
+# A QGIS plugin that allows the user to create SPHY model input data based on a database. 
+#
+# Copyright (C) 2015  Wilco Terink
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Email: terinkw@gmail.com
+
+#-Authorship information-###################################################################
+__author__ = "Wilco Terink"
+__copyright__ = "Wilco Terink"
+__license__ = "GPL"
+__version__ = "1.0.0"
+__email__ = "terinkw@gmail.com"
+__date__ ='1 January 2017'
+############################################################################################
+
+import os, glob, hashlib, time
+import numpy as np
+
+#-Class with a content-addressed cache of regridded rasters on disk, that can be shared by projects that use the same
+# database. The arrays are stored under a hash of the source file (path, band, size and modification time) and the
+# regridding settings (coordinate systems, extent, resolution, resampling). The size of the cache is limited: if it
+# becomes too large, the least recently used arrays are removed until the cache is at the low-water mark (a fraction of
+# the maximum size), so the cache is not cleaned up again for every array that is added.
+class RasterCache():
+    def __init__(self, cachedir, maxsize=2000, lowwater=0.8):
+        self.cacheDir = cachedir
+        self.maxSize = maxsize * 1024**2  #-maximum size in MB
+        self.lowWater = lowwater * self.maxSize
+        #-Index with the (last used time, size) of the arrays in the cache, read from disk once when it is needed
+        self.index = None
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+
+    #-Key of a source raster and the regridding settings, or None if the source file does not exist
+    def key(self, src, band, s_srs, t_srs, extent, resolution, resampling):
+        try:
+            stat = os.stat(src)
+        except OSError:
+            return None
+        key = repr((os.path.abspath(src), band, stat.st_size, int(stat.st_mtime), s_srs, t_srs, tuple(float(e) for e in\
+            extent), float(resolution), resampling))
+        return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+    #-File of a key; the files are divided over subdirectories to keep directory listings short
+    def filename(self, key):
+        return os.path.join(self.cacheDir, key[:2], key + '.npy')
+
+    #-Return the array of a key, or None if it is not in the cache
+    def get(self, key):
+        if key is None:
+            return None
+        filename = self.filename(key)
+        try:
+            data = np.load(filename)
+            os.utime(filename, None)  #-mark as recently used
+        except (IOError, OSError, ValueError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        if self.index is not None and filename in self.index:
+            self.index[filename] = (time.time(), self.index[filename][1])
+        return data
+
+    #-Store the array of a key, and remove the least recently used arrays if the cache is too large
+    def put(self, key, data):
+        if key is None:
+            return
+        filename = self.filename(key)
+        d = os.path.dirname(filename)
+        if not os.path.isdir(d):
+            try:
+                os.makedirs(d)
+            except OSError: #-created by another process in the meantime
+                pass
+        if self.index is None:
+            self.readIndex()
+        #-Write to a temporary file first, because other processes may use the same cache. The temporary file doesn't
+        # end with .npy, so it is never removed from the cache by another process while it is written.
+        tempfile = filename + '.' + str(os.getpid()) + '.tmp'
+        with open(tempfile, 'wb') as f:
+            np.save(f, data)
+        try:
+            if os.path.isfile(filename):
+                os.remove(filename)
+            os.rename(tempfile, filename)
+        except OSError: #-written by another process in the meantime
+            try:
+                os.remove(tempfile)
+            except OSError:
+                pass
+            return
+        size = os.path.getsize(filename)
+        if filename in self.index:
+            self.size -= self.index[filename][1]
+        self.index[filename] = (time.time(), size)
+        self.size += size
+        if self.size > self.maxSize:
+            self.evict()
+
+    #-Read the index of the arrays in the cache from disk. Arrays that are added by other processes later on are not in the
+    # index of this process; they are found by the next process that uses the cache.
+    def readIndex(self):
+        self.index = {}
+        for f in glob.glob(os.path.join(self.cacheDir, '*', '*.npy')):
+            try:
+                self.index[f] = (os.path.getmtime(f), os.path.getsize(f))
+            except OSError: #-removed by another process
+                pass
+        self.size = sum(size for t, size in self.index.values())
+
+    #-Remove the least recently used arrays until the cache is at the low-water mark
+    def evict(self):
+        for f in sorted(self.index, key=lambda f: self.index[f][0]):
+            if self.size <= self.lowWater:
+                break
+            try:
+                os.remove(f)
+            except OSError: #-removed by another process
+                pass
+            self.size -= self.index.pop(f)[1]
+
+    #-Return a summary of the cache usage, for the log
+    def info(self):
+        total = self.hits + self.misses
+        rate = 100. * self.hits / total if total else 0.
+        return 'Raster cache: %d hits, %d misses (hit rate %.1f%%)' % (self.hits, self.misses, rate)
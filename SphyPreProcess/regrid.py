@@ -0,0 +1,177 @@
+# The SPHY model Pre-Processor interface plugin for QGIS:
+# A QGIS plugin that allows the user to create SPHY model input data based on a database. 
+#
+# Copyright (C) 2015  Wilco Terink
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Email: terinkw@gmail.com
+
+#-Authorship information-###################################################################
+__author__ = "Wilco Terink"
+__copyright__ = "Wilco Terink"
+__license__ = "GPL"
+__version__ = "1.0.0"
+__email__ = "terinkw@gmail.com"
+__date__ ='1 January 2017'
+############################################################################################
+
+import os, hashlib
+import numpy as np
+from osgeo import osr
+
+#-Function that returns a spatial reference that keeps the traditional x=lon, y=lat axis order (GDAL >= 3)
+def spatialReference(srs):
+    sr = osr.SpatialReference()
+    sr.SetFromUserInput(srs)
+    if hasattr(sr, 'SetAxisMappingStrategy'):
+        sr.SetAxisMappingStrategy(osr.OAMS_TRADITIONAL_GIS_ORDER)
+    return sr
+
+#-Coordinate transformations for each (s_srs, t_srs) combination, created only once
+TRANSFORMATIONS = {}
+
+#-Function that returns the (cached) coordinate transformation from s_srs to t_srs, with the traditional x=lon, y=lat axis order
+def coordinateTransformation(s_srs, t_srs):
+    key = (s_srs, t_srs)
+    if key not in TRANSFORMATIONS:
+        TRANSFORMATIONS[key] = osr.CoordinateTransformation(spatialReference(s_srs), spatialReference(t_srs))
+    return TRANSFORMATIONS[key]
+
+#-Function that transforms arrays with x and y coordinates from s_srs to t_srs in one call, and returns the transformed x and y
+def transformPoints(s_srs, t_srs, x, y):
+    if len(x) == 0:
+        return np.array(x, dtype=float), np.array(y, dtype=float)
+    points = np.array(coordinateTransformation(s_srs, t_srs).TransformPoints(np.column_stack((x, y)).tolist()))
+    return points[:, 0], points[:, 1]
+
+#-Class with sparse interpolation weights from a source grid to the model grid. Every model cell has a fixed
+# number of (source cell index, weight) pairs, so applying the weights to a source array is one sparse
+# matrix-vector product that is done with NumPy fancy indexing.
+class RegridWeights():
+    def __init__(self, index, weights):
+        self.index = index      #-(cells, n) array with the flat index of the source cells
+        self.weights = weights  #-(cells, n) array with the weight of each source cell
+
+    #-Apply the weights to a 2D source array, or to a 3D (days, rows, cols) block of source arrays at once. No data (NaN)
+    # source cells are left out and the remaining weights are normalized, which is the same as what gdalwarp does for
+    # bilinear resampling.
+    def apply(self, data, shape):
+        values = data.reshape(data.shape[:-2] + (-1,))[..., self.index]
+        valid = np.isfinite(values) & (self.weights > 0)
+        w = np.where(valid, self.weights, np.float32(0.))
+        wsum = w.sum(axis=-1)
+        out = (np.where(valid, values, np.float32(0.)) * w).sum(axis=-1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            out = np.where(wsum > 0, out / wsum, np.nan)
+        return out.reshape(data.shape[:-2] + tuple(shape)).astype(np.float32)
+
+    #-Window (xoff, yoff, xsize, ysize) of the source grid with columns cols that contains all source cells that are used
+    def window(self, cols):
+        used = self.index[self.weights > 0]
+        if used.size == 0:
+            return (0, 0, 1, 1)
+        r = used // cols
+        c = used % cols
+        return (int(c.min()), int(r.min()), int(c.max() - c.min() + 1), int(r.max() - r.min() + 1))
+
+    #-Return the weights for a window (xoff, yoff, xsize, ysize) of the source grid with columns cols
+    def subset(self, window, cols):
+        xoff, yoff, xsize, ysize = window
+        r = self.index // cols - yoff
+        c = self.index % cols - xoff
+        index = np.where(self.weights > 0, r * xsize + c, 0).astype(np.int32)
+        return RegridWeights(index, self.weights)
+
+    #-Save the weights to a NumPy file
+    def save(self, filename):
+        np.savez(filename, index=self.index, weights=self.weights)
+
+    #-Load the weights from a NumPy file
+    @classmethod
+    def load(cls, filename):
+        f = np.load(filename)
+        return cls(f['index'], f['weights'])
+
+#-Function that calculates the bilinear weights from a source grid (geotransform, cols, rows, s_srs) to the model grid.
+# Source pixel coordinates are calculated for the centre of every model cell, which is the same as gdalwarp does for
+# upsampling the (coarse) forcing grids to the model resolution.
+def bilinearWeights(geotransform, cols, rows, s_srs, engine):
+    #-Cell centres of the model grid
+    x = engine.xMin + (np.arange(engine.cols) + 0.5) * engine.res
+    y = engine.yMax - (np.arange(engine.rows) + 0.5) * engine.res
+    x, y = np.meshgrid(x, y)
+    x = x.ravel()
+    y = y.ravel()
+    #-Transform the cell centres to the source coordinate system
+    sx, sy = transformPoints(engine.t_srs, s_srs, x, y)
+    #-Pixel coordinates in the source grid
+    u = (sx - geotransform[0]) / geotransform[1]
+    v = (sy - geotransform[3]) / geotransform[5]
+    inside = (u >= 0) & (u < cols) & (v >= 0) & (v < rows)
+    px = u - 0.5
+    py = v - 0.5
+    i0 = np.floor(px).astype(np.int64)
+    j0 = np.floor(py).astype(np.int64)
+    fx = px - i0
+    fy = py - j0
+    index = np.zeros((len(x), 4), dtype=np.int32)
+    weights = np.zeros((len(x), 4), dtype=np.float32)
+    k = 0
+    for dj, wy in ((0, 1. - fy), (1, fy)):
+        for di, wx in ((0, 1. - fx), (1, fx)):
+            i = i0 + di
+            j = j0 + dj
+            ok = inside & (i >= 0) & (i < cols) & (j >= 0) & (j < rows)
+            index[:, k] = np.where(ok, j * cols + i, 0)
+            weights[:, k] = np.where(ok, wx * wy, 0.)
+            k += 1
+    return RegridWeights(index, weights)
+
+#-Class that keeps the regridding weights in memory and caches them on disk, so they are computed only once for a
+# source grid and model grid combination.
+class RegridCache():
+    def __init__(self, cachedir):
+        self.cachedir = cachedir
+        self.weights = {}
+
+    #-Key for a source grid and model grid combination
+    def key(self, geotransform, cols, rows, s_srs, engine):
+        key = repr((tuple(geotransform), cols, rows, s_srs, engine.t_srs, (engine.xMin, engine.yMin, engine.xMax,\
+            engine.yMax), engine.res))
+        return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+    #-Return the weights for a source grid; calculate them if they are not found in memory or on disk
+    def get(self, geotransform, cols, rows, s_srs, engine):
+        key = self.key(geotransform, cols, rows, s_srs, engine)
+        if key not in self.weights:
+            filename = os.path.join(self.cachedir, 'regrid_' + key + '.npz')
+            if os.path.isfile(filename):
+                self.weights[key] = RegridWeights.load(filename)
+            else:
+                weights = bilinearWeights(geotransform, cols, rows, s_srs, engine)
+                if not os.path.isdir(self.cachedir):
+                    try:
+                        os.makedirs(self.cachedir)
+                    except OSError: #-created by another worker process in the meantime
+                        pass
+                #-Write to a temporary file first, because other worker processes may use the same cache directory
+                tempfile = os.path.join(self.cachedir, 'regrid_' + key + '_' + str(os.getpid()) + '.npz')
+                weights.save(tempfile)
+                try:
+                    os.rename(tempfile, filename)
+                except OSError:
+                    os.remove(tempfile)
+                self.weights[key] = weights
+        return self.weights[key]
@@ -0,0 +1,108 @@
+# The SPHY model Pre-Processor interface plugin for QGIS:
+# A QGIS plugin that allows the user to create SPHY model input data based on a database. 
+#
+# Copyright (C) 2015  Wilco Terink
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Email: terinkw@gmail.com
+
+#-Authorship information-###################################################################
+__author__ = "Wilco Terink"
+__copyright__ = "Wilco Terink"
+__license__ = "GPL"
+__version__ = "1.0.0"
+__email__ = "terinkw@gmail.com"
+__date__ ='1 January 2017'
+############################################################################################
+
+import numpy as np
+from osgeo import gdal
+
+#-Import the decorator that keeps gdal from writing .aux.xml files next to the rasters that are read
+from warp import withoutAuxFiles
+
+#-Class that reads monthly NetCDF files (one band per day) of the database. Every file is opened only once, and only the
+# window that is required for the model area is read for all days at once. Days are regridded from this 3D array.
+class MonthSlabReader():
+    def __init__(self, engine, s_srs):
+        self.engine = engine
+        self.s_srs = s_srs
+        self.filename = None
+        self.slab = None
+        self.grid = None
+        self.window = None
+        self.weights = None
+
+    #-Return the regridded array for a day of a monthly file, or None if the day could not be read
+    def read(self, filename, day):
+        data, found = self.readDays(filename, [day])
+        return data[0] if found[0] else None
+
+    #-Return the regridded (days, rows, cols) block for a list of days of a monthly file, together with a boolean array that
+    # is False for the days that could not be read. The days are regridded at once. If the engine has a raster cache, then
+    # the file is only read for the days that are not found in the cache.
+    def readDays(self, filename, days):
+        shape = (self.engine.rows, self.engine.cols)
+        data = np.empty((len(days),) + shape, dtype=np.float32)
+        data[:] = np.nan
+        found = np.zeros(len(days), dtype=bool)
+        keys = [self.engine.cacheKey(filename, self.s_srs, day) for day in days]
+        missing = []
+        for i, key in enumerate(keys):
+            cached = self.engine.rasterCache.get(key) if key is not None else None
+            if cached is not None:
+                data[i] = cached
+                found[i] = True
+            else:
+                missing.append(i)
+        if missing:
+            if filename != self.filename:
+                self.load(filename)
+            if self.slab is not None:
+                missing = [i for i in missing if days[i] <= self.slab.shape[0]]
+            else:
+                missing = []
+        if missing:
+            data[missing] = self.weights.apply(self.slab[[days[i] - 1 for i in missing]], shape)
+            found[missing] = True
+            for i in missing:
+                if keys[i] is not None:
+                    self.engine.rasterCache.put(keys[i], data[i])
+        return data, found
+
+    #-Read the window of the model area for all bands of a monthly file into a (days, rows, cols) array
+    @withoutAuxFiles
+    def load(self, filename):
+        self.filename = filename
+        self.slab = None
+        ds = gdal.Open(filename)
+        if ds is None:
+            return
+        grid = (tuple(ds.GetGeoTransform()), ds.RasterXSize, ds.RasterYSize)
+        #-Weights and window only need to be determined again if the grid of the file is different
+        if grid != self.grid:
+            weights = self.engine.regridCache.get(grid[0], grid[1], grid[2], self.s_srs, self.engine)
+            self.window = weights.window(grid[1])
+            self.weights = weights.subset(self.window, grid[1])
+            self.grid = grid
+        xoff, yoff, xsize, ysize = self.window
+        data = ds.ReadAsArray(xoff, yoff, xsize, ysize).astype(np.float32)
+        if data.ndim == 2:
+            data = data.reshape((1, ysize, xsize))
+        nodata = ds.GetRasterBand(1).GetNoDataValue()
+        if nodata is not None:
+            data[data == np.float32(nodata)] = np.nan
+        self.slab = data
+        ds = None
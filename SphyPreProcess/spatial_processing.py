@@ -28,6 +28,13 @@ __date__ ='1 January 2017'
 ############################################################################################
 
 import os
+import numpy as np
+from osgeo import gdal
+
+#-Import the PCRaster map writer
+import csf
+#-Import the decorator that keeps gdal from writing .aux.xml files next to the rasters that are read
+from warp import withoutAuxFiles
 
 #-Class with gdal processing commands
 class SpatialProcessing():
@@ -49,6 +56,97 @@ class SpatialProcessing():
                         + ' ' + self.input + ' ' + self.output 
         return command
     
+    #-Reproject, resample, and clip to extent (xmin, ymin, xmax, ymax) in-process. Returns a Float32 array with NaN for no data,
+    # or None if the input could not be read. If a raster cache is given, then the result is taken from the cache if the same
+    # input was regridded to the same grid before (e.g. by another project), and stored in the cache otherwise.
+    @withoutAuxFiles
+    def warp(self, extent, cache=None):
+        key = None
+        if cache is not None:
+            key = cache.key(self.input, 1, self.s_srs, self.t_srs, extent, self.t_res, self.resampling + '/' + self.rtype)
+            data = cache.get(key)
+            if data is not None:
+                return data
+        ds = gdal.Open(self.input)
+        if ds is None:
+            return None
+        out = gdal.Warp('', ds, format='MEM', srcSRS=self.s_srs, dstSRS=self.t_srs, outputBounds=tuple(extent),\
+            xRes=float(self.t_res), yRes=float(self.t_res), resampleAlg=self.resampling,\
+            outputType=gdal.GetDataTypeByName(self.rtype))
+        band = out.GetRasterBand(1)
+        data = band.ReadAsArray().astype(np.float32)
+        nodata = band.GetNoDataValue()
+        if nodata is not None:
+            data[data == np.float32(nodata)] = np.nan
+        ds = None
+        out = None
+        if key is not None:
+            cache.put(key, data)
+        return data
+
+    #-Reproject, resample, and clip to extent in-process, and write the result as PCRaster map to the output. Returns True if
+    # the map was created.
+    def warpToMap(self, extent, valuescale=csf.VS_SCALAR, cache=None):
+        data = self.warp(extent, cache)
+        if data is None:
+            return False
+        res = float(self.t_res)
+        csf.writeMap(self.output, data, (float(extent[0]), res, 0., float(extent[3]), 0., -res), valuescale)
+        return True
+
+    #-Fraction of each cell of the target grid (extent and resolution) that is covered by the polygons of the input shapefile.
+    # The polygons are projected to the target coordinate system and rasterized with a resolution that is factor times finer,
+    # after which the fine cells are averaged to the target grid. All intermediate datasets are kept in memory (/vsimem/).
+    # The fine raster is created in strips of rows that use at most maxbytes of memory (None = all rows at once).
+    @withoutAuxFiles
+    def rasterizeFraction(self, extent, factor=10, maxbytes=None):
+        res = float(self.t_res)
+        cols = int(round((float(extent[2]) - float(extent[0])) / res))
+        rows = int(round((float(extent[3]) - float(extent[1])) / res))
+        strip = rows
+        if maxbytes is not None:
+            #-Fine Float32 raster and its copy
+            strip = int(max(1, min(rows, maxbytes // (cols * factor * factor * 4 * 2))))
+        vsifile = '/vsimem/' + os.path.splitext(os.path.basename(self.input))[0] + '_' + str(os.getpid()) + '.shp'
+        vector = gdal.VectorTranslate(vsifile, self.input, format='ESRI Shapefile', srcSRS=self.s_srs, dstSRS=self.t_srs,\
+            reproject=True)
+        if vector is None:
+            return None
+        vector = None
+        fraction = np.zeros((rows, cols), dtype=np.float32)
+        for r in range(0, rows, strip):
+            n = min(strip, rows - r)
+            ymax = float(extent[3]) - r * res
+            #-Cells without polygons get zero instead of no data
+            ds = gdal.Rasterize('', vsifile, format='MEM', outputBounds=(float(extent[0]), ymax - n * res, float(extent[2]),\
+                ymax), width=cols * factor, height=n * factor, burnValues=[1.], initValues=[0.], outputType=gdal.GDT_Float32)
+            if ds is None:
+                fraction = None
+                break
+            data = ds.GetRasterBand(1).ReadAsArray()
+            ds = None
+            fraction[r:r+n] = data.reshape(n, factor, cols, factor).mean(axis=(1, 3))
+        gdal.Unlink(vsifile)
+        for ext in ['.shx', '.dbf', '.prj', '.cpg']:
+            gdal.Unlink(vsifile[:-4] + ext)
+        return fraction
+
+    #-Value of an attribute (e.g. the id of the outlets or stations) of the features of the input shapefile on the target grid
+    # (extent and resolution), in-process and without QGIS. The shapefile must be in the target coordinate system, just as for
+    # the conversion with GRASS in the GUI. Returns a Float32 array with NaN for the cells without features, or None if the
+    # input could not be read.
+    @withoutAuxFiles
+    def rasterizeAttribute(self, extent, attribute='id'):
+        res = float(self.t_res)
+        ds = gdal.Rasterize('', self.input, format='MEM', outputBounds=tuple(float(e) for e in extent), xRes=res, yRes=res,\
+            attribute=attribute, noData=-9999., initValues=[-9999.], outputType=gdal.GDT_Float32)
+        if ds is None:
+            return None
+        data = ds.GetRasterBand(1).ReadAsArray().astype(np.float32)
+        ds = None
+        data[data == -9999.] = np.nan
+        return data
+
     #-Convert raster format
     def rasterTranslate(self):
         command = 'gdal_translate ' + self.extra + ' ' + self.input + ' ' + self.output
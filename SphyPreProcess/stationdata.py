@@ -0,0 +1,161 @@
+# The SPHY model Pre-Processor interface plugin for QGIS:
+# A QGIS plugin that allows the user to create SPHY model input data based on a database. 
+#
+# Copyright (C) 2015  Wilco Terink
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Email: terinkw@gmail.com
+
+#-Authorship information-###################################################################
+__author__ = "Wilco Terink"
+__copyright__ = "Wilco Terink"
+__license__ = "GPL"
+__version__ = "1.0.0"
+__email__ = "terinkw@gmail.com"
+__date__ ='1 January 2017'
+############################################################################################
+
+import os, glob, csv, datetime, hashlib
+import numpy as np
+
+#-Class that converts a station data CSV file (date, value station 1, value station 2, ...) into a columnar binary
+# cache: a (dates, columns) Float32 array with NaN for missing values (-9999), and the dates as ordinal day numbers.
+# The cache is memory-mapped, so only the rows that are used are read from disk, and the row of a date is found
+# without scanning the file. The cache is created again if the size, modification time, or content of the CSV file
+# changes.
+class StationData():
+    def __init__(self, csvfile, cachedir):
+        self.csvFile = csvfile
+        self.cacheDir = cachedir
+        name = os.path.splitext(os.path.basename(csvfile))[0]
+        self.prefix = os.path.join(cachedir, name + '_')
+        self.values = None
+        self.dates = None
+        self.load()
+
+    #-Key of the CSV file, based on its size, modification time, and the first and last 64 kB of its content
+    def key(self):
+        stat = os.stat(self.csvFile)
+        h = hashlib.sha1(repr((stat.st_size, stat.st_mtime)).encode('utf-8'))
+        with open(self.csvFile, 'rb') as f:
+            h.update(f.read(65536))
+            if stat.st_size > 65536:
+                f.seek(max(65536, stat.st_size - 65536))
+                h.update(f.read())
+        return h.hexdigest()
+
+    #-Read the CSV file once and return the dates (ordinal day numbers) and values
+    def readCSV(self):
+        dates = []
+        values = []
+        with open(self.csvFile, 'rb') as csvfile:
+            data = csv.reader(csvfile, delimiter=',')
+            data.next()
+            for row in data:
+                if not row:
+                    continue
+                dates.append(datetime.datetime.strptime(row[0], '%d-%m-%Y').toordinal())
+                values.append([float(v) for v in row[1:]])
+        values = np.array(values, dtype=np.float32)
+        values[np.trunc(values) == -9999] = np.nan
+        return np.array(dates, dtype=np.int32), values
+
+    #-Save an array to the cache. A temporary file is written first, because other worker processes may use the same
+    # cache directory.
+    def save(self, filename, data):
+        tempfile = filename[:-4] + '_' + str(os.getpid()) + '.npy'
+        np.save(tempfile, data)
+        try:
+            os.rename(tempfile, filename)
+        except OSError: #-written by another worker process in the meantime
+            os.remove(tempfile)
+
+    #-Load the cache, or create it from the CSV file if it does not exist or if the CSV file is changed
+    def load(self):
+        key = self.key()
+        datesfile = self.prefix + key + '_dates.npy'
+        valuesfile = self.prefix + key + '_values.npy'
+        created = False
+        if not (os.path.isfile(datesfile) and os.path.isfile(valuesfile)):
+            if not os.path.isdir(self.cacheDir):
+                try:
+                    os.makedirs(self.cacheDir)
+                except OSError: #-created by another worker process in the meantime
+                    pass
+            dates, values = self.readCSV()
+            self.save(valuesfile, values)
+            self.save(datesfile, dates)
+            created = True
+        self.dates = np.load(datesfile)
+        self.values = np.load(valuesfile, mmap_mode='r')
+        if created:
+            self.removeStale(key)
+        #-Index from date to row: direct if the dates are consecutive, otherwise with a dictionary
+        self.first = int(self.dates[0]) if len(self.dates) else 0
+        self.consecutive = bool(np.all(np.diff(self.dates) == 1))
+        if not self.consecutive:
+            self.index = dict((int(d), i) for i, d in enumerate(self.dates))
+
+    #-Remove the caches of older versions of the CSV file: the files of other keys. This is done after the cache of the
+    # current key is loaded, so the files of the current key are never removed while another worker process uses them.
+    def removeStale(self, key):
+        for suffix in ['_dates.npy', '_values.npy']:
+            for f in glob.glob(self.prefix + '*' + suffix):
+                other = f[len(self.prefix):-len(suffix)]
+                #-skip the current key, and the caches of other CSV files with a name that starts with the same prefix
+                if other == key or len(other) != len(key) or other.strip('0123456789abcdef'):
+                    continue
+                try:
+                    os.remove(f)
+                except OSError: #-removed by another worker process, or still in use (Windows)
+                    pass
+
+    #-Number of rows (dates)
+    def __len__(self):
+        return len(self.dates)
+
+    #-Return the row of a date, or None if the date is not in the CSV file
+    def row(self, date):
+        d = date.toordinal()
+        if self.consecutive:
+            r = d - self.first
+            return r if 0 <= r < len(self.dates) else None
+        return self.index.get(d)
+
+    #-Return the date of a row
+    def date(self, row):
+        return datetime.date.fromordinal(int(self.dates[row]))
+
+    #-Return the values (NaN for missing values) of n columns of a row, starting at column start (0 = first station)
+    def rowValues(self, row, start, n):
+        return np.array(self.values[row, start:start+n], dtype=np.float32)
+
+    #-Return the values (NaN for missing values) of n columns for a list of dates as (dates, n) array, starting at column
+    # start, together with a boolean array that is False for the dates that are not in the CSV file
+    def blockValues(self, dates, start, n):
+        rows = [self.row(d) for d in dates]
+        found = np.array([r is not None for r in rows], dtype=bool)
+        values = np.empty((len(dates), n), dtype=np.float32)
+        values[:] = np.nan
+        if found.any():
+            values[found] = self.values[[r for r in rows if r is not None], start:start+n]
+        return values, found
+
+    #-Return a fingerprint of the values of n columns of the row of a date, or None if the date is not in the CSV file
+    def fingerprint(self, date, start, n):
+        row = self.row(date)
+        if row is None:
+            return None
+        return hashlib.sha1(self.rowValues(row, start, n).tobytes()).hexdigest()
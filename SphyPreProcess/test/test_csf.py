@@ -0,0 +1,136 @@
+# The SPHY model Pre-Processor interface plugin for QGIS:
+# A QGIS plugin that allows the user to create SPHY model input data based on a database. 
+#
+# Copyright (C) 2015  Wilco Terink
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Email: terinkw@gmail.com
+
+#-Authorship information-###################################################################
+__author__ = "Wilco Terink"
+__copyright__ = "Wilco Terink"
+__license__ = "GPL"
+__version__ = "1.0.0"
+__email__ = "terinkw@gmail.com"
+__date__ ='1 January 2017'
+############################################################################################
+
+import os, shutil, struct, tempfile, unittest
+import numpy as np
+
+import csf
+
+#-Tests of the header layout and missing values of the PCRaster maps (Cross System Format, version 2)
+class CSFTest(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.geotransform = (100., 10., 0., 500., 0., -10.)
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def path(self, name):
+        return os.path.join(self.tempdir, name)
+
+    def read(self, filename):
+        with open(filename, 'rb') as f:
+            return f.read()
+
+    def testHeader(self):
+        data = np.array([[1.5, np.nan, -2.], [4., 0., 3.25]], dtype=np.float32)
+        filename = self.path('scalar.map')
+        csf.writeMap(filename, data, self.geotransform)
+        header = self.read(filename)[:csf.DATA_OFFSET]
+        self.assertEqual(os.path.getsize(filename), csf.DATA_OFFSET + data.size * 4)
+        self.assertTrue(header.startswith(csf.SIGNATURE))
+        #-Main header: version, projection and byte order
+        self.assertEqual(struct.unpack('<H', header[32:34])[0], 2)
+        self.assertEqual(struct.unpack('<H', header[38:40])[0], csf.PT_YDECT2B)
+        self.assertEqual(struct.unpack('<I', header[46:50])[0], 1)
+        #-Raster header: value scale, cell representation, minimum and maximum value, and the grid
+        self.assertEqual(struct.unpack('<HH', header[64:68]), (csf.VS_SCALAR, csf.CR_REAL4))
+        self.assertEqual(struct.unpack('<f', header[68:72])[0], -2.)
+        self.assertEqual(struct.unpack('<f', header[76:80])[0], 4.)
+        self.assertEqual(struct.unpack('<dd', header[84:100]), (100., 500.))
+        self.assertEqual(struct.unpack('<II', header[100:108]), (2, 3))
+        self.assertEqual(struct.unpack('<ddd', header[108:132]), (10., 10., 0.))
+
+    def testMissingValues(self):
+        #-All bits set for REAL4 cells, the smallest value for INT4 cells, and 255 for UINT1 cells
+        for valuescale, cellrepr, mv in [(csf.VS_SCALAR, csf.CR_REAL4, b'\xff\xff\xff\xff'), (csf.VS_NOMINAL,\
+                csf.CR_INT4, struct.pack('<i', -2**31)), (csf.VS_BOOLEAN, csf.CR_UINT1, b'\xff')]:
+            filename = self.path('mv.map')
+            csf.writeMap(filename, np.array([[np.nan, 1.]]), self.geotransform, valuescale)
+            content = self.read(filename)
+            self.assertEqual(struct.unpack('<HH', content[64:68]), (valuescale, cellrepr))
+            self.assertEqual(content[csf.DATA_OFFSET:csf.DATA_OFFSET + len(mv)], mv)
+            data = csf.readMap(filename)[0]
+            self.assertTrue(np.isnan(data[0, 0]))
+            self.assertEqual(data[0, 1], 1.)
+
+    def testEmptyMap(self):
+        #-The minimum and maximum value of a map without values are missing values
+        filename = self.path('empty.map')
+        csf.writeMap(filename, np.array([[np.nan, np.nan]]), self.geotransform)
+        header = self.read(filename)[:csf.DATA_OFFSET]
+        self.assertEqual(header[68:72], b'\xff\xff\xff\xff')
+        self.assertEqual(header[76:80], b'\xff\xff\xff\xff')
+        self.assertTrue(np.isnan(csf.readMap(filename)[0]).all())
+
+    def testReadMap(self):
+        data = np.arange(20, dtype=np.float32).reshape(4, 5)
+        filename = self.path('read.map')
+        csf.writeMap(filename, data, self.geotransform)
+        array, geotransform = csf.readMap(filename)
+        np.testing.assert_array_equal(array, data)
+        self.assertEqual(geotransform, self.geotransform)
+
+    def testWindow(self):
+        data = np.arange(20, dtype=np.float32).reshape(4, 5)
+        filename = self.path('window.map')
+        csf.writeMap(filename, data, self.geotransform)
+        window, geotransform = csf.readMap(filename, (1, 2, 2, 3))
+        np.testing.assert_array_equal(window, data[1:3, 2:5])
+        self.assertEqual(geotransform, (120., 10., 0., 490., 0., -10.))
+
+    def testMapWriter(self):
+        data = np.random.RandomState(1).rand(7, 9).astype(np.float32) * 100
+        data[2, 3] = np.nan
+        csf.writeMap(self.path('full.map'), data, self.geotransform)
+        #-The map written in parts is the same as the map written at once
+        writer = csf.MapWriter(self.path('parts.map'), 7, 9, self.geotransform)
+        for row in range(0, 7, 3):
+            for col in range(0, 9, 4):
+                writer.write(row, col, data[row:row + 3, col:col + 4])
+        writer.close()
+        self.assertEqual(self.read(self.path('parts.map')), self.read(self.path('full.map')))
+
+    def testMapWriterExistingMap(self):
+        data = np.random.RandomState(2).rand(7, 9).astype(np.float32) - 0.5
+        csf.writeMap(self.path('full.map'), data, self.geotransform)
+        #-Parts written in an existing map by separate writers, and the minimum and maximum value set afterwards
+        filename = self.path('parts.map')
+        csf.MapWriter(filename, 7, 9, self.geotransform).close(header=False)
+        minmax = []
+        for row in (0, 4):
+            writer = csf.MapWriter(filename)
+            writer.write(row, 0, data[row:row + 4])
+            writer.close(header=False)
+            minmax.append(writer.minmax)
+        csf.setMinMax(filename, (min(m[0] for m in minmax), max(m[1] for m in minmax)))
+        self.assertEqual(self.read(filename), self.read(self.path('full.map')))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+# The SPHY model Pre-Processor interface plugin for QGIS:
+# A QGIS plugin that allows the user to create SPHY model input data based on a database. 
+#
+# Copyright (C) 2015  Wilco Terink
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Email: terinkw@gmail.com
+
+#-Authorship information-###################################################################
+__author__ = "Wilco Terink"
+__copyright__ = "Wilco Terink"
+__license__ = "GPL"
+__version__ = "1.0.0"
+__email__ = "terinkw@gmail.com"
+__date__ ='1 January 2017'
+############################################################################################
+
+import datetime, os, shutil, tempfile, unittest
+import numpy as np
+
+#-The forcing cubes need the GDAL Python bindings (osgeo), which QGIS has, and netCDF4
+try:
+    from osgeo import gdal
+except ImportError:
+    gdal = None
+if gdal is not None:
+    import cube
+
+#-Model grid of 3 x 4 cells of 10 m (the attributes of the warp engine that are used by the cubes)
+class Grid():
+    t_srs = 'EPSG:32645'
+    xMin = 0.
+    yMax = 30.
+    rows = 3
+    cols = 4
+    res = 10.
+    geoTransform = (0., 10., 0., 30., 0., -10.)
+
+#-Tests of the merge of the NetCDF cubes that are written for parts of the period
+@unittest.skipIf(gdal is None or cube.netCDF4 is None, 'the GDAL Python bindings or netCDF4 are not available')
+class CubeTest(unittest.TestCase):
+    def setUp(self):
+        self.outdir = tempfile.mkdtemp()
+        self.startdate = datetime.date(2000, 1, 1)
+        self.data = np.random.RandomState(4).rand(10, 3, 4).astype(np.float32)
+        self.data[2, 1, 1] = np.nan
+
+    def tearDown(self):
+        shutil.rmtree(self.outdir)
+
+    #-Write the days start to start + days of the data in a cube
+    def writeCube(self, filename, start, days, written=None):
+        c = cube.ForcingCube(filename, 'prec', Grid, self.startdate, days, dayoffset=start, chunkdays=3)
+        for i in range(days if written is None else written):
+            c.write(i, self.data[start + i])
+        c.close()
+
+    def read(self, filename):
+        nc = cube.netCDF4.Dataset(filename)
+        var = nc.variables['prec']
+        var.set_auto_mask(False)
+        data = var[:]
+        time = nc.variables['time'][:]
+        nc.close()
+        return data, time
+
+    def testMergeCubes(self):
+        self.writeCube(os.path.join(self.outdir, 'sequential.nc'), 0, 10)
+        self.writeCube(os.path.join(self.outdir, 'prec_part00000.nc'), 0, 4)
+        self.writeCube(os.path.join(self.outdir, 'prec_part00004.nc'), 4, 6)
+        self.assertEqual(cube.partDays(self.outdir), {'prec': set(range(10))})
+        #-The merged cube is the same as the cube that is written at once, and the parts are removed
+        cube.mergeCubes(self.outdir, Grid, self.startdate, 10, chunkdays=3)
+        merged, time = self.read(os.path.join(self.outdir, 'prec.nc'))
+        sequential = self.read(os.path.join(self.outdir, 'sequential.nc'))[0]
+        np.testing.assert_array_equal(merged, sequential)
+        np.testing.assert_array_equal(time, np.arange(10))
+        self.assertEqual(merged[2, 1, 1], cube.FILLVALUE)
+        self.assertEqual(sorted(os.listdir(self.outdir)), ['prec.nc', 'sequential.nc'])
+
+    def testIncompletePart(self):
+        #-The days of a part that is not completely written are not included
+        self.writeCube(os.path.join(self.outdir, 'prec_part00000.nc'), 0, 4)
+        self.writeCube(os.path.join(self.outdir, 'prec_part00004.nc'), 4, 6, written=5)
+        self.assertEqual(cube.partDays(self.outdir), {'prec': set(range(4))})
+
+if __name__ == '__main__':
+    unittest.main()
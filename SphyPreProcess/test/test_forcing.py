@@ -0,0 +1,182 @@
+# The SPHY model Pre-Processor interface plugin for QGIS:
+# A QGIS plugin that allows the user to create SPHY model input data based on a database. 
+#
+# Copyright (C) 2015  Wilco Terink
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Email: terinkw@gmail.com
+
+#-Authorship information-###################################################################
+__author__ = "Wilco Terink"
+__copyright__ = "Wilco Terink"
+__license__ = "GPL"
+__version__ = "1.0.0"
+__email__ = "terinkw@gmail.com"
+__date__ ='1 January 2017'
+############################################################################################
+
+import datetime, glob, os, shutil, tempfile, unittest
+
+#-The forcing modules need the GDAL Python bindings (osgeo), which QGIS has
+try:
+    from osgeo import gdal
+except ImportError:
+    gdal = None
+if gdal is not None:
+    from forcing import processForcing, shardRanges
+    from manifest import ForcingManifest
+    from interpolation import InverseDistanceInterpolator, NearestStationsInterpolator
+
+#-Memory budget with a fixed amount of memory left
+class Budget():
+    def __init__(self, remaining):
+        self.bytes = remaining
+    def remaining(self):
+        return self.bytes
+    def cacheEntries(self, requested, entrysize, fraction=0.25):
+        return requested
+
+#-Forcing of a model grid of 100 x 100 cells of 10 m, by default for 10 days
+def createForcing(resultsdir, log, enddate=datetime.date(2000, 1, 10), startdate=datetime.date(2000, 1, 1)):
+    return processForcing(resultsdir, 'EPSG:32645', 10., [0., 0., 1000., 1000.], startdate, enddate, log, None, 1, '')
+
+#-Tests of the forcing settings
+@unittest.skipIf(gdal is None, 'the GDAL Python bindings are not available')
+class ForcingTest(unittest.TestCase):
+    def setUp(self):
+        self.resultsdir = tempfile.mkdtemp() + '/'
+        self.log = []
+        self.forcing = createForcing(self.resultsdir, self.log)
+
+    def tearDown(self):
+        shutil.rmtree(self.resultsdir)
+
+    def testStationInterpolatorMemory(self):
+        stations = [(i, 5. + i, 5. + 2 * i) for i in range(50)]
+        #-The inverse distance weights of 50 stations for 10000 cells need 2 MB
+        self.forcing.memory = Budget(10 * 1024**2)
+        self.assertTrue(isinstance(self.forcing.stationInterpolator(stations), InverseDistanceInterpolator))
+        self.assertEqual(self.log, [])
+        #-If they don't fit the nearest stations of which the weights (8 bytes per station and cell) fit in half of the
+        # memory that is left are used
+        self.forcing.memory = Budget(1024**2)
+        f = self.forcing.stationInterpolator(stations)
+        self.assertTrue(isinstance(f, NearestStationsInterpolator))
+        self.assertEqual(f.neighbours, 6)
+        self.assertEqual(len(self.log), 1)
+        self.assertTrue(self.log[0].startswith('Warning: the inverse distance weights of 50 stations'))
+
+    #-Write the precipitation maps of the first days of a run, and a manifest in which they are complete
+    def writeMaps(self, days):
+        manifest = ForcingManifest(self.forcing.manifestFile)
+        manifest.reset(self.forcing.runSettings(['createPrecCSV']), self.forcing.startDate.isoformat())
+        for i in range(days):
+            mapfile = self.forcing.outdir + 'prec' + self.forcing.pcrExtention(i + 1)
+            with open(mapfile, 'wb') as f:
+                f.write(b'\0' * 100)
+            date = self.forcing.startDate + datetime.timedelta(days=i)
+            manifest.add(mapfile, date.isoformat(), 'input')
+        manifest.save()
+
+    #-Names of the forcing maps and the maps that are complete according to the manifest
+    def maps(self):
+        manifest = ForcingManifest(self.forcing.manifestFile)
+        manifest.load()
+        return sorted(os.path.basename(f) for f in glob.glob(self.forcing.outdir + 'prec*')), sorted(manifest.maps)
+
+    def testResume(self):
+        self.writeMaps(10)
+        self.forcing.prepareOutput(['createPrecCSV'])
+        maps, complete = self.maps()
+        self.assertEqual(len(maps), 10)
+        self.assertEqual(maps, complete)
+        self.assertEqual(self.log, ['Resuming the forcing of the previous run: 10 maps are complete\n'])
+
+    def testShorterPeriod(self):
+        #-The maps after the end date are removed
+        self.writeMaps(10)
+        self.forcing = createForcing(self.resultsdir, self.log, datetime.date(2000, 1, 6))
+        self.forcing.prepareOutput(['createPrecCSV'])
+        maps, complete = self.maps()
+        self.assertEqual(maps, ['prec0000.00' + str(i) for i in range(1, 7)])
+        self.assertEqual(maps, complete)
+
+    def testPartManifests(self):
+        #-The maps of the part manifests of the worker processes of an interrupted run are resumed
+        self.writeMaps(10)
+        manifest = ForcingManifest(self.forcing.manifestFile)
+        manifest.load()
+        part = ForcingManifest(self.forcing.manifestFile)
+        part.reset(manifest.settings, manifest.startDate)
+        for name in sorted(manifest.maps)[5:]:
+            part.added[name] = manifest.maps.pop(name)
+        manifest.save()
+        part.save(self.forcing.manifestFile[:-5] + '_part00005.json', part=True)
+        self.forcing.prepareOutput(['createPrecCSV'])
+        self.assertEqual(len(self.maps()[1]), 10)
+        self.assertEqual(glob.glob(self.forcing.outdir + '*_part*'), [])
+
+    def testChangedRun(self):
+        #-All maps are removed if the start date or the settings are changed
+        self.writeMaps(10)
+        self.forcing = createForcing(self.resultsdir, self.log, startdate=datetime.date(2000, 1, 2))
+        self.forcing.prepareOutput(['createPrecCSV'])
+        self.assertEqual(self.maps(), ([], []))
+        self.forcing = createForcing(self.resultsdir, self.log)
+        self.writeMaps(10)
+        self.forcing.idwPower = 3.
+        self.forcing.prepareOutput(['createPrecCSV'])
+        self.assertEqual(self.maps(), ([], []))
+        #-and if resume is switched off
+        self.forcing.idwPower = 2.
+        self.writeMaps(10)
+        self.forcing.resume = False
+        self.forcing.prepareOutput(['createPrecCSV'])
+        self.assertEqual(self.maps(), ([], []))
+
+    def testShard(self):
+        #-The last of 3 shards of 10 days: the pcraster extension of the maps continues from the complete period
+        self.forcing.setShard(2, 3)
+        self.assertEqual((self.forcing.startDate, self.forcing.endDate), (datetime.date(2000, 1, 7), datetime.date(2000, 1, 10)))
+        self.assertEqual((self.forcing.timeSteps, self.forcing.dayOffset), (4, 6))
+        self.assertEqual(self.forcing.pcrExtention(1), '0000.007')
+        self.assertTrue(self.forcing.manifestFile.endswith('manifest_shard002of003.json'))
+        self.assertRaises(ValueError, createForcing(self.resultsdir, self.log).setShard, 3, 3)
+        self.assertRaises(ValueError, createForcing(self.resultsdir, self.log).setShard, 0, 11)
+
+#-Tests of the split of the period in shards of consecutive days
+@unittest.skipIf(gdal is None, 'the GDAL Python bindings are not available')
+class ShardRangesTest(unittest.TestCase):
+    def testRanges(self):
+        self.assertEqual(shardRanges(10, 3), [(0, 3), (3, 3), (6, 4)])
+        self.assertEqual(shardRanges(10, 1), [(0, 10)])
+        self.assertEqual(shardRanges(3, 3), [(0, 1), (1, 1), (2, 1)])
+
+    def testCoverage(self):
+        #-The shards cover the period without gaps or overlap, and differ at most one day in length
+        for timesteps in (1, 7, 31, 365, 3653):
+            for count in range(1, min(timesteps, 40) + 1):
+                ranges = shardRanges(timesteps, count)
+                self.assertEqual(len(ranges), count)
+                offset = 0
+                for start, days in ranges:
+                    self.assertEqual(start, offset)
+                    self.assertTrue(days >= 1)
+                    offset += days
+                self.assertEqual(offset, timesteps)
+                self.assertTrue(max(r[1] for r in ranges) - min(r[1] for r in ranges) <= 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,175 @@
+# The SPHY model Pre-Processor interface plugin for QGIS:
+# A QGIS plugin that allows the user to create SPHY model input data based on a database. 
+#
+# Copyright (C) 2015  Wilco Terink
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Email: terinkw@gmail.com
+
+#-Authorship information-###################################################################
+__author__ = "Wilco Terink"
+__copyright__ = "Wilco Terink"
+__license__ = "GPL"
+__version__ = "1.0.0"
+__email__ = "terinkw@gmail.com"
+__date__ ='1 January 2017'
+############################################################################################
+
+import unittest
+import numpy as np
+
+import interpolation
+from interpolation import InverseDistanceInterpolator, NearestStationsInterpolator, DelaunayInterpolator, Delaunay
+
+#-Model grid of 4 x 5 cells of 10 m (the attributes of the warp engine that are used by the interpolation)
+class Grid():
+    xMin = 0.
+    yMax = 40.
+    rows = 4
+    cols = 5
+    res = 10.
+
+#-Stations (ID, X, Y): the first and last station are on the centre of cell (0, 1) and cell (2, 2)
+STATIONS = [(1, 15., 35.), (2, 42., 7.), (3, 3., 12.), (4, 25., 15.)]
+
+#-Tests of the inverse distance weighting of station values to the model grid
+class InverseDistanceTest(unittest.TestCase):
+    def setUp(self):
+        self.values = np.array([1., 2., 3., 4.])
+
+    #-Inverse distance weighting of the available stations to the centre of each cell, without exact hits
+    def expected(self, values, power=2.):
+        x = Grid.xMin + (np.arange(Grid.cols) + 0.5) * Grid.res
+        y = Grid.yMax - (np.arange(Grid.rows) + 0.5) * Grid.res
+        x, y = np.meshgrid(x, y)
+        grid = np.zeros((Grid.rows, Grid.cols))
+        wsum = np.zeros((Grid.rows, Grid.cols))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            for (i, sx, sy), v in zip(STATIONS, values):
+                if np.isfinite(v):
+                    w = ((x - sx)**2 + (y - sy)**2) ** (-power / 2.)
+                    grid += w * v
+                    wsum += w
+            return grid / wsum
+
+    def assertInterpolated(self, grid, values):
+        expected = self.expected(values)
+        mask = np.ones(grid.shape, dtype=bool)
+        if np.isfinite(values[0]):
+            mask[0, 1] = False
+        if np.isfinite(values[3]):
+            mask[2, 2] = False
+        np.testing.assert_allclose(grid[mask], expected[mask], rtol=1e-5)
+
+    def testExactHits(self):
+        #-Cells on top of a station get the value of that station
+        grid = InverseDistanceInterpolator(STATIONS, Grid).interpolate(self.values)
+        self.assertEqual(grid[0, 1], 1.)
+        self.assertEqual(grid[2, 2], 4.)
+        self.assertInterpolated(grid, self.values)
+
+    def testMissingStationOnCell(self):
+        #-A cell on top of a missing station gets the inverse distance weighting of the other stations
+        values = np.array([np.nan, 2., 3., 4.])
+        grid = InverseDistanceInterpolator(STATIONS, Grid).interpolate(values)
+        self.assertAlmostEqual(grid[0, 1], self.expected(values)[0, 1], places=5)
+        self.assertEqual(grid[2, 2], 4.)
+        self.assertInterpolated(grid, values)
+
+    def testNoStations(self):
+        grid = InverseDistanceInterpolator(STATIONS, Grid).interpolate(np.array([np.nan] * 4))
+        self.assertTrue(np.isnan(grid).all())
+
+    def testBlock(self):
+        #-A block of days with different missing stations is the same as each day interpolated on its own
+        values = np.array([[1., 2., 3., 4.], [np.nan, 2., 3., 4.], [5., 6., np.nan, 8.], [1., 2., 3., 4.]])
+        f = InverseDistanceInterpolator(STATIONS, Grid)
+        block = f.interpolateBlock(values)
+        for day, v in zip(block, values):
+            np.testing.assert_array_equal(day, InverseDistanceInterpolator(STATIONS, Grid).interpolate(v))
+        #-Days with the same missing stations are interpolated together, so the weights are calculated once per pattern
+        self.assertEqual((f.hits, f.misses), (0, 3))
+
+    def testNearestStationsExactHits(self):
+        grid = NearestStationsInterpolator(STATIONS, Grid, neighbours=2).interpolate(self.values)
+        self.assertEqual(grid[0, 1], 1.)
+        self.assertEqual(grid[2, 2], 4.)
+        #-With all stations as neighbours the interpolation is the same as with all stations
+        grid = NearestStationsInterpolator(STATIONS, Grid, neighbours=4).interpolate(self.values)
+        self.assertInterpolated(grid, self.values)
+
+    def testSearchRadius(self):
+        #-Without a maximum number of neighbours only the stations within the search radius are stored per cell
+        f = NearestStationsInterpolator(STATIONS, Grid, radius=15.)
+        index, w = f.weights(np.ones(4, dtype=bool))
+        self.assertEqual(index.shape, (20, 2))
+        grid = f.interpolate(self.values)
+        #-The search without a KD-tree (scipy) gives the same result
+        tree = interpolation.cKDTree
+        interpolation.cKDTree = None
+        try:
+            np.testing.assert_array_equal(NearestStationsInterpolator(STATIONS, Grid, radius=15.).interpolate(self.values),\
+                grid)
+        finally:
+            interpolation.cKDTree = tree
+        x = Grid.xMin + (np.arange(Grid.cols) + 0.5) * Grid.res
+        y = Grid.yMax - (np.arange(Grid.rows) + 0.5) * Grid.res
+        x, y = np.meshgrid(x, y)
+        expected = np.zeros((Grid.rows, Grid.cols))
+        wsum = np.zeros((Grid.rows, Grid.cols))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            for (i, sx, sy), v in zip(STATIONS, self.values):
+                d2 = (x - sx)**2 + (y - sy)**2
+                ws = np.where(d2 <= 15.**2, 1. / d2, 0.)
+                expected += ws * v
+                wsum += ws
+            expected /= wsum
+        expected[0, 1] = 1.
+        expected[2, 2] = 4.
+        np.testing.assert_allclose(grid, expected, rtol=1e-5)
+        #-Cells without stations within the search radius get no data
+        self.assertTrue(np.isnan(grid[0, 4]))
+
+#-Tests of the linear interpolation on a Delaunay triangulation of the stations
+@unittest.skipIf(interpolation.Delaunay is None, 'scipy is not available')
+class DelaunayTest(unittest.TestCase):
+    def testLinear(self):
+        #-A linear field is interpolated exactly inside the convex hull of the stations, outside it cells get the value of
+        # the nearest station
+        values = np.array([1. + 0.2 * x - 0.1 * y for i, x, y in STATIONS])
+        grid = DelaunayInterpolator(STATIONS, Grid).interpolate(values)
+        x = Grid.xMin + (np.arange(Grid.cols) + 0.5) * Grid.res
+        y = Grid.yMax - (np.arange(Grid.rows) + 0.5) * Grid.res
+        x, y = np.meshgrid(x, y)
+        inside = Delaunay(np.array([s[1:] for s in STATIONS])).find_simplex(np.column_stack((x.ravel(), y.ravel())))\
+            .reshape(x.shape) >= 0
+        self.assertTrue(inside.any() and not inside.all())
+        np.testing.assert_allclose(grid[inside], (1. + 0.2 * x - 0.1 * y)[inside], rtol=1e-5)
+        d2 = np.array([(x - sx)**2 + (y - sy)**2 for i, sx, sy in STATIONS])
+        np.testing.assert_allclose(grid[~inside], values[d2.argmin(axis=0)][~inside], rtol=1e-6)
+
+    def testMissingStation(self):
+        #-With a missing station the triangulation of the other stations is used; with less than 3 stations all cells get
+        # the value of the nearest station
+        values = np.array([1., 2., np.nan, 4.])
+        grid = DelaunayInterpolator(STATIONS, Grid).interpolate(values)
+        self.assertEqual(grid[0, 1], 1.)
+        self.assertEqual(grid[2, 2], 4.)
+        self.assertTrue(np.isfinite(grid).all())
+        grid = DelaunayInterpolator(STATIONS, Grid).interpolate(np.array([1., np.nan, np.nan, 4.]))
+        self.assertEqual(set(grid.ravel()), set([1., 4.]))
+
+if __name__ == '__main__':
+    unittest.main()
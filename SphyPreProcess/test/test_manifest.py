@@ -0,0 +1,92 @@
+# The SPHY model Pre-Processor interface plugin for QGIS:
+# A QGIS plugin that allows the user to create SPHY model input data based on a database. 
+#
+# Copyright (C) 2015  Wilco Terink
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Email: terinkw@gmail.com
+
+#-Authorship information-###################################################################
+__author__ = "Wilco Terink"
+__copyright__ = "Wilco Terink"
+__license__ = "GPL"
+__version__ = "1.0.0"
+__email__ = "terinkw@gmail.com"
+__date__ ='1 January 2017'
+############################################################################################
+
+import os, shutil, tempfile, unittest
+
+from manifest import ForcingManifest, fileFingerprint
+
+#-Tests of the manifest with the completed forcing maps
+class ManifestTest(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tempdir, 'manifest.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    #-Write a map file of size bytes
+    def writeMap(self, name, size=100):
+        mapfile = os.path.join(self.tempdir, name)
+        with open(mapfile, 'wb') as f:
+            f.write(b'\0' * size)
+        return mapfile
+
+    def testIsComplete(self):
+        mapfile = self.writeMap('prec0000.001')
+        manifest = ForcingManifest(self.filename)
+        manifest.reset('settings', '2000-01-01')
+        manifest.add(mapfile, '2000-01-01', 'input')
+        manifest.save()
+        manifest = ForcingManifest(self.filename)
+        self.assertTrue(manifest.load())
+        self.assertTrue(manifest.isComplete(mapfile, '2000-01-01', 'input'))
+        #-A map is created again if the fingerprint of its input changes or it is unknown, or if the map is changed or removed
+        self.assertFalse(manifest.isComplete(mapfile, '2000-01-01', 'changed input'))
+        self.assertFalse(manifest.isComplete(mapfile, '2000-01-01', None))
+        self.assertFalse(manifest.isComplete(mapfile, '2000-01-02', 'input'))
+        self.writeMap('prec0000.001', 50)
+        self.assertFalse(manifest.isComplete(mapfile, '2000-01-01', 'input'))
+        os.remove(mapfile)
+        self.assertFalse(manifest.isComplete(mapfile, '2000-01-01', 'input'))
+        self.assertFalse(manifest.isComplete(os.path.join(self.tempdir, 'prec0000.002'), '2000-01-02', 'input'))
+
+    def testMerge(self):
+        manifest = ForcingManifest(self.filename)
+        manifest.reset('settings', '2000-01-01')
+        manifest.add(self.writeMap('prec0000.001'), '2000-01-01', 'input')
+        #-Part manifests only have the maps that are added by the part; the part of another run is not merged
+        for name, settings, date in [('part1.json', 'settings', '2000-01-02'), ('part2.json', 'other', '2000-01-03')]:
+            part = ForcingManifest(self.filename)
+            part.reset(settings, '2000-01-01')
+            part.add(self.writeMap('prec0000.00' + date[-1]), date, 'input')
+            part.save(os.path.join(self.tempdir, name), part=True)
+            manifest.merge(os.path.join(self.tempdir, name))
+            self.assertFalse(os.path.isfile(os.path.join(self.tempdir, name)))
+        self.assertEqual(sorted(manifest.maps), ['prec0000.001', 'prec0000.002'])
+
+    def testFileFingerprint(self):
+        mapfile = self.writeMap('dem.map')
+        fingerprint = fileFingerprint(mapfile)
+        self.assertEqual(fileFingerprint(mapfile), fingerprint)
+        self.writeMap('dem.map', 200)
+        self.assertNotEqual(fileFingerprint(mapfile), fingerprint)
+        self.assertEqual(fileFingerprint(os.path.join(self.tempdir, 'missing.map')), None)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+# The SPHY model Pre-Processor interface plugin for QGIS:
+# A QGIS plugin that allows the user to create SPHY model input data based on a database. 
+#
+# Copyright (C) 2015  Wilco Terink
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Email: terinkw@gmail.com
+
+#-Authorship information-###################################################################
+__author__ = "Wilco Terink"
+__copyright__ = "Wilco Terink"
+__license__ = "GPL"
+__version__ = "1.0.0"
+__email__ = "terinkw@gmail.com"
+__date__ ='1 January 2017'
+############################################################################################
+
+import unittest
+
+import memory
+from memory import MemoryBudget, MB
+
+#-Tests of the memory budget that determines the block sizes, worker processes and cache sizes
+class MemoryBudgetTest(unittest.TestCase):
+    def setUp(self):
+        #-Resident set size of the process, as set by the tests
+        self.rss = 500 * MB
+        self.currentRSS = memory.currentRSS
+        memory.currentRSS = lambda: self.rss
+
+    def tearDown(self):
+        memory.currentRSS = self.currentRSS
+
+    def testRemaining(self):
+        budget = MemoryBudget(100)
+        self.assertEqual(budget.bytes, 100 * MB)
+        #-The memory that was already in use when the budget was created is not charged to the budget
+        self.assertEqual(budget.remaining(), 100 * MB)
+        self.rss += 30 * MB
+        self.assertEqual(budget.remaining(), 70 * MB)
+        self.rss += 200 * MB
+        self.assertEqual(budget.remaining(), 0)
+        self.rss -= 300 * MB
+        self.assertEqual(budget.remaining(), 100 * MB)
+
+    def testDefaultBudget(self):
+        #-Without a budget half of the free memory is used
+        available = memory.availableMemory
+        memory.availableMemory = lambda: 800 * MB
+        try:
+            self.assertEqual(MemoryBudget(0).bytes, 400 * MB)
+            self.assertEqual(MemoryBudget(-1).bytes, 400 * MB)
+        finally:
+            memory.availableMemory = available
+
+    def testItems(self):
+        budget = MemoryBudget(100)
+        self.assertEqual(budget.items(10 * MB, 365), 10)
+        self.assertEqual(budget.items(MB / 10, 365), 365)
+        #-At least one item, even if it does not fit
+        self.assertEqual(budget.items(200 * MB, 365), 1)
+        self.rss += 95 * MB
+        self.assertEqual(budget.items(2 * MB, 365), 2)
+
+    def testWorkersAndCache(self):
+        budget = MemoryBudget(100)
+        self.assertEqual(budget.workers(8, 30 * MB), 3)
+        self.assertEqual(budget.workers(2, 30 * MB), 2)
+        self.assertEqual(budget.workers(8, 300 * MB), 1)
+        #-A cache may use a quarter of the budget by default
+        self.assertEqual(budget.cacheEntries(32, MB), 25)
+        self.assertEqual(budget.cacheEntries(32, MB, fraction=0.5), 32)
+        self.assertEqual(budget.cacheEntries(32, 50 * MB), 1)
+
+    def testReport(self):
+        self.assertTrue(MemoryBudget(100).report(20 * MB).startswith('Memory: budget 100 MB, estimated peak 20 MB'))
+
+if __name__ == '__main__':
+    unittest.main()
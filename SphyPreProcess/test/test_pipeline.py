@@ -0,0 +1,144 @@
+# The SPHY model Pre-Processor interface plugin for QGIS:
+# A QGIS plugin that allows the user to create SPHY model input data based on a database. 
+#
+# Copyright (C) 2015  Wilco Terink
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Email: terinkw@gmail.com
+
+#-Authorship information-###################################################################
+__author__ = "Wilco Terink"
+__copyright__ = "Wilco Terink"
+__license__ = "GPL"
+__version__ = "1.0.0"
+__email__ = "terinkw@gmail.com"
+__date__ ='1 January 2017'
+############################################################################################
+
+import os, sys, shutil, tempfile, unittest
+
+#-The pipeline needs the GDAL Python bindings (osgeo), which QGIS has
+try:
+    from osgeo import gdal
+except ImportError:
+    gdal = None
+if gdal is not None:
+    from pipeline import PreProcessPipeline, STAGES, main, shardArgument
+
+#-Project config file with the settings that are read when the pipeline is created
+CONFIG = '''[GENERAL]
+Database_dir = %(dir)s
+Results_dir = %(dir)s
+Pcraster_dir = %(dir)s
+utmZoneNr = 45
+utmZoneStr = N
+startyear = 2000
+startmonth = 1
+startday = 1
+endyear = 2000
+endmonth = 1
+endday = 10
+
+[AREA]
+resolution = 10
+xmin = 0
+xmax = 100
+ymin = 0
+ymax = 50
+
+[MODULES]
+glacier = 0
+routing = 0
+'''
+
+#-Methods of the pipeline that run the stages, replaced by the tests
+METHODS = {'clone': 'createClone', 'initmaps': 'createInitMaps', 'delineate': 'delineate', 'stations': 'createStations'}
+
+#-Tests of the command line interface of the pipeline: the selection and order of the stages, and the arguments
+@unittest.skipIf(gdal is None, 'the GDAL Python bindings are not available')
+class PipelineTest(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.config = os.path.join(self.tempdir, 'project.cfg')
+        with open(self.config, 'w') as f:
+            f.write(CONFIG % {'dir': self.tempdir})
+        #-Stages that are run, with their result
+        self.calls = []
+        self.results = dict((s, True) for s in STAGES + ['verify'])
+        self.methods = {}
+        for stage in list(METHODS.values()) + ['createForcing', 'verifyForcing']:
+            self.methods[stage] = PreProcessPipeline.__dict__[stage]
+        for stage, method in METHODS.items():
+            setattr(PreProcessPipeline, method, lambda p, stage=stage: self.call(stage))
+        PreProcessPipeline.createForcing = lambda p, workers=None, shard=None: self.call('forcing', workers, shard)
+        PreProcessPipeline.verifyForcing = lambda p, shards: self.call('verify', shards)
+        #-The log and the usage messages are not shown
+        self.devnull = open(os.devnull, 'w')
+        self.stdout, self.stderr = sys.stdout, sys.stderr
+        sys.stdout = sys.stderr = self.devnull
+
+    def tearDown(self):
+        sys.stdout, sys.stderr = self.stdout, self.stderr
+        self.devnull.close()
+        for method, function in self.methods.items():
+            setattr(PreProcessPipeline, method, function)
+        shutil.rmtree(self.tempdir)
+
+    def call(self, stage, *args):
+        self.calls.append((stage,) + args if args else stage)
+        return self.results[stage]
+
+    #-Return the exit code of main, also if the arguments are rejected
+    def main(self, *args):
+        try:
+            return main(list(args))
+        except SystemExit as e:
+            return e.code
+
+    def testStages(self):
+        #-The stages are run in the order of STAGES, all of them by default
+        self.assertEqual(self.main('run', self.config, '--stages', 'forcing, clone'), 0)
+        self.assertEqual(self.calls, ['clone', ('forcing', None, None)])
+        self.calls = []
+        self.assertEqual(self.main('run', self.config, '--workers', '3'), 0)
+        self.assertEqual(self.calls, ['clone', 'initmaps', 'delineate', 'stations', ('forcing', 3, None)])
+
+    def testFailedStage(self):
+        #-The remaining stages are not run after a stage that fails
+        self.results['initmaps'] = False
+        self.assertEqual(self.main('run', self.config, '--stages', 'clone,initmaps,forcing'), 1)
+        self.assertEqual(self.calls, ['clone', 'initmaps'])
+
+    def testArguments(self):
+        self.assertEqual(self.main('run', self.config, '--stages', 'clone,maps'), 2)
+        self.assertEqual(self.main('run', self.config, '--stages', 'clone,forcing', '--shard', '0/2'), 2)
+        self.assertEqual(self.main('run', self.config, '--shard', '2/2'), 2)
+        self.assertEqual(self.main('verify', self.config), 2)
+        self.assertEqual(self.main('verify', self.config, '--shards', '0'), 2)
+        self.assertEqual(self.calls, [])
+        #-A project config file that can not be read
+        self.assertEqual(self.main('run', os.path.join(self.tempdir, 'missing.cfg')), 2)
+
+    def testShards(self):
+        #-A shard only runs the forcing stage
+        self.assertEqual(self.main('run', self.config, '--shard', '1/4'), 0)
+        self.assertEqual(self.calls, [('forcing', None, (1, 4))])
+        self.results['verify'] = False
+        self.assertEqual(self.main('verify', self.config, '--shards', '4'), 1)
+        self.assertEqual(self.calls[-1], ('verify', 4))
+        self.assertEqual(shardArgument('7/8'), (7, 8))
+
+if __name__ == '__main__':
+    unittest.main()
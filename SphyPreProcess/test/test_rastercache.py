@@ -0,0 +1,88 @@
+# The SPHY model Pre-Processor interface plugin for QGIS:
+# A QGIS plugin that allows the user to create SPHY model input data based on a database. 
+#
+# Copyright (C) 2015  Wilco Terink
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Email: terinkw@gmail.com
+
+#-Authorship information-###################################################################
+__author__ = "Wilco Terink"
+__copyright__ = "Wilco Terink"
+__license__ = "GPL"
+__version__ = "1.0.0"
+__email__ = "terinkw@gmail.com"
+__date__ ='1 January 2017'
+############################################################################################
+
+import glob, os, shutil, tempfile, unittest
+import numpy as np
+
+from rastercache import RasterCache
+
+#-Tests of the cache with regridded rasters that is shared by projects
+class RasterCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.cachedir = os.path.join(self.tempdir, 'cache')
+        self.src = os.path.join(self.tempdir, 'prec.tif')
+        with open(self.src, 'wb') as f:
+            f.write(b'\0' * 100)
+        os.utime(self.src, (1000000000, 1000000000))
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def key(self, cache, band=1):
+        return cache.key(self.src, band, 'EPSG:4326', 'EPSG:32645', (0., 0., 1000., 1000.), 10., 'bilinear')
+
+    def testHitAndMiss(self):
+        cache = RasterCache(self.cachedir)
+        key = self.key(cache)
+        self.assertEqual(cache.get(key), None)
+        data = np.arange(12, dtype=np.float32).reshape(3, 4)
+        cache.put(key, data)
+        np.testing.assert_array_equal(cache.get(key), data)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        #-Another band or a changed source file is a miss
+        self.assertNotEqual(self.key(cache, 2), key)
+        os.utime(self.src, (1000000100, 1000000100))
+        self.assertEqual(cache.get(self.key(cache)), None)
+        self.assertEqual((cache.hits, cache.misses), (1, 2))
+        #-A source file that does not exist is not cached
+        os.remove(self.src)
+        self.assertEqual(self.key(cache), None)
+
+    def testEviction(self):
+        #-A cache of 12 kB with arrays of about 4 kB: when the third array is added, the least recently used array is
+        # removed to get under the low-water mark (9.6 kB)
+        cache = RasterCache(self.cachedir, maxsize=12. / 1024)
+        keys = [str(i) * 40 for i in range(3)]
+        for i, key in enumerate(keys[:2]):
+            cache.put(key, np.zeros(1000, dtype=np.float32) + i)
+        cache.get(keys[0])
+        cache.put(keys[2], np.zeros(1000, dtype=np.float32) + 2)
+        self.assertTrue(cache.size <= cache.lowWater)
+        self.assertEqual(cache.get(keys[1]), None)
+        self.assertEqual(cache.get(keys[0])[0], 0.)
+        self.assertEqual(cache.get(keys[2])[0], 2.)
+        self.assertEqual(len(glob.glob(os.path.join(self.cachedir, '*', '*.npy'))), 2)
+        #-Another process reads the index of the cache from disk
+        other = RasterCache(self.cachedir, maxsize=12. / 1024)
+        other.readIndex()
+        self.assertEqual(other.size, cache.size)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+# The SPHY model Pre-Processor interface plugin for QGIS:
+# A QGIS plugin that allows the user to create SPHY model input data based on a database. 
+#
+# Copyright (C) 2015  Wilco Terink
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Email: terinkw@gmail.com
+
+#-Authorship information-###################################################################
+__author__ = "Wilco Terink"
+__copyright__ = "Wilco Terink"
+__license__ = "GPL"
+__version__ = "1.0.0"
+__email__ = "terinkw@gmail.com"
+__date__ ='1 January 2017'
+############################################################################################
+
+import unittest
+import numpy as np
+
+#-The forcing modules need the GDAL Python bindings (osgeo), which QGIS has
+try:
+    from osgeo import gdal
+except ImportError:
+    gdal = None
+if gdal is not None:
+    from regrid import RegridWeights, bilinearWeights
+
+#-Model grid of 8 x 10 cells of 5 m (the attributes of the warp engine that are used by the regridding)
+class Grid():
+    t_srs = 'EPSG:32631'
+    xMin = 0.
+    yMax = 40.
+    rows = 8
+    cols = 10
+    res = 5.
+
+#-Tests of the regridding weights of the database forcing to the model grid
+@unittest.skipIf(gdal is None, 'the GDAL Python bindings are not available')
+class RegridTest(unittest.TestCase):
+    def testMissingValues(self):
+        #-Missing source cells are left out and the weights of the other cells are normalized
+        weights = RegridWeights(np.array([[0, 1, 2, 3], [0, 1, 2, 3], [1, 1, 1, 1]], dtype=np.int32),\
+            np.array([[.4, .3, .2, .1], [.25, .25, .25, .25], [1., 0., 0., 0.]], dtype=np.float32))
+        data = np.array([[1., np.nan], [3., 4.]], dtype=np.float32)
+        out = weights.apply(data, (1, 3))
+        self.assertEqual(out.dtype, np.float32)
+        np.testing.assert_allclose(out[0, :2], [(.4 * 1. + .2 * 3. + .1 * 4.) / .7, 8. / 3.], rtol=1e-6)
+        #-A cell without valid source cells gets no data
+        self.assertTrue(np.isnan(out[0, 2]))
+        #-A block of days is the same as each day on its own
+        block = np.array([data, data * 2., np.full((2, 2), np.nan, dtype=np.float32)])
+        out = weights.apply(block, (1, 3))
+        self.assertEqual(out.shape, (3, 1, 3))
+        for day, d in zip(out, block):
+            np.testing.assert_array_equal(day, weights.apply(d, (1, 3)))
+
+    def testBilinear(self):
+        #-Source grid of 4 x 4 cells of 10 m that covers the model grid except its two right columns
+        geotransform = (0., 10., 0., 40., 0., -10.)
+        weights = bilinearWeights(geotransform, 4, 4, Grid.t_srs, Grid)
+        self.assertEqual(weights.index.shape, (Grid.rows * Grid.cols, 4))
+        #-Bilinear interpolation of a linear field is exact between the centres of the source cells
+        x, y = np.meshgrid(np.arange(4) * 10. + 5., 40. - np.arange(4) * 10. - 5.)
+        out = weights.apply((x + 2. * y).astype(np.float32), (Grid.rows, Grid.cols))
+        x, y = np.meshgrid(np.arange(Grid.cols) * 5. + 2.5, 40. - np.arange(Grid.rows) * 5. - 2.5)
+        np.testing.assert_allclose(out[1:7, 1:7], (x + 2. * y)[1:7, 1:7], rtol=1e-6)
+        self.assertTrue(np.isfinite(out[:, :8]).all())
+        #-Cells outside the source grid get no data
+        self.assertTrue(np.isnan(out[:, 8:]).all())
+        np.testing.assert_allclose(weights.weights.reshape((Grid.rows, Grid.cols, 4))[1:7, 1:7].sum(axis=-1), 1., rtol=1e-6)
+
+if __name__ == '__main__':
+    unittest.main()
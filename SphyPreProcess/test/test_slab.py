@@ -0,0 +1,100 @@
+# The SPHY model Pre-Processor interface plugin for QGIS:
+# A QGIS plugin that allows the user to create SPHY model input data based on a database. 
+#
+# Copyright (C) 2015  Wilco Terink
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Email: terinkw@gmail.com
+
+#-Authorship information-###################################################################
+__author__ = "Wilco Terink"
+__copyright__ = "Wilco Terink"
+__license__ = "GPL"
+__version__ = "1.0.0"
+__email__ = "terinkw@gmail.com"
+__date__ ='1 January 2017'
+############################################################################################
+
+import os, shutil, tempfile, unittest
+import numpy as np
+
+#-The reader of monthly files needs the GDAL Python bindings (osgeo), which QGIS has
+try:
+    from osgeo import gdal
+except ImportError:
+    gdal = None
+if gdal is not None:
+    from warp import WarpEngine
+    from slab import MonthSlabReader
+
+#-Tests of the reader of monthly files with one band per day
+@unittest.skipIf(gdal is None, 'the GDAL Python bindings are not available')
+class MonthSlabReaderTest(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.srs = 'EPSG:32631'
+        #-Model grid of 6 x 6 cells of 5 m in the middle of a source grid of 5 x 6 cells of 10 m with 3 days
+        self.engine = WarpEngine(self.srs, 5., (10., 10., 40., 40.), os.path.join(self.tempdir, 'clone.map'),\
+            os.path.join(self.tempdir, 'cache'))
+        self.geotransform = (0., 10., 0., 50., 0., -10.)
+        self.days = np.random.RandomState(4).rand(3, 5, 6).astype(np.float32) * 10.
+        self.days[1, 2, 3] = -9999.
+        self.filename = os.path.join(self.tempdir, 'month.tif')
+        ds = gdal.GetDriverByName('GTiff').Create(self.filename, 6, 5, 3, gdal.GDT_Float32)
+        ds.SetGeoTransform(self.geotransform)
+        for i in range(3):
+            band = ds.GetRasterBand(i + 1)
+            band.SetNoDataValue(-9999.)
+            band.WriteArray(self.days[i])
+        ds = None
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    #-Day of the source regridded to the model grid from the complete source grid
+    def expected(self, day):
+        data = np.where(self.days[day - 1] == -9999., np.nan, self.days[day - 1])
+        return self.engine.regridArray(data, self.geotransform, 6, 5, self.srs)
+
+    def testReadDays(self):
+        reader = MonthSlabReader(self.engine, self.srs)
+        data, found = reader.readDays(self.filename, [1, 2, 4])
+        self.assertEqual(data.shape, (3, 6, 6))
+        self.assertEqual(list(found), [True, True, False])
+        #-Only the window of the model area is read, and the days are the same as regridded from the complete grid
+        self.assertEqual(reader.slab.shape, (3, reader.window[3], reader.window[2]))
+        self.assertTrue(reader.window[2] * reader.window[3] < 30)
+        np.testing.assert_array_equal(data[0], self.expected(1))
+        np.testing.assert_array_equal(data[1], self.expected(2))
+        #-A day after the last band of the file is not found
+        self.assertTrue(np.isnan(data[2]).all())
+
+    def testFileReadOnce(self):
+        reader = MonthSlabReader(self.engine, self.srs)
+        reader.readDays(self.filename, [1])
+        slab = reader.slab
+        day = reader.read(self.filename, 3)
+        self.assertTrue(reader.slab is slab)
+        np.testing.assert_array_equal(day, self.expected(3))
+
+    def testMissingFile(self):
+        reader = MonthSlabReader(self.engine, self.srs)
+        data, found = reader.readDays(os.path.join(self.tempdir, 'missing.tif'), [1, 2])
+        self.assertFalse(found.any())
+        self.assertTrue(np.isnan(data).all())
+        self.assertTrue(reader.read(os.path.join(self.tempdir, 'missing.tif'), 1) is None)
+
+if __name__ == '__main__':
+    unittest.main()
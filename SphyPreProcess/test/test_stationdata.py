@@ -0,0 +1,80 @@
+# The SPHY model Pre-Processor interface plugin for QGIS:
+# A QGIS plugin that allows the user to create SPHY model input data based on a database. 
+#
+# Copyright (C) 2015  Wilco Terink
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Email: terinkw@gmail.com
+
+#-Authorship information-###################################################################
+__author__ = "Wilco Terink"
+__copyright__ = "Wilco Terink"
+__license__ = "GPL"
+__version__ = "1.0.0"
+__email__ = "terinkw@gmail.com"
+__date__ ='1 January 2017'
+############################################################################################
+
+import datetime, glob, os, shutil, tempfile, unittest
+import numpy as np
+
+from stationdata import StationData
+
+#-Tests of the columnar cache of the station data CSV files
+class StationDataTest(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.csvfile = os.path.join(self.tempdir, 'prec.csv')
+        self.cachedir = os.path.join(self.tempdir, 'cache')
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    #-Write a CSV file with a row (date, value station 1, value station 2) per day, starting at 1 January 2000
+    def writeCSV(self, rows, mtime):
+        with open(self.csvfile, 'w') as f:
+            f.write('Date,1,2\n')
+            for i, values in enumerate(rows):
+                date = datetime.date(2000, 1, 1) + datetime.timedelta(days=i)
+                f.write(date.strftime('%d-%m-%Y') + ',' + ','.join(str(v) for v in values) + '\n')
+        os.utime(self.csvfile, (mtime, mtime))
+
+    def testValues(self):
+        self.writeCSV([(1., 2.), (3., -9999.), (5., 6.)], 1000000000)
+        data = StationData(self.csvfile, self.cachedir)
+        self.assertEqual(len(data), 3)
+        self.assertEqual(data.row(datetime.date(2000, 1, 2)), 1)
+        self.assertEqual(data.row(datetime.date(2000, 1, 4)), None)
+        values, found = data.blockValues([datetime.date(2000, 1, 2), datetime.date(2000, 1, 4)], 0, 2)
+        self.assertEqual(list(found), [True, False])
+        self.assertEqual(values[0, 0], 3.)
+        self.assertTrue(np.isnan(values[0, 1]) and np.isnan(values[1]).all())
+
+    def testChangedCSV(self):
+        self.writeCSV([(1., 2.), (3., 4.)], 1000000000)
+        data = StationData(self.csvfile, self.cachedir)
+        self.assertEqual(len(glob.glob(os.path.join(self.cachedir, '*.npy'))), 2)
+        fingerprint = data.fingerprint(datetime.date(2000, 1, 2), 0, 2)
+        del data
+        #-The cache is created again if the CSV file changes, and the cache of the old CSV file is removed
+        self.writeCSV([(1., 2.), (3., 7.), (5., 6.)], 1000000100)
+        data = StationData(self.csvfile, self.cachedir)
+        self.assertEqual(len(data), 3)
+        self.assertEqual(list(data.rowValues(1, 0, 2)), [3., 7.])
+        self.assertNotEqual(data.fingerprint(datetime.date(2000, 1, 2), 0, 2), fingerprint)
+        self.assertEqual(len(glob.glob(os.path.join(self.cachedir, '*.npy'))), 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+# The SPHY model Pre-Processor interface plugin for QGIS:
+# A QGIS plugin that allows the user to create SPHY model input data based on a database. 
+#
+# Copyright (C) 2015  Wilco Terink
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Email: terinkw@gmail.com
+
+#-Authorship information-###################################################################
+__author__ = "Wilco Terink"
+__copyright__ = "Wilco Terink"
+__license__ = "GPL"
+__version__ = "1.0.0"
+__email__ = "terinkw@gmail.com"
+__date__ ='1 January 2017'
+############################################################################################
+
+import os, shutil, tempfile, unittest
+import numpy as np
+
+import csf
+#-The forcing modules need the GDAL Python bindings (osgeo), which QGIS has
+try:
+    from osgeo import gdal
+except ImportError:
+    gdal = None
+if gdal is not None:
+    import tiling
+
+#-Tests of the slope and the tiles of large models
+@unittest.skipIf(gdal is None, 'the GDAL Python bindings are not available')
+class TilingTest(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.dem = np.random.RandomState(3).rand(23, 17).astype(np.float32) * 100.
+        self.dem[5, 7] = np.nan
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def testPlaneSlope(self):
+        #-z = 3x + 4y has a slope of 5 everywhere except at the edges
+        rows, cols = np.mgrid[0:6, 0:8]
+        dem = 3. * cols * 2. - 4. * rows * 2.
+        slope = tiling.hornSlope(dem, 2.)
+        self.assertEqual(slope.dtype, np.float32)
+        np.testing.assert_allclose(slope[1:-1, 1:-1], 5., rtol=1e-6)
+        #-The missing row above the top row gets the value of the cell: 1 of the 4 weights of dz/dx is lost, and the
+        # difference with the row below is over one cell instead of two
+        np.testing.assert_allclose(slope[0, 1:-1], np.hypot(3. * 3. / 4., 4. / 2.), rtol=1e-6)
+
+    def testMissingValues(self):
+        #-A cell with a missing value gets a missing value, and its neighbours use their own value instead
+        slope = tiling.hornSlope(self.dem, 10.)
+        self.assertTrue(np.isnan(slope[5, 7]))
+        self.assertEqual(np.isnan(slope).sum(), 1)
+
+    def testTiles(self):
+        #-The tiles cover the grid without overlap, and the slope of the tiles with a halo of one cell is the slope of the
+        # complete dem
+        grid = tiling.TileGrid((0., 0., 170., 230.), 10., 5, halo=1)
+        self.assertEqual((grid.rows, grid.cols), (23, 17))
+        full = tiling.hornSlope(self.dem, 10.)
+        count = np.zeros(self.dem.shape, dtype=int)
+        for tile in grid.tiles():
+            row, col, rows, cols = tile.window(True)
+            slope = tile.core(tiling.hornSlope(self.dem[row:row + rows, col:col + cols], 10.))
+            np.testing.assert_array_equal(slope, full[tile.row:tile.row + tile.rows, tile.col:tile.col + tile.cols])
+            count[tile.row:tile.row + tile.rows, tile.col:tile.col + tile.cols] += 1
+            xmin, ymin, xmax, ymax = grid.extent(tile)
+            self.assertEqual((xmin, ymax), (tile.col * 10., 230. - tile.row * 10.))
+            self.assertEqual((xmax - xmin, ymax - ymin), (tile.cols * 10., tile.rows * 10.))
+        self.assertTrue((count == 1).all())
+
+    def testSlopeMap(self):
+        demfile = os.path.join(self.tempdir, 'dem.map')
+        slopefile = os.path.join(self.tempdir, 'slope.map')
+        csf.writeMap(demfile, self.dem, (0., 10., 0., 230., 0., -10.))
+        self.assertTrue(tiling.slopeMap(demfile, slopefile, 5))
+        np.testing.assert_array_equal(csf.readMap(slopefile)[0], tiling.hornSlope(self.dem, 10.))
+
+if __name__ == '__main__':
+    unittest.main()
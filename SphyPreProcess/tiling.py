@@ -0,0 +1,396 @@
+# The SPHY model Pre-Processor interface plugin for QGIS:
+# A QGIS plugin that allows the user to create SPHY model input data based on a database. 
+#
+# Copyright (C) 2015  Wilco Terink
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Email: terinkw@gmail.com
+
+#-Authorship information-###################################################################
+__author__ = "Wilco Terink"
+__copyright__ = "Wilco Terink"
+__license__ = "GPL"
+__version__ = "1.0.0"
+__email__ = "terinkw@gmail.com"
+__date__ ='1 January 2017'
+############################################################################################
+
+import os, glob, shutil, datetime, collections, multiprocessing
+import numpy as np
+
+#-Import the PCRaster map reader/writer
+import csf
+#-Import parallel forcing processing with worker processes
+from parallel import ParallelForcing, WORKERMEMORY, WORKERDAYS, setWorkerExecutable, chunkForcing
+#-Import the NetCDF output of the forcing
+import cube
+#-Import the manifest with the completed forcing maps
+from manifest import ForcingManifest
+
+#-Default number of rows and columns of a tile
+TILESIZE = 1000
+
+#-Return the number of rows and columns of the tiles from the [GENERAL] section of a project config file, or None if the
+# model is not processed in tiles (Tile_size = 0, also for older project config files that don't have this setting)
+def tileSize(config):
+    if config.has_option('GENERAL', 'Tile_size') and config.getint('GENERAL', 'Tile_size') > 0:
+        return config.getint('GENERAL', 'Tile_size')
+    return None
+
+#-Class with a tile of the model grid: the upper left cell (row, col) and the size of the tile, and the window of the tile
+# with a halo of extra cells on each side (clipped to the model grid) for operations that need the neighbouring cells.
+class Tile():
+    def __init__(self, row, col, rows, cols, halo, gridrows, gridcols):
+        self.row = row
+        self.col = col
+        self.rows = rows
+        self.cols = cols
+        self.haloRow = max(0, row - halo)
+        self.haloCol = max(0, col - halo)
+        self.haloRows = min(gridrows, row + rows + halo) - self.haloRow
+        self.haloCols = min(gridcols, col + cols + halo) - self.haloCol
+
+    #-Window (row, col, rows, cols) of the tile in the model grid, with or without the halo
+    def window(self, halo=False):
+        if halo:
+            return (self.haloRow, self.haloCol, self.haloRows, self.haloCols)
+        return (self.row, self.col, self.rows, self.cols)
+
+    #-Return the part of an array of the window with halo that belongs to the tile itself
+    def core(self, data):
+        r = self.row - self.haloRow
+        c = self.col - self.haloCol
+        return data[r:r + self.rows, c:c + self.cols]
+
+#-Class that splits the model grid (extent and resolution) in tiles of tilesize x tilesize cells that are aligned with the
+# cells of the model grid. The tiles at the right and bottom are smaller if the grid is not a multiple of the tile size.
+class TileGrid():
+    def __init__(self, extent, resolution, tilesize=TILESIZE, halo=0):
+        self.xMin = float(extent[0])
+        self.yMin = float(extent[1])
+        self.xMax = float(extent[2])
+        self.yMax = float(extent[3])
+        self.res = float(resolution)
+        self.cols = int(round((self.xMax - self.xMin) / self.res))
+        self.rows = int(round((self.yMax - self.yMin) / self.res))
+        self.geoTransform = (self.xMin, self.res, 0., self.yMax, 0., -self.res)
+        self.tileSize = int(tilesize)
+        self.halo = int(halo)
+
+    #-Return the tiles from the upper left to the lower right corner
+    def tiles(self):
+        tiles = []
+        for row in range(0, self.rows, self.tileSize):
+            for col in range(0, self.cols, self.tileSize):
+                tiles.append(Tile(row, col, min(self.tileSize, self.rows - row), min(self.tileSize, self.cols - col),\
+                    self.halo, self.rows, self.cols))
+        return tiles
+
+    #-Extent (xmin, ymin, xmax, ymax) of a tile, with or without the halo
+    def extent(self, tile, halo=False):
+        row, col, rows, cols = tile.window(halo)
+        return (self.xMin + col * self.res, self.yMax - (row + rows) * self.res, self.xMin + (col + cols) * self.res,\
+            self.yMax - row * self.res)
+
+#-Function that calculates the slope (tangent) of a dem in the same way as the PCRaster slope function: the third-order
+# finite difference (Horn) of the 3 x 3 window of each cell. Missing neighbours and neighbours outside the dem get the
+# value of the cell itself, and cells with a missing value get a missing value (NaN).
+def hornSlope(dem, resolution):
+    z = np.pad(np.asarray(dem, dtype=np.float64), 1, mode='constant', constant_values=np.nan)
+    rows, cols = z.shape[0] - 2, z.shape[1] - 2
+    centre = z[1:-1, 1:-1]
+    def neighbour(dr, dc):
+        n = z[1 + dr:1 + dr + rows, 1 + dc:1 + dc + cols]
+        return np.where(np.isnan(n), centre, n)
+    dzdx = ((neighbour(-1, 1) + 2 * neighbour(0, 1) + neighbour(1, 1)) - (neighbour(-1, -1) + 2 * neighbour(0, -1) +\
+        neighbour(1, -1))) / (8. * resolution)
+    dzdy = ((neighbour(1, -1) + 2 * neighbour(1, 0) + neighbour(1, 1)) - (neighbour(-1, -1) + 2 * neighbour(-1, 0) +\
+        neighbour(-1, 1))) / (8. * resolution)
+    slope = np.sqrt(dzdx**2 + dzdy**2)
+    slope[np.isnan(centre)] = np.nan
+    return slope.astype(np.float32)
+
+#-Tile functions: they return the array of a tile of the model grid with NaN for no data, or None if it could not be
+# created. The functions run in worker processes, so they are module functions and all arguments are picklable.
+
+#-Reproject, resample, and clip a raster (SpatialProcessing instance) to a tile
+def warpTile(grid, tile, m, cache):
+    return m.warp(grid.extent(tile), cache)
+
+#-Fraction of each cell of a tile that is covered by the polygons of a shapefile (SpatialProcessing instance)
+def fractionTile(grid, tile, m, factor, maxbytes):
+    return m.rasterizeFraction(grid.extent(tile), factor, maxbytes)
+
+#-Slope of a tile, calculated from the tile of the dem with a halo of one cell
+def slopeTile(grid, tile, demfile):
+    dem = csf.readMap(demfile, tile.window(True))[0]
+    return tile.core(hornSlope(dem, grid.res))
+
+#-Function that runs a tile function and returns the tile with the result
+def runTile(job):
+    function, args, grid, tile = job
+    return tile, function(grid, tile, *args)
+
+#-Function that runs tile jobs with a pool of workers worker processes and yields the results in the order of the jobs.
+# At most two jobs per worker are submitted at a time, so only a few finished tiles wait in memory until they are written.
+def poolTiles(pool, jobs, workers):
+    pending = collections.deque()
+    for job in jobs:
+        pending.append(pool.apply_async(runTile, (job,)))
+        if len(pending) >= 2 * workers:
+            yield pending.popleft().get()
+    while pending:
+        yield pending.popleft().get()
+
+#-Function that creates a PCRaster map on the tile grid from the results of a tile function for all tiles, which are
+# processed in parallel by workers worker processes. The tiles are written in the map as soon as they are finished.
+# Returns True if the map was created, and False (without a map) if a tile could not be created.
+def mosaic(function, args, grid, outfile, valuescale=csf.VS_SCALAR, workers=1):
+    tiles = grid.tiles()
+    jobs = ((function, args, grid, tile) for tile in tiles)
+    pool = None
+    if workers > 1 and len(tiles) > 1:
+        setWorkerExecutable()
+        workers = min(workers, len(tiles))
+        pool = multiprocessing.Pool(workers)
+        results = poolTiles(pool, jobs, workers)
+    else:
+        results = (runTile(job) for job in jobs)
+    writer = csf.MapWriter(outfile, grid.rows, grid.cols, grid.geoTransform, valuescale)
+    ok = True
+    for tile, data in results:
+        if data is None:
+            ok = False
+            break
+        writer.write(tile.row, tile.col, data)
+    if pool is not None:
+        pool.terminate()
+        pool.join()
+    writer.close()
+    if not ok:
+        os.remove(outfile)
+    return ok
+
+#-Function that reprojects, resamples and clips a raster (SpatialProcessing instance) to the model grid and writes it as
+# PCRaster map; in tiles of tilesize if tilesize is not None. Returns True if the map was created.
+def warpMap(m, extent, valuescale=csf.VS_SCALAR, cache=None, tilesize=None, workers=1):
+    if tilesize is None:
+        return m.warpToMap(extent, valuescale, cache)
+    return mosaic(warpTile, (m, cache), TileGrid(extent, m.t_res, tilesize), m.output, valuescale, workers)
+
+#-Function that writes the fraction of each cell of the model grid that is covered by the polygons of a shapefile
+# (SpatialProcessing instance) as PCRaster map; in tiles of tilesize if tilesize is not None. Each tile creates its fine
+# raster in strips of at most maxbytes. Returns True if the map was created.
+def fractionMap(m, extent, factor=10, maxbytes=None, tilesize=None, workers=1):
+    if tilesize is not None:
+        return mosaic(fractionTile, (m, factor, maxbytes), TileGrid(extent, m.t_res, tilesize), m.output, csf.VS_SCALAR,\
+            workers)
+    fraction = m.rasterizeFraction(extent, factor, maxbytes)
+    if fraction is None:
+        return False
+    res = float(m.t_res)
+    csf.writeMap(m.output, fraction, (float(extent[0]), res, 0., float(extent[3]), 0., -res), csf.VS_SCALAR)
+    return True
+
+#-Function that writes the slope of a dem (PCRaster map) as PCRaster map, calculated in tiles of tilesize with a halo of
+# one cell, so the slope at the edges of the tiles is the same as for the complete dem. Returns True if the map was created.
+def slopeMap(demfile, outfile, tilesize=TILESIZE, workers=1):
+    if not csf.isMap(demfile):
+        return False
+    dem = csf.CSFMap.read(demfile)
+    extent = (dem.xUL, dem.yUL - dem.rows * dem.cellSize, dem.xUL + dem.cols * dem.cellSize, dem.yUL)
+    dem.data = None
+    return mosaic(slopeTile, (demfile,), TileGrid(extent, dem.cellSize, tilesize, halo=1), outfile, csf.VS_SCALAR, workers)
+
+#-Class that replaces the progress bar of a tile that is processed in this process: each finished step is passed on to
+# the progress bar of the forcing, and the tile is cancelled when the forcing is cancelled
+class TileProgress():
+    def __init__(self, tiled):
+        self.tiled = tiled
+        self.tile = None
+
+    def setValue(self, value):
+        self.tiled.handle('step', 1)
+        if self.tiled.forcing.cancelled:
+            self.tile.cancelled = True
+
+#-Class that processes the forcing in tiles of the model grid. Each tile is processed for the complete period with a model
+# grid that is the tile, by a worker process (see processChunk), or one tile after the other in this process if there is
+# one worker. The tiles are written straight into their window of the maps of the complete model grid, which are created
+# before the tiles are processed. Each tile records the maps it has written in its own manifest, so an interrupted run
+# can be resumed, and a map is complete when all tiles have written it. NetCDF output is not available for tiles.
+class TiledForcing(ParallelForcing):
+    def __init__(self, forcing, workers, tilesize=TILESIZE):
+        ParallelForcing.__init__(self, forcing, workers)
+        self.grid = TileGrid((forcing.xMin, forcing.yMin, forcing.xMax, forcing.yMax), forcing.t_res, tilesize)
+        self.tiles = self.grid.tiles()
+        self.tasks = []
+
+    #-Memory in bytes that a worker process needs for a tile
+    def workerMemory(self):
+        return WORKERMEMORY + WORKERDAYS * self.grid.tileSize**2 * 128
+
+    #-Number of progress steps: every tile has all steps of the complete model grid
+    def steps(self):
+        return self.forcing.procSteps * len(self.tiles)
+
+    #-Manifest file of tile i
+    def tileManifestFile(self, i):
+        return self.forcing.manifestFile[:-5] + '_tile%05d.json' % i
+
+    #-Map files of the forcing of the tasks with their date: (map file, date string)
+    def maps(self, tasks):
+        f = self.forcing
+        maps = []
+        for i in range(f.timeSteps):
+            curdate = f.startDate + datetime.timedelta(days=i)
+            datestr = '%04d-%02d-%02d' % (curdate.year, curdate.month, curdate.day)
+            for name in f.variableNames(tasks):
+                maps.append((f.outdir + name + f.pcrExtention(i+1), datestr))
+        return maps
+
+    #-Arguments of processChunk for each tile: the model grid of the worker is the tile, which is written in its window of
+    # the maps of the complete model grid, and the maps that are written are recorded in the manifest of the tile
+    def jobs(self, settings):
+        jobs = []
+        for i, tile in enumerate(self.tiles):
+            tilesettings = dict(settings)
+            tilesettings['extent'] = list(self.grid.extent(tile))
+            tilesettings['attributes'] = dict(settings['attributes'])
+            tilesettings['attributes'].update({'tile': (tile.row, tile.col), 'manifestFile': self.tileManifestFile(i)})
+            jobs.append((tilesettings, self.forcing.startDate, self.forcing.endDate, self.forcing.dayOffset,\
+                os.path.join(self.scratchdir, 'tile' + str(i))))
+        return jobs
+
+    #-Prepare the output before the tiles are processed. The manifest of each tile is kept if the previous run is resumed
+    # with the same settings, and otherwise started again; it gets the maps that are already complete, so the tiles skip
+    # them. The maps that are not complete are created without writing their cells, which are written by the tiles.
+    def prepare(self, tasks):
+        f = self.forcing
+        f.prepareOutput(tasks)
+        manifest = ForcingManifest(f.manifestFile)
+        manifest.load()
+        reset = False
+        for i in range(len(self.tiles)):
+            m = ForcingManifest(self.tileManifestFile(i))
+            parts = glob.glob(m.filename[:-5] + '_part*.json')
+            if f.resume and m.load() and m.settings == manifest.settings and m.startDate == manifest.startDate:
+                for part in parts:
+                    m.merge(part)
+            else:
+                for part in parts:
+                    os.remove(part)
+                m.reset(manifest.settings, manifest.startDate)
+                reset = True
+            m.maps.update(manifest.maps)
+            m.save()
+        size = csf.DATA_OFFSET + self.grid.rows * self.grid.cols * np.dtype(np.float32).itemsize
+        for mapfile, datestr in self.maps(tasks):
+            if manifest.hasMap(mapfile, datestr):
+                continue
+            if reset or not os.path.isfile(mapfile) or os.path.getsize(mapfile) != size:
+                csf.MapWriter(mapfile, self.grid.rows, self.grid.cols, self.grid.geoTransform).close()
+
+    #-Finish the run after all tiles are done. The maps that all tiles have written get the minimum and maximum value of
+    # the tiles in their header and are recorded in the manifest of the forcing, and the maps that no tile has written
+    # (e.g. because the input is missing) are removed. The manifests of the tiles are kept until all maps are complete.
+    def finish(self):
+        f = self.forcing
+        tiles = []
+        for i in range(len(self.tiles)):
+            m = ForcingManifest(self.tileManifestFile(i))
+            m.load()
+            for part in glob.glob(m.filename[:-5] + '_part*.json'):
+                m.merge(part)
+            tiles.append(m)
+        manifest = ForcingManifest(f.manifestFile)
+        manifest.load()
+        f.created = 0
+        f.skipped = 0
+        incomplete = 0
+        for mapfile, datestr in self.maps(self.tasks):
+            entries = [m.maps[os.path.basename(mapfile)] for m in tiles if m.hasMap(mapfile, datestr)]
+            if len(entries) == len(tiles):
+                if all(manifest.isComplete(mapfile, datestr, e['source']) for e in entries):
+                    f.skipped += 1
+                    continue
+                minmax = [e['minmax'] for e in entries if 'minmax' in e]
+                if minmax:
+                    minmax = (min(v[0] for v in minmax), max(v[1] for v in minmax))
+                csf.setMinMax(mapfile, minmax or None)
+                manifest.add(mapfile, datestr, entries[0]['source'])
+                f.created += 1
+            elif entries:
+                incomplete += 1
+            elif os.path.isfile(mapfile):
+                os.remove(mapfile)
+        manifest.save()
+        if incomplete:
+            for m in tiles:
+                m.save()
+            f.textLog.append('\nError: %d forcing maps are incomplete, because not all tiles are processed. Run the '\
+                'forcing again to complete them.' % incomplete)
+        else:
+            for m in tiles:
+                if os.path.isfile(m.filename):
+                    os.remove(m.filename)
+
+    #-Run the tasks (processForcing method names) for the complete period: with worker processes if workers > 1, and
+    # otherwise one tile after the other in this process
+    def run(self, tasks):
+        f = self.forcing
+        if f.outputFormat == 'netcdf' and cube.netCDF4 is not None:
+            raise ValueError('NetCDF output of the forcing is not available for a model that is processed in tiles. '\
+                'Set output = pcraster in the [FORCING] section or Tile_size = 0 in the [GENERAL] section of the project '\
+                'config file.')
+        self.tasks = tasks
+        f.textLog.append('Processing forcing in ' + str(len(self.tiles)) + ' tiles of ' + str(self.grid.tileSize) +\
+            ' x ' + str(self.grid.tileSize) + ' cells')
+        if self.workers > 1:
+            ParallelForcing.run(self, tasks)
+            return
+        self.prepare(tasks)
+        f.startTasks(tasks)
+        progress = TileProgress(self)
+        failed = set()
+        f.missing = collections.OrderedDict()
+        for settings, start, end, dayoffset, tempdir in self.jobs(f.settings()):
+            if f.cancelled:
+                break
+            progress.tile = chunkForcing(settings, start, end, dayoffset, tempdir, f.textLog, progress)
+            progress.tile.run(tasks)
+            failed.update(progress.tile.failed)
+            f.addMissing(progress.tile.missing)
+        f.logMissing()
+        if not f.cancelled:
+            self.finish()
+            f.finishTasks(tasks, failed)
+        shutil.rmtree(self.scratchdir, ignore_errors=True)
+        if f.cancelled:
+            f.textLog.append('\nProcessing of the forcing is cancelled')
+
+#-Function that runs the forcing tasks: in tiles if tilesize is not None and the model grid has more than one tile, with
+# worker processes if workers > 1, and otherwise in this process. Raises ValueError if the forcing can not be processed in
+# tiles with its settings.
+def runForcing(forcing, tasks, workers=1, tilesize=None):
+    if tilesize is not None:
+        tiled = TiledForcing(forcing, workers, tilesize)
+        if len(tiled.tiles) > 1:
+            tiled.run(tasks)
+            return
+    if workers > 1:
+        ParallelForcing(forcing, workers).run(tasks)
+    else:
+        forcing.run(tasks)
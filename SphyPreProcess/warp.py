@@ -0,0 +1,191 @@
+# The SPHY model Pre-Processor interface plugin for QGIS:
+# A QGIS plugin that allows the user to create SPHY model input data based on a database. 
+#
+# Copyright (C) 2015  Wilco Terink
+# 
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Email: terinkw@gmail.com
+
+#-Authorship information-###################################################################
+__author__ = "Wilco Terink"
+__copyright__ = "Wilco Terink"
+__license__ = "GPL"
+__version__ = "1.0.0"
+__email__ = "terinkw@gmail.com"
+__date__ ='1 January 2017'
+############################################################################################
+
+import os, functools
+import numpy as np
+from osgeo import gdal
+#-Import the cache with precomputed regridding weights
+from regrid import RegridCache
+#-Import the PCRaster map reader/writer
+import csf
+
+#-Functions that get and set a gdal config option for the current thread only, if this gdal version supports it
+getOption = getattr(gdal, 'GetThreadLocalConfigOption', gdal.GetConfigOption)
+setOption = getattr(gdal, 'SetThreadLocalConfigOption', gdal.SetConfigOption)
+
+#-Decorator for functions that read rasters with gdal: gdal doesn't write .aux.xml files (e.g. with statistics) next to
+# the rasters that the function reads, so nothing has to be cleaned up. The option is restored when the function returns,
+# so other gdal users in the same process (e.g. QGIS) are not affected.
+def withoutAuxFiles(function):
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        previous = getOption('GDAL_PAM_ENABLED', None)
+        setOption('GDAL_PAM_ENABLED', 'NO')
+        try:
+            return function(*args, **kwargs)
+        finally:
+            setOption('GDAL_PAM_ENABLED', previous)
+    return wrapper
+
+#-Class that regrids rasters in-process to the model grid, using the GDAL Python bindings instead of
+# the gdal command line utilities. Intermediate results are kept in memory, only the final maps are written to disk.
+class WarpEngine():
+    def __init__(self, t_srs, resolution, extent, clone, cachedir=None):
+        self.t_srs = t_srs
+        self.res = float(resolution)
+        self.xMin = float(extent[0])
+        self.yMin = float(extent[1])
+        self.xMax = float(extent[2])
+        self.yMax = float(extent[3])
+        #-Target grid properties (same as gdalwarp -te -tr would create)
+        self.cols = int(round((self.xMax - self.xMin) / self.res))
+        self.rows = int(round((self.yMax - self.yMin) / self.res))
+        self.geoTransform = (self.xMin, self.res, 0., self.yMax, 0., -self.res)
+        #-Clone map and its mask (read once, when it is needed for the first time)
+        self.clone = clone
+        self.mask = None
+        #-Regridding weights, computed once for every source grid and cached on disk
+        if cachedir is None:
+            cachedir = os.path.join(os.path.dirname(clone), 'cache')
+        self.regridCache = RegridCache(cachedir)
+        #-Cache with regridded rasters that is shared by projects (see rastercache.py), or None if it is not used
+        self.rasterCache = None
+
+    #-Key of the regridded source in the raster cache, or None if there is no raster cache
+    def cacheKey(self, src, s_srs, band=1, resampling='bilinear'):
+        if self.rasterCache is None:
+            return None
+        return self.rasterCache.key(src, band, s_srs, self.t_srs, (self.xMin, self.yMin, self.xMax, self.yMax),\
+            self.res, resampling)
+
+    #-Read the clone map once and return a boolean array that is True for the cells inside the clone
+    def cloneMask(self):
+        if self.mask is None:
+            if csf.isMap(self.clone):
+                self.mask = self.readModelMap(self.clone) == 1
+            else:
+                #-without a clone all cells of the target grid are used
+                self.mask = np.ones((self.rows, self.cols), dtype=bool)
+        return self.mask
+
+    #-Read a map on the clone grid (e.g. the clone or the model dem) for the model grid, which is a window of the clone
+    # grid if the model is processed in tiles. Returns a Float32 array with NaN for no data, or None if the map could not
+    # be read.
+    def readModelMap(self, filename):
+        if not csf.isMap(filename):
+            source = self.readSource(filename)
+            return None if source is None else source[0]
+        m = csf.CSFMap.read(filename)
+        row = int(round((m.yUL - self.yMax) / m.cellSize))
+        col = int(round((self.xMin - m.xUL) / m.cellSize))
+        data = m.array((row, col, self.rows, self.cols))
+        m.data = None
+        return data
+
+    #-Read a band of a raster as Float32 array with NaN for no data. Returns the array together with the
+    # geotransform, columns and rows of the source grid, or None if the source could not be read. PCRaster maps
+    # are read directly (memory-mapped) instead of through GDAL.
+    @withoutAuxFiles
+    def readSource(self, src, band=1):
+        if band == 1 and csf.isMap(src):
+            data, geotransform = csf.readMap(src)
+            return (data, geotransform, data.shape[1], data.shape[0])
+        ds = gdal.Open(src)
+        if ds is None or band > ds.RasterCount:
+            return None
+        rband = ds.GetRasterBand(band)
+        data = rband.ReadAsArray().astype(np.float32)
+        nodata = rband.GetNoDataValue()
+        if nodata is not None:
+            data[data == np.float32(nodata)] = np.nan
+        source = (data, ds.GetGeoTransform(), ds.RasterXSize, ds.RasterYSize)
+        ds = None
+        return source
+
+    #-Bilinear regridding of the source to the model grid with precomputed weights. Returns a Float32 array with NaN
+    # for no data, or None if the source could not be read.
+    def regrid(self, src, s_srs, band=1):
+        data, found = self.regridBlock([src], s_srs, band)
+        return data[0] if found[0] else None
+
+    #-Bilinear regridding of a list of sources (e.g. the files of a block of days) to a (sources, rows, cols) block. The
+    # sources with the same grid are regridded at once. Returns the block together with a boolean array that is False
+    # for the sources that could not be read.
+    def regridBlock(self, srcs, s_srs, band=1):
+        data = np.empty((len(srcs), self.rows, self.cols), dtype=np.float32)
+        data[:] = np.nan
+        found = np.zeros(len(srcs), dtype=bool)
+        keys = [self.cacheKey(src, s_srs, band) for src in srcs]
+        grids = {}
+        for i, src in enumerate(srcs):
+            cached = self.rasterCache.get(keys[i]) if keys[i] is not None else None
+            if cached is not None:
+                data[i] = cached
+                found[i] = True
+                continue
+            source = self.readSource(src, band)
+            if source is not None:
+                grids.setdefault((tuple(source[1]), source[2], source[3]), []).append((i, source[0]))
+        for (geotransform, cols, rows), sources in grids.items():
+            index = [i for i, d in sources]
+            stack = np.array([d for i, d in sources], dtype=np.float32)
+            data[index] = self.regridArray(stack, geotransform, cols, rows, s_srs)
+            found[index] = True
+            for i in index:
+                if keys[i] is not None:
+                    self.rasterCache.put(keys[i], data[i])
+        return data, found
+
+    #-Bilinear regridding of an array, or a (days, rows, cols) block of arrays, on a source grid (geotransform, cols, rows)
+    # to the model grid
+    def regridArray(self, data, geotransform, cols, rows, s_srs):
+        weights = self.regridCache.get(geotransform, cols, rows, s_srs, self)
+        return weights.apply(data, (self.rows, self.cols))
+
+    #-Write an array as PCRaster map on the model grid. No data cells get a missing value, and if clip is True also
+    # the cells outside the clone.
+    def writeMap(self, outfile, data, valuescale=csf.VS_SCALAR, clip=True):
+        if clip:
+            data = np.where(self.cloneMask(), data, np.nan)
+        csf.writeMap(outfile, data, self.geoTransform, valuescale)
+
+#-Function that converts a raster to a PCRaster map with the same grid, e.g. a rasterized shapefile to a nominal map
+@withoutAuxFiles
+def translateToMap(src, outfile, valuescale=csf.VS_SCALAR):
+    ds = gdal.Open(src)
+    if ds is None:
+        return False
+    band = ds.GetRasterBand(1)
+    data = band.ReadAsArray().astype(np.float64)
+    nodata = band.GetNoDataValue()
+    if nodata is not None:
+        data[data == nodata] = np.nan
+    csf.writeMap(outfile, data, ds.GetGeoTransform(), valuescale)
+    ds = None
+    return True
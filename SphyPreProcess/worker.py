@@ -27,9 +27,12 @@ __email__ = "terinkw@gmail.com"
 __date__ ='1 January 2017'
 ############################################################################################
 
-import subprocess, traceback
+import subprocess, traceback, time
 from PyQt4 import QtCore
 
+#-Import forcing processing with worker processes and in tiles
+from tiling import runForcing
+
 #-Class to run subprocess in a thread
 class SubProcessWorker(QtCore.QObject):
     '''Example worker'''
@@ -81,4 +84,78 @@ class SubProcessWorker(QtCore.QObject):
          
     finished = QtCore.pyqtSignal(object)
     error = QtCore.pyqtSignal(Exception, basestring)
-    cmdProgress = QtCore.pyqtSignal(object)
\ No newline at end of file
+    cmdProgress = QtCore.pyqtSignal(object)
+
+#-Class that replaces the text log of processForcing in the forcing worker thread. The text is collected and sent to the
+# GUI thread at most every interval seconds, because a Qt widget can only be updated in the GUI thread.
+class SignalLog():
+    def __init__(self, signal, interval=0.5):
+        self.signal = signal
+        self.interval = interval
+        self.lines = []
+        self.last = 0.
+
+    def append(self, text):
+        self.lines.append(text)
+        if time.time() - self.last >= self.interval:
+            self.flush()
+
+    def flush(self):
+        if self.lines:
+            self.signal.emit('\n'.join(self.lines))
+            self.lines = []
+        self.last = time.time()
+
+#-Class that replaces the progress bar of processForcing in the forcing worker thread. The progress (percentage) and the
+# estimated remaining time (seconds, None if unknown) are sent to the GUI thread at most every interval seconds.
+class SignalProgress():
+    def __init__(self, signal, interval=1.):
+        self.signal = signal
+        self.interval = interval
+        self.start = time.time()
+        self.last = 0.
+
+    def setValue(self, value):
+        now = time.time()
+        if now - self.last < self.interval and value < 100:
+            return
+        self.last = now
+        eta = None
+        if value > 0:
+            eta = (now - self.start) * (100. - value) / value
+        self.signal.emit([value, eta])
+
+#-Class to run the forcing (processForcing, ParallelForcing with worker processes, or TiledForcing for large models) in a
+# thread, so QGIS stays responsive. The log and progress are sent to the GUI with signals, and the run can be cancelled.
+class ForcingWorker(QtCore.QObject):
+    def __init__(self, forcing, tasks, workers=1, tilesize=None):
+        QtCore.QObject.__init__(self)
+        self.forcing = forcing
+        self.tasks = tasks
+        self.workers = workers
+        self.tileSize = tilesize
+
+    def run(self):
+        log = SignalLog(self.log)
+        self.forcing.textLog = log
+        self.forcing.progBar = SignalProgress(self.progress)
+        start = time.time()
+        try:
+            runForcing(self.forcing, self.tasks, self.workers, self.tileSize)
+        except ValueError, e: #-settings that can not be processed
+            log.append('Error: ' + str(e))
+        except Exception, e:
+            log.flush()
+            # forward the exception upstream
+            self.error.emit(e, traceback.format_exc())
+        log.flush()
+        self.finished.emit(self.forcing.summary(time.time() - start))
+
+    #-Stop the run after the current variable (called from the GUI thread)
+    def cancel(self):
+        self.forcing.cancelled = True
+
+    finished = QtCore.pyqtSignal(object)
+    error = QtCore.pyqtSignal(Exception, basestring)
+    log = QtCore.pyqtSignal(object)
+    progress = QtCore.pyqtSignal(object)